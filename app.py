@@ -1,54 +1,472 @@
+import time
+_import_start = time.perf_counter()
+
 import streamlit as st
+import streamlit.components.v1 as components
 import os
 import shutil
 from pathlib import Path
 import sys
 import io
-from contextlib import redirect_stdout
-import time
+import html
 import atexit
 import threading
-import pandas as pd  
+import hmac
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 
 # 导入转换脚本
 # 确保当前目录在 sys.path 中
 current_dir = Path(__file__).parent.resolve()
 sys.path.append(str(current_dir))
 
-import excel_to_word_converter
-import verify_word
+# 注意：pandas / python-docx / openpyxl 及转换、校对模块只在工作进程（或首次使用时）导入，
+# 界面脚本保持轻量，服务启动与页面重跑不承担这些导入耗时
 import styles
-from cleanup_loop import run_loop
+from cleanup_loop import (run_loop, schedule_expiry, set_session_files, touch_file, remove_file, directory_bytes,
+                          format_size, INPUT_DIR, OUTPUT_DIR)
+from file_store import (create_unique_file, write_async, wait_written, is_writing, content_digest,
+                        MEMORY_OUTPUT_MB)
+from session_store import SessionStore
+from job_scheduler import JobScheduler, estimate_job_cost
+from worker_pool import WorkerPool, WorkerCrashed, WorkerError
+from progress import ProgressThrottle, format_eta
+from cancellation import CancelToken, JobCancelled, JOB_TIMEOUT_SECONDS
+from logger import get_logger, capture_job_logs
+from warmup import check_import_budget
+from preflight import preflight_upload
+from job_history import get_job_history
+import metrics
+from metrics import (JOBS_TOTAL, JOB_DURATION, QUEUE_WAIT, QUEUE_DEPTH, RUNNING_JOBS, CACHE_REQUESTS, CACHE_MISSES,
+                     PREFLIGHT_TOTAL, ACTIVE_SESSIONS, STORAGE_BYTES, CLEANUP_DELETED_FILES, CLEANUP_FREED_BYTES, CLEANUP_DELETED_SESSIONS)
+
+logger = get_logger("app")
+check_import_budget("app", time.perf_counter() - _import_start)
 
 # 后台静默清理线程
 @st.cache_resource(show_spinner=False)
 def start_cleanup_daemon():
-    """启动后台清理守护线程（全服务器单例）"""
+    """启动后台清理守护线程（每个实例一个；目录对账只由选举出的清理负责实例执行）"""
     # 创建单个线程（进程退出时自动终止）
     daemon_thread = threading.Thread(target=run_loop, daemon=True)
     daemon_thread.start()
     return daemon_thread
 
+@st.cache_resource(show_spinner=False)
+def get_session_store():
+    """会话数据存储（全服务器单例，跨会话共享内存预算）"""
+    return SessionStore()
+
+def session_get(key, default=None):
+    """读取当前会话的产物（session_state 只保存会话句柄）"""
+    return get_session_store().get(st.session_state.session_handle, key, default)
+
+def session_put(key, value):
+    """保存当前会话的产物"""
+    get_session_store().put(st.session_state.session_handle, key, value)
+
+def get_current_files():
+    return session_get('current_files', {'excel': None, 'word': None})
+
+def set_current_files(excel=None, word=None):
+    session_put('current_files', {'excel': excel, 'word': word})
+    # 当前会话使用中的文件不参与磁盘预算淘汰
+    set_session_files(st.session_state.session_handle, excel, word)
+
+@st.cache_resource(show_spinner=False)
+def get_job_scheduler():
+    """转换/校对任务调度器（全服务器单例）"""
+    return JobScheduler()
+
+@st.cache_resource(show_spinner=False)
+def get_worker_pool():
+    """转换/校对工作进程池（全服务器单例，预先启动工作进程）"""
+    return WorkerPool()
+
+@st.cache_resource(show_spinner=False)
+def start_metrics_exporter():
+    """注册采集时计算的运行指标，并启动 Prometheus 指标端口（全服务器单例）"""
+    scheduler = get_job_scheduler()
+    store = get_session_store()
+    QUEUE_DEPTH.set_function(lambda: {(lane,): n for lane, n in scheduler.stats()['queued'].items()})
+    RUNNING_JOBS.set_function(lambda: {(lane,): n for lane, n in scheduler.stats()['running'].items()})
+    ACTIVE_SESSIONS.set_function(store.active_sessions)
+    STORAGE_BYTES.set_function(lambda: {('excel_input',): directory_bytes(INPUT_DIR),
+                                        ('word_output',): directory_bytes(OUTPUT_DIR)})
+    return metrics.start_http_server()
+
+@contextmanager
+def admitted_job(uploaded_file, excel_path):
+    """经调度器准入后运行任务；排队期间显示排队位置
+    任务开销按内存中的上传内容估算；工作进程从磁盘读取，获得运行名额后等待上传文件写完"""
+    placeholder = st.empty()
+
+    def show_position(position):
+        placeholder.info(f"⏳ 服务器繁忙，当前排队第 {position} 位，请稍候...")
+
+    enqueued = time.monotonic()
+    with get_job_scheduler().admit(estimate_job_cost(uploaded_file.getvalue()), on_wait=show_position):
+        waited = time.monotonic() - enqueued
+        QUEUE_WAIT.observe(waited)
+        placeholder.empty()
+        wait_written(excel_path)
+        yield waited
+
+@contextmanager
+def job_metrics(kind, uploaded_file, job_log, queue_wait):
+    """记录任务次数与耗时，并写入任务历史；块内将 job['outcome'] 改为 failed / cancelled / crashed 等，
+    页面重跑中断本次运行时记为 cancelled。job 同时作为 job_stats 交给工作进程池收集峰值内存，
+    读取文档缓存的任务由 get_document_bytes 写入 job['cache']"""
+    job = {'outcome': 'success'}
+    start = time.monotonic()
+    try:
+        yield job
+    except BaseException:
+        job['outcome'] = 'cancelled'
+        raise
+    finally:
+        elapsed = time.monotonic() - start
+        JOBS_TOTAL.inc(kind=kind, outcome=job['outcome'])
+        JOB_DURATION.observe(elapsed, kind=kind)
+        record_job_history(kind, job, uploaded_file, job_log, queue_wait, elapsed)
+
+def record_job_history(kind, job, uploaded_file, job_log, queue_wait, elapsed):
+    """任务历史：输入规模、阶段耗时、峰值内存等写入 SQLite（失败只记录警告）"""
+    history = get_job_history()
+    if history is None:
+        return
+    try:
+        # 只使用上传时已生成的结构预览统计，不在此处重新统计（任务仍持有调度名额）
+        counts = session_get('outline_counts')
+        if not counts or counts[0] != get_upload_digest(uploaded_file):
+            counts = (None, {})
+        history.record(
+            kind=kind, outcome=job['outcome'], file_name=uploaded_file.name,
+            input_bytes=uploaded_file.size,
+            rows=counts[1].get('rows'),
+            modules=counts[1].get('modules'),
+            processes=counts[1].get('processes'),
+            queue_wait_ms=round(queue_wait * 1000, 1), duration_ms=round(elapsed * 1000, 1),
+            stages=job_log.stages, peak_rss_bytes=job.get('peak_rss_bytes'), cache=job.get('cache'),
+            verify_passed=job.get('verify_passed'),
+        )
+    except Exception as e:
+        logger.warning(f"[任务历史] 记录失败: {type(e).__name__}: {e}")
+
+@contextmanager
+def job_progress():
+    """显示任务进度条与预计剩余时间，返回 (进度回调, 取消令牌)；结束后移除进度条
+    取消令牌带墙钟时限，并在每次检查时刷新界面：用户点击取消、上传新文件或移除上传时，
+    Streamlit 会在此处中断本次运行，任务随之取消。
+    """
+    bar = st.progress(0.0, text="准备中...")
+    st.button("⏹ 取消任务", key="cancel_job")  # 点击即触发重跑，从而中断并取消当前任务
+    start = time.monotonic()
+    state = {'stage': "准备中", 'fraction': 0.0, 'refreshed': start}
+
+    def render():
+        eta = format_eta(time.monotonic() - start, state['fraction'])
+        bar.progress(state['fraction'], text=f"{state['stage']} {state['fraction']:.0%} {eta}".rstrip())
+        state['refreshed'] = time.monotonic()
+
+    def update(stage, fraction):
+        state['stage'], state['fraction'] = stage, fraction
+        render()
+
+    def heartbeat():
+        if time.monotonic() - state['refreshed'] >= 1.0:
+            render()
+
+    try:
+        yield ProgressThrottle(update, min_interval=0.3), CancelToken(timeout=JOB_TIMEOUT_SECONDS, poll=heartbeat)
+    finally:
+        bar.empty()
+
+_document_reads = threading.local()  # 当前线程最近一次 get_document_bytes 是否未命中缓存
+
+@st.cache_resource(show_spinner=False, max_entries=32, ttl=3600)
+def load_document_bytes(version, _path_str=None, _document=None):
+    """生成文档的字节内容（按版本缓存，不可变，跨重跑/会话复用）
+    版本为内容指纹时，相同工作簿在不同会话生成的文档只缓存一份（各次生成只有文档属性中的时间不同，共用先缓存的一份）；
+    刚转换完成时直接放入工作进程返回的内存内容，缓存淘汰后才从磁盘读取
+    （预先放入不是缓存读取，不计入未命中，使命中率只反映 get_document_bytes 的读取）"""
+    if _document is not None:
+        return _document.read_bytes()
+    CACHE_MISSES.inc(cache='document')
+    _document_reads.missed = True
+    wait_written(_path_str)
+    return Path(_path_str).read_bytes()
+
+def document_digest(file_path):
+    """本会话转换生成的文档的内容指纹（SHA-256，见 package_digest），不是本会话生成的返回 None"""
+    recorded = session_get('document_version')
+    if recorded and recorded[0] == str(file_path):
+        return recorded[1]
+    return None
+
+def document_version(file_path):
+    """本会话转换生成的文档使用内容指纹，其他情况（如服务重启后）按 路径+mtime+大小"""
+    digest = document_digest(file_path)
+    if digest:
+        return digest
+    stat = Path(file_path).stat()
+    return f"{file_path}:{stat.st_mtime_ns}-{stat.st_size}"
+
+def get_document_bytes(file_path, job=None):
+    """获取文档字节：文件未变化时直接命中缓存，不再重复读盘；传入 job 时记录本次是否命中（job['cache']）"""
+    touch_file(file_path)
+    CACHE_REQUESTS.inc(cache='document')
+    _document_reads.missed = False
+    data = load_document_bytes(document_version(file_path), _path_str=str(file_path))
+    if job is not None:
+        job['cache'] = 'miss' if _document_reads.missed else 'hit'
+    return data
+
+def remember_document(file_path, document):
+    """登记刚生成的文档（OutputBuffer）：内存中的内容直接放入文档缓存，下载与校对不再读盘；
+    落盘只用于保留与跨实例共享，在后台进行（转存到临时文件的大文档直接改名）"""
+    if not document.spilled:
+        load_document_bytes(document.digest, _path_str=str(file_path), _document=document)
+    get_session_store().delete(st.session_state.session_handle, 'save_error')
+    document.persist(file_path, on_done=schedule_expiry, on_error=save_error_handler())
+    session_put('document_version', (str(file_path), document.digest))
+
+def save_error_handler():
+    """后台写入失败时把错误记入当前会话（回调在写入线程中执行，会话句柄需提前取出）"""
+    store, handle = get_session_store(), st.session_state.session_handle
+
+    def on_error(path, error):
+        store.put(handle, 'save_error', (str(path), f"{type(error).__name__}: {error}"))
+    return on_error
+
+def save_failed(file_path):
+    """file_path 在本会话中后台写入失败时返回错误信息，否则返回 None"""
+    failed = session_get('save_error')
+    if failed and failed[0] == str(file_path):
+        return failed[1]
+    return None
+
+def document_ready(file_path):
+    """文档已生成（已在磁盘上或正在后台写出，且写出没有失败）"""
+    if save_failed(file_path):
+        return False
+    return Path(file_path).exists() or is_writing(file_path)
+
+def document_source(file_path, job=None):
+    """交给校对任务的文档：不超过 MEMORY_OUTPUT_MB 时直接传内存中的内容，否则传路径（等待写完）"""
+    data = get_document_bytes(file_path, job)
+    if len(data) <= MEMORY_OUTPUT_MB * 1024 * 1024:
+        return data
+    wait_written(file_path)
+    return file_path
+
+@st.cache_resource(show_spinner="正在生成模块结构预览...", max_entries=32, ttl=3600)
+def load_outline(digest, _excel_path, file_name):
+    """模块结构预览（按上传内容哈希缓存，页面重跑、重复上传相同文件时不重复统计）
+    与转换相同，经调度器准入后在工作进程中执行：整表扫描与 pandas 回退不占用界面进程的内存，也受单任务资源限制"""
+    CACHE_MISSES.inc(cache='outline')
+    wait_written(_excel_path)
+    with get_job_scheduler().admit(estimate_job_cost(_excel_path)):
+        return get_worker_pool().run('outline:build_outline', _excel_path, file_name)
+
+def get_upload_digest(uploaded_file):
+    """上传内容的哈希：每个上传只计算一次，保存在会话存储中
+    注意：上传内容统一用 getvalue() 取得（直接返回内部 bytes，不复制）；getbuffer() 会先复制一份缓冲区"""
+    cached = session_get('upload_digest')
+    if cached and cached[0] == uploaded_file.file_id:
+        return cached[1]
+    digest = content_digest(uploaded_file.getvalue())
+    session_put('upload_digest', (uploaded_file.file_id, digest))
+    return digest
+
+def get_outline(uploaded_file, excel_path):
+    """上传文件的模块结构预览；无法识别结构时返回 None，工作进程执行失败时抛出 WorkerError
+    统计数同时记入会话，供任务历史使用"""
+    CACHE_REQUESTS.inc(cache='outline')
+    digest = get_upload_digest(uploaded_file)
+    outline = load_outline(digest, str(excel_path), uploaded_file.name)
+    if outline is not None:
+        session_put('outline_counts', (digest, {'rows': outline.total_subprocesses, 'modules': outline.total_l3,
+                                                'processes': outline.total_processes}))
+    return outline
+
+def render_outline_html(outline):
+    """模块结构树（一级/二级可展开，三级显示功能过程数与 CFP）"""
+    def meta(node):
+        text = f"功能过程 {node.processes} · 子过程 {node.subprocesses}"
+        if outline.has_cfp:
+            text += f" · CFP {node.cfp:g}"
+        return text
+
+    parts = ['<div class="outline-tree">']
+    for l1 in outline.nodes:
+        parts.append(f'<details><summary class="module-l1">{html.escape(l1.name)}'
+                     f'<span class="outline-meta">{meta(l1)}</span></summary>')
+        for l2 in l1.children:
+            parts.append(f'<details><summary class="module-l2">{html.escape(l2.name)}'
+                         f'<span class="outline-meta">{meta(l2)}</span></summary>')
+            for l3 in l2.children:
+                parts.append(f'<div class="module-l3">{html.escape(l3.name)}'
+                             f'<span class="module-l3-count">{meta(l3)}</span></div>')
+            parts.append('</details>')
+        parts.append('</details>')
+    parts.append('</div>')
+    return ''.join(parts)
+
+def render_admin_page():
+    """管理页面：吞吐、排队、缓存命中、会话与磁盘占用、清理统计（本实例）"""
+    st.title("🛠 运行状态")
+    st.caption(f"实例 pid={os.getpid()}；Prometheus 指标端口："
+               + (f"`{metrics.METRICS_HOST}:{metrics.METRICS_PORT}/metrics`" if metrics.METRICS_PORT > 0 else "未启用"))
+
+    queued = sum(value for _, _, value in QUEUE_DEPTH.samples())
+    running = sum(value for _, _, value in RUNNING_JOBS.samples())
+    storage = {labels['directory']: value for _, labels, value in STORAGE_BYTES.samples()}
+    cols = st.columns(5)
+    cols[0].metric("排队任务", queued)
+    cols[1].metric("运行中任务", running)
+    cols[2].metric("活跃会话", sum(value for _, _, value in ACTIVE_SESSIONS.samples()))
+    cols[3].metric("excel_input", format_size(storage.get('excel_input', 0)))
+    cols[4].metric("word_output", format_size(storage.get('word_output', 0)))
+
+    def seconds(value):
+        return '-' if value is None else ('> 600s' if value == float('inf') else f"≤ {value:g}s")
+
+    st.markdown("#### 任务")
+    outcomes = ('success', 'mismatch', 'failed', 'cancelled', 'crashed')
+    rows = ["| 类型 | " + " | ".join(outcomes) + " | P50 耗时 | P95 耗时 |", "|---" * (len(outcomes) + 3) + "|"]
+    for kind, label in (('convert', '转换'), ('verify', '校对'), ('text', '文本')):
+        counts = " | ".join(str(JOBS_TOTAL.value(kind=kind, outcome=outcome)) for outcome in outcomes)
+        rows.append(f"| {label} | {counts} | {seconds(JOB_DURATION.quantile(0.5, kind=kind))} | "
+                    f"{seconds(JOB_DURATION.quantile(0.95, kind=kind))} |")
+    st.markdown("\n".join(rows))
+    st.caption(f"排队耗时 P95：{seconds(QUEUE_WAIT.quantile(0.95))}（耗时按分桶上界估算）")
+
+    st.markdown("#### 缓存")
+    rows = ["| 缓存 | 读取 | 未命中 | 命中率 |", "|---|---|---|---|"]
+    for cache, label in (('document', '文档字节'), ('outline', '结构预览')):
+        requests_count = CACHE_REQUESTS.value(cache=cache)
+        misses = CACHE_MISSES.value(cache=cache)
+        ratio = f"{1 - misses / requests_count:.0%}" if requests_count else '-'
+        rows.append(f"| {label} | {requests_count} | {misses} | {ratio} |")
+    st.markdown("\n".join(rows))
+
+    st.markdown("#### 清理")
+    st.markdown(
+        f"- 到期删除：{CLEANUP_DELETED_FILES.value(reason='expired')} 个文件，"
+        f"释放 {format_size(CLEANUP_FREED_BYTES.value(reason='expired'))}\n"
+        f"- 磁盘预算淘汰：{CLEANUP_DELETED_FILES.value(reason='evicted')} 个文件，"
+        f"释放 {format_size(CLEANUP_FREED_BYTES.value(reason='evicted'))}\n"
+        f"- 过期会话目录：{CLEANUP_DELETED_SESSIONS.value()} 个"
+    )
+
+    with st.expander("Prometheus 文本格式", expanded=False):
+        st.code(metrics.render_text(), language="text")
+
+    render_job_history()
+
+def render_job_history():
+    """管理页面：任务历史汇总（所有实例）与最慢任务"""
+    history = get_job_history()
+    st.markdown("#### 任务历史")
+    if history is None:
+        st.info("任务历史未启用（JOB_HISTORY_DB）")
+        return
+    days = st.selectbox("统计范围", (1, 7, 30, 365), index=1, format_func=lambda d: f"最近 {d} 天")
+    since = (datetime.now() - timedelta(days=days)).isoformat(timespec='seconds')
+    kind_labels = {'convert': '转换', 'verify': '校对', 'text': '文本'}
+
+    def ms(value):
+        return '-' if value is None else f"{value / 1000:.2f}s"
+
+    def mb(value):
+        return '-' if value is None else f"{value / 1024 / 1024:.0f} MB"
+
+    def ratio(value):
+        return '-' if value is None else f"{value:.0%}"
+
+    rows = ["| 类型 | 次数 | 完成率 | 平均耗时 | 最大耗时 | 平均排队 | 平均峰值内存 | 最大峰值内存 | 缓存命中 | 校对通过 | 平均行数 |",
+            "|---" * 11 + "|"]
+    for item in history.aggregates(since):
+        avg_rows = '-' if item['avg_rows'] is None else f"{item['avg_rows']:.0f}"
+        rows.append(f"| {kind_labels.get(item['kind'], item['kind'])} | {item['jobs']} | {ratio(item['completed_rate'])} | "
+                    f"{ms(item['avg_duration_ms'])} | {ms(item['max_duration_ms'])} | {ms(item['avg_queue_wait_ms'])} | "
+                    f"{mb(item['avg_peak_rss_bytes'])} | {mb(item['max_peak_rss_bytes'])} | {ratio(item['cache_hit_rate'])} | "
+                    f"{ratio(item['verify_pass_rate'])} | {avg_rows} |")
+    st.markdown("\n".join(rows))
+
+    for kind in ('convert', 'verify'):
+        slowest = history.slowest(kind, limit=10, since=since)
+        if not slowest:
+            continue
+        st.markdown(f"##### 最慢的{kind_labels[kind]}任务")
+        stage_text = "，".join(f"{stage} {elapsed / 1000:.2f}s" for stage, elapsed in history.stage_averages(kind)[:5])
+        if stage_text:
+            st.caption(f"平均阶段耗时：{stage_text}")
+        rows = ["| 结束时间 | 文件 | 结果 | 耗时 | 大小 | 行数 | 三级模块 | 峰值内存 | 缓存 | 最慢阶段 |", "|---" * 10 + "|"]
+        for job in slowest:
+            stages = job.get('stages') or {}
+            top_stage = max(stages, key=stages.get) if stages else None
+            top_text = f"{top_stage} {stages[top_stage] / 1000:.2f}s" if top_stage else '-'
+            rows.append(f"| {job['finished_at']} | {html.escape(job['file_name'] or '-').replace('|', '&#124;')} | {job['outcome']} | "
+                        f"{ms(job['duration_ms'])} | {format_size(job['input_bytes'] or 0)} | {job['rows'] or '-'} | "
+                        f"{job['modules'] or '-'} | {mb(job['peak_rss_bytes'])} | {job['cache'] or '-'} | {top_text} |")
+        st.markdown("\n".join(rows))
+
 def cleanup_files(*file_paths):
-    """清理指定的文件"""
+    """清理指定的文件（同时从过期索引中注销）"""
     for file_path in file_paths:
         try:
-            if file_path and Path(file_path).exists():
-                Path(file_path).unlink()
+            if file_path:
+                wait_written(file_path)  # 后台写入完成后再删除，避免删除后又被写出
+                remove_file(file_path)
         except Exception as e:
             pass  # 静默失败，不会影响体验
 
+def build_stats_export(summary):
+    """生成模块统计导出 Excel（汇总表 + 按三级模块聚合的详细数据），返回字节内容"""
+    import pandas as pd
+
+    export_df = summary.to_frame()
+    excel_buffer = io.BytesIO()
+    with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
+        # 汇总表
+        summary_data = [
+            {'统计项': '一级模块数量', '数值': summary.total_l1},
+            {'统计项': '二级模块数量', '数值': summary.total_l2},
+            {'统计项': '三级模块数量', '数值': summary.total_l3},
+            {'统计项': '功能过程总数', '数值': summary.total_processes},
+            {'统计项': '子过程总数', '数值': summary.total_subprocesses}
+        ]
+        pd.DataFrame(summary_data).to_excel(writer, index=False, sheet_name='汇总统计')
+
+        # 详细数据表 (聚合到三级模块)
+        if not export_df.empty:
+            # 按三级模块聚合，只保留模块名称和子过程总数
+            # sort=False 保持原始出现顺序
+            # 聚合：子过程数量求和；CFP总和取首个（已按模块计算）
+            detailed_df = export_df.groupby(['一级模块名称', '二级模块名称', '三级模块名称'], sort=False).agg({
+                '子过程数量': 'sum',
+                'CFP总和': 'first'
+            }).reset_index()
+        else:
+            detailed_df = pd.DataFrame()
+
+        detailed_df.to_excel(writer, index=False, sheet_name='详细数据')
+    return excel_buffer.getvalue()
+
+def reset_verify_stats():
+    """清空当前会话的校对统计与日志"""
+    get_session_store().delete(st.session_state.session_handle, 'verify_summary', 'stats_export', 'verify_log')
+
 def save_uploaded_file(uploaded_file, target_folder):
     try:
-        # 生成带时间戳的唯一文件名
-        timestamp = int(time.time() * 1000)
+        # 生成带时间戳的唯一文件名（独占创建，多个实例同时上传也不会重名）
         file_stem = Path(uploaded_file.name).stem
         file_suffix = Path(uploaded_file.name).suffix
-        unique_filename = f"{file_stem}_{timestamp}{file_suffix}"
-        
-        target_path = target_folder / unique_filename
-        with open(target_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
+        target_path = create_unique_file(target_folder, file_stem, file_suffix)
+        # 预览与预检直接使用内存中的上传内容；落盘在后台进行，只有交给工作进程时才需要等待写完
+        write_async(target_path, uploaded_file.getvalue(), on_done=schedule_expiry, on_error=save_error_handler())
         return target_path
     except Exception as e:
         st.error(f"保存文件失败: {e}")
@@ -60,12 +478,19 @@ def main():
     
     # 启动后台清理守护线程
     start_cleanup_daemon()
+    # 启动时即创建工作进程池：工作进程在后台预热，首个转换任务无需等待
+    get_worker_pool()
+    start_metrics_exporter()
+
+    # 管理页面：?admin=<ADMIN_TOKEN>
+    admin_token = st.query_params.get('admin')
+    if metrics.ADMIN_TOKEN and admin_token and hmac.compare_digest(admin_token, metrics.ADMIN_TOKEN):
+        render_admin_page()
+        return
     
-    # 使用 session_state 存储模块统计数据和文件路径
-    if 'module_stats' not in st.session_state:
-        st.session_state.module_stats = []
-    if 'current_files' not in st.session_state:
-        st.session_state.current_files = {'excel': None, 'word': None}
+    # session_state 只保存会话句柄；模块统计、日志、文件路径等产物存放在会话存储中（落盘 + 内存 LRU）
+    if 'session_handle' not in st.session_state:
+        st.session_state.session_handle = get_session_store().new_session()
     # 清理行为：上传新文件或移除上传时立即清理
     
     # 路径配置
@@ -103,40 +528,95 @@ def main():
             # 如果是新文件，清理旧文件
             current_upload_name = uploaded_file.name
             if 'last_upload_name' not in st.session_state or st.session_state.last_upload_name != current_upload_name:
-                cleanup_files(st.session_state.current_files.get('excel'), st.session_state.current_files.get('word'))
-                st.session_state.current_files = {'excel': None, 'word': None}
+                old_files = get_current_files()
+                cleanup_files(old_files.get('excel'), old_files.get('word'))
+                set_current_files()
+                get_session_store().delete(st.session_state.session_handle, 'convert_log', 'verify_log', 'text_exports',
+                                           'preflight')
                 # 新文件上传前清理旧文件，确保不会残留
                 st.session_state.last_upload_name = current_upload_name
             
             # 保存文件（如果还没保存）
-            if st.session_state.current_files['excel'] is None:
-                saved_path = save_uploaded_file(uploaded_file, input_dir)
+            current_files = get_current_files()
+            if current_files['excel'] is None:
+                # 预检：直接检查上传内容，无法转换的文件不落盘、不占用解析与调度名额
+                check = preflight_upload(uploaded_file, uploaded_file.name)
+                PREFLIGHT_TOTAL.inc(outcome='accepted' if check.ok else 'rejected')
+                saved_path = None
+                if not check.ok:
+                    st.error(f"❌ 文件预检未通过：{check.message}")
+                else:
+                    saved_path = save_uploaded_file(uploaded_file, input_dir)
                 if saved_path:
-                    st.session_state.current_files['excel'] = str(saved_path)
+                    set_current_files(excel=str(saved_path))
+                    caption = None
+                    if check.estimated_rows is not None:
+                        caption = (f"预检：Sheet「{check.sheet_name}」，表头第 {check.header_row or '-'} 行，"
+                                   f"约 {check.estimated_rows} 行数据（{check.elapsed * 1000:.0f} ms）")
+                    session_put('preflight', {'caption': caption, 'warnings': check.warnings})
             else:
-                saved_path = Path(st.session_state.current_files['excel'])
+                saved_path = Path(current_files['excel'])
+                error = save_failed(saved_path)
+                if error:
+                    st.error(f"❌ 上传文件保存失败：{error}。请重新上传。")
+                    # 清除记录：下次重跑时重新保存上传内容
+                    get_session_store().delete(st.session_state.session_handle, 'save_error')
+                    set_current_files()
+                    saved_path = None
             
             if saved_path:
                 st.success(f"文件已上传: `{uploaded_file.name}`")
+                preflight = session_get('preflight', {})
+                if preflight.get('caption'):
+                    st.caption(preflight['caption'])
+                for warning in preflight.get('warnings', ()):
+                    st.warning(f"⚠️ {warning}")
+
+                # 模块结构预览：转换前核对列映射与模块层级
+                try:
+                    outline = get_outline(uploaded_file, saved_path)
+                except WorkerError as e:
+                    logger.warning(f"[结构预览] 生成失败: {e}")
+                    st.info("ℹ️ 模块结构预览不可用，不影响转换。")
+                else:
+                    if outline is None:
+                        st.warning("⚠️ 未能识别模块结构，请检查表头（客户需求/一级模块/二级模块/三级模块/功能过程/子过程描述）。")
+                    else:
+                        title = (f"📑 模块结构预览：一级 {len(outline.nodes)} · 二级 {outline.total_l2} · "
+                                 f"三级 {outline.total_l3} · 功能过程 {outline.total_processes}")
+                        if outline.has_cfp:
+                            title += f" · CFP {outline.total_cfp:g}"
+                        with st.expander(title, expanded=False):
+                            if outline.columns:
+                                st.caption("列映射：" + "，".join(outline.columns.values()))
+                            st.markdown(render_outline_html(outline), unsafe_allow_html=True)
                 
                 word_filename = saved_path.stem + ".docx"
                 word_path = output_dir / word_filename
                 
                 # 如果Word文件存在但不在记录中，更新记录
-                if word_path.exists() and st.session_state.current_files['word'] is None:
-                    st.session_state.current_files['word'] = str(word_path)
+                if document_ready(word_path) and get_current_files()['word'] is None:
+                    set_current_files(excel=str(saved_path), word=str(word_path))
                 
+                error = save_failed(word_path)
+                if error:
+                    st.error(f"❌ Word 文档保存失败：{error}。请重新转换。")
+
                 # 文件下载区
-                if word_path.exists():
+                if document_ready(word_path):
                     st.markdown("### 📥 下载")
-                    with open(word_path, "rb") as file:
-                        download_clicked = st.download_button(
-                            label="⬇ 下载 Word 文档",
-                            data=file,
-                            file_name=uploaded_file.name.replace(Path(uploaded_file.name).suffix, '.docx'),
-                            mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-                            use_container_width=True
-                        )
+                    # 使用缓存的字节内容：Streamlit 以媒体文件引用(URL)提供下载，内容不变时不会重复读盘/上传
+                    download_clicked = st.download_button(
+                        label="⬇ 下载 Word 文档",
+                        data=get_document_bytes(word_path),
+                        file_name=uploaded_file.name.replace(Path(uploaded_file.name).suffix, '.docx'),
+                        mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+                        use_container_width=True
+                    )
+                    digest = document_digest(word_path)
+                    if digest:
+                        # 内容指纹不含文档属性中的时间，同一工作簿每次转换的指纹相同
+                        st.caption(f"文档指纹（内容 SHA-256）：`{digest[:16]}`")
                     
                     # 下载后不会删除文件，允许重复下载
                     if download_clicked:
@@ -155,43 +635,92 @@ def main():
                 if convert_clicked:
                     st.markdown("### ⏳ 处理日志")
                     
-                    f = io.StringIO()
-                    with redirect_stdout(f):
+                    # 仅捕获本任务的日志（基于上下文，不影响其他会话）；转换在独立工作进程中执行
+                    crash_message = None
+                    document = None
+                    with admitted_job(uploaded_file, saved_path) as queue_wait, capture_job_logs() as job_log, \
+                            job_progress() as (on_progress, cancel_token), \
+                            job_metrics('convert', uploaded_file, job_log, queue_wait) as job:
                         try:
-                            excel_to_word_converter.excel_to_word(saved_path, word_path, perform_verify=False, open_output=False)
+                            # 文档在内存中生成后返回（OutputBuffer），由界面进程决定落盘
+                            document = get_worker_pool().run('excel_to_word_converter:excel_to_word', saved_path, word_path,
+                                                             perform_verify=False, open_output=False, in_memory=True,
+                                                             on_progress=on_progress, cancel_token=cancel_token,
+                                                             job_stats=job)
+                            if document is None:
+                                job['outcome'] = 'failed'
+                        except JobCancelled as e:
+                            job['outcome'] = 'cancelled'
+                            crash_message = str(e)
+                            logger.warning(f"转换任务已停止: {e}")
+                            cleanup_files(word_path)
+                        except WorkerCrashed as e:
+                            job['outcome'] = 'crashed'
+                            crash_message = str(e)
+                            logger.error(f"转换任务被终止: {e}")
                         except Exception as e:
-                            print(f"发生错误: {e}")
+                            job['outcome'] = 'failed'
+                            logger.exception(f"发生错误: {e}")
+                        except BaseException:
+                            # 页面重跑/停止中断了本次运行：任务已取消，立即清理未完成的输出
+                            cleanup_files(word_path)
+                            raise
                     
-                    log_output = f.getvalue()
+                    log_output = job_log.text()
+                    session_put('convert_log', log_output)
                     st.code(log_output, language="text")
                     
-                    if word_path.exists():
-                        st.session_state.current_files['word'] = str(word_path)
+                    if document is not None:
+                        # 下载与校对直接使用内存中的文档；后台写出完成后登记到期时间
+                        remember_document(word_path, document)
+                        set_current_files(excel=str(saved_path), word=str(word_path))
                         st.success("✅ 转换成功！")
                         st.toast("转换完成")
+                    elif crash_message:
+                        st.error(f"❌ 转换任务被终止：{crash_message}。请检查 Excel 文件是否过大或格式异常。")
                     else:
                         st.error("❌ 转换失败，未生成 Word 文件。")
 
                 # 校对处理
                 if verify_clicked:
-                    if not word_path.exists():
+                    if not document_ready(word_path):
                         st.warning("⚠️ 请先执行转换，生成 Word 文档后再进行校对。")
                     else:
                         st.markdown("### 📋 校对报告")
                         st.info("📌 校对说明：系统将对比服务器上的 Excel 源文件与生成的 Word 文档内容是否一致。")
-                        f_verify = io.StringIO()
                         result = False
-                        module_stats = []
-                        with redirect_stdout(f_verify):
+                        summary = None
+                        with admitted_job(uploaded_file, saved_path) as queue_wait, capture_job_logs() as job_log, \
+                                job_progress() as (on_progress, cancel_token), \
+                                job_metrics('verify', uploaded_file, job_log, queue_wait) as job:
                             try:
-                                result, module_stats = verify_word.verify_consistency(saved_path, word_path)
+                                result, summary = get_worker_pool().run('verify_word:verify_consistency', saved_path,
+                                                                        document_source(word_path, job),
+                                                                        on_progress=on_progress, cancel_token=cancel_token,
+                                                                        job_stats=job)
+                                job['verify_passed'] = int(bool(result))
+                                if not result:
+                                    job['outcome'] = 'mismatch'
+                            except JobCancelled as e:
+                                job['outcome'] = 'cancelled'
+                                logger.warning(f"校对任务已停止: {e}")
+                                st.warning(f"⚠️ 校对任务已停止：{e}")
+                            except WorkerCrashed as e:
+                                job['outcome'] = 'crashed'
+                                logger.error(f"校对任务被终止: {e}")
+                                st.error(f"❌ 校对任务被终止：{e}")
                             except Exception as e:
-                                print(f"校对过程出错: {e}")
-                        
-                        # 保存到 session_state
-                        st.session_state.module_stats = module_stats if module_stats else []
+                                job['outcome'] = 'failed'
+                                logger.exception(f"校对过程出错: {e}")
                         
-                        verify_log = f_verify.getvalue()
+                        # 保存到会话存储（摘要与导出内容只在校对时计算一次）
+                        verify_log = job_log.text()
+                        if summary:
+                            session_put('verify_summary', summary)
+                            session_put('stats_export', build_stats_export(summary))
+                        else:
+                            reset_verify_stats()
+                        session_put('verify_log', verify_log)
                         
                         if result:
                             st.success("✅ 验证通过！Word 文档与 Excel 源文件内容一致。")
@@ -200,73 +729,81 @@ def main():
                             
                         with st.expander("查看详细校对日志", expanded=False):
                             st.code(verify_log, language="text")
+
+                # 文本格式：Markdown / HTML（与 Word 使用同一文档计划，不生成 .docx，HTML 可直接在页面中预览）
+                st.markdown("### 📝 文本格式")
+                if st.button(" 生成 Markdown / HTML", use_container_width=True):
+                    text_exports = None
+                    with admitted_job(uploaded_file, saved_path) as queue_wait, capture_job_logs() as job_log, \
+                            job_progress() as (on_progress, cancel_token), \
+                            job_metrics('text', uploaded_file, job_log, queue_wait) as job:
+                        try:
+                            text_exports = get_worker_pool().run('excel_to_word_converter:excel_to_text', saved_path,
+                                                                 formats=('markdown', 'html'),
+                                                                 on_progress=on_progress, cancel_token=cancel_token,
+                                                                 job_stats=job)
+                            if not text_exports:
+                                job['outcome'] = 'failed'
+                        except JobCancelled as e:
+                            job['outcome'] = 'cancelled'
+                            logger.warning(f"文本生成任务已停止: {e}")
+                            st.warning(f"⚠️ 文本生成任务已停止：{e}")
+                        except WorkerCrashed as e:
+                            job['outcome'] = 'crashed'
+                            logger.error(f"文本生成任务被终止: {e}")
+                            st.error(f"❌ 文本生成任务被终止：{e}")
+                        except Exception as e:
+                            job['outcome'] = 'failed'
+                            logger.exception(f"文本生成出错: {e}")
+                    if text_exports:
+                        session_put('text_exports', text_exports)
+                    else:
+                        st.error("❌ 文本生成失败，请查看日志。")
+                        with st.expander("查看日志", expanded=False):
+                            st.code(job_log.text(), language="text")
+
+                text_exports = session_get('text_exports')
+                if text_exports:
+                    export_stem = Path(uploaded_file.name).stem
+                    md_col, html_col = st.columns(2)
+                    with md_col:
+                        st.download_button("⬇ 下载 Markdown", data=text_exports['markdown'].encode('utf-8'),
+                                           file_name=f"{export_stem}.md", mime="text/markdown",
+                                           use_container_width=True)
+                    with html_col:
+                        st.download_button("⬇ 下载 HTML", data=text_exports['html'].encode('utf-8'),
+                                           file_name=f"{export_stem}.html", mime="text/html",
+                                           use_container_width=True)
+                    with st.expander("👁 HTML 预览", expanded=True):
+                        components.html(text_exports['html'], height=600, scrolling=True)
+
+                # 非本次操作时，从会话存储中回显上次的日志
+                if not convert_clicked and session_get('convert_log'):
+                    with st.expander("查看上次转换日志", expanded=False):
+                        st.code(session_get('convert_log'), language="text")
+                if not verify_clicked and session_get('verify_log'):
+                    with st.expander("查看上次校对日志", expanded=False):
+                        st.code(session_get('verify_log'), language="text")
         else:
             # 上传区被清空（用户主动移除文件）：清理当前会话文件
-            if st.session_state.current_files.get('excel'):
-                cleanup_files(st.session_state.current_files.get('excel'), st.session_state.current_files.get('word'))
-                st.session_state.current_files = {'excel': None, 'word': None}
-            # 清空统计数据
-            st.session_state.module_stats = []
+            current_files = get_current_files()
+            if current_files.get('excel'):
+                cleanup_files(current_files.get('excel'), current_files.get('word'))
+                set_current_files()
+            # 清空统计数据与日志
+            reset_verify_stats()
+            get_session_store().delete(st.session_state.session_handle, 'convert_log', 'text_exports')
     
     # 右侧边栏：显示模块统计
     with stats_col:
         st.markdown('<div class="stat-container"><div class="stat-header">模块功能统计</div>', unsafe_allow_html=True)
         
-        if st.session_state.module_stats:
+        summary = session_get('verify_summary')
+        if summary:
             # 导出按钮放在顶部
-            export_df = pd.DataFrame(st.session_state.module_stats)
-            
-            # 确保列顺序，使导出更直观
-            cols_order = ['一级模块名称', '二级模块名称', '三级模块名称', '功能过程名称', '子过程数量', 'CFP总和', '子过程详情']
-            # 仅保留存在的列
-            final_cols = [c for c in cols_order if c in export_df.columns]
-            export_df = export_df[final_cols]
-            
-            # 计算汇总统计
-            total_l1 = export_df['一级模块名称'].nunique() if '一级模块名称' in export_df else 0
-            total_l2 = export_df['二级模块名称'].nunique() if '二级模块名称' in export_df else 0
-            total_l3 = export_df['三级模块名称'].nunique() if '三级模块名称' in export_df else 0
-            total_processes = len(export_df)
-            total_subprocesses = export_df['子过程数量'].sum() if '子过程数量' in export_df else 0
-            
-            # 生成导出Excel
-            excel_buffer = io.BytesIO()
-            with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
-                # 汇总表
-                summary_data = [
-                    {'统计项': '一级模块数量', '数值': total_l1},
-                    {'统计项': '二级模块数量', '数值': total_l2},
-                    {'统计项': '三级模块数量', '数值': total_l3},
-                    {'统计项': '功能过程总数', '数值': total_processes},
-                    {'统计项': '子过程总数', '数值': total_subprocesses}
-                ]
-                pd.DataFrame(summary_data).to_excel(writer, index=False, sheet_name='汇总统计')
-                
-                # 详细数据表 (聚合到三级模块)
-                if not export_df.empty:
-                    # 按三级模块聚合，只保留模块名称和子过程总数
-                    agg_cols = ['一级模块名称', '二级模块名称', '三级模块名称']
-                    # 确保这些列存在
-                    agg_cols = [c for c in agg_cols if c in export_df.columns]
-                    
-                    if agg_cols:
-                        # sort=False 保持原始出现顺序
-                        # 聚合：子过程数量求和；CFP总和取首个（已按模块计算）
-                        detailed_df = export_df.groupby(agg_cols, sort=False).agg({
-                            '子过程数量': 'sum',
-                            'CFP总和': 'first'
-                        }).reset_index()
-                    else:
-                        detailed_df = export_df
-                else:
-                    detailed_df = pd.DataFrame()
-
-                detailed_df.to_excel(writer, index=False, sheet_name='详细数据')
-            excel_buffer.seek(0)
-            
             st.download_button(
                 label="⬇ 导出具体数据统计",
-                data=excel_buffer,
+                data=session_get('stats_export'),
                 file_name="module_stats.xlsx",
                 mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                 use_container_width=True
@@ -276,23 +813,23 @@ def main():
             st.markdown(f"""
             <div class="summary-grid">
                 <div class="summary-card">
-                    <div class="summary-val">{total_l1}</div>
+                    <div class="summary-val">{summary.total_l1}</div>
                     <div class="summary-label">一级模块</div>
                 </div>
                 <div class="summary-card">
-                    <div class="summary-val">{total_l2}</div>
+                    <div class="summary-val">{summary.total_l2}</div>
                     <div class="summary-label">二级模块</div>
                 </div>
                 <div class="summary-card">
-                    <div class="summary-val">{total_l3}</div>
+                    <div class="summary-val">{summary.total_l3}</div>
                     <div class="summary-label">三级模块</div>
                 </div>
                 <div class="summary-card">
-                    <div class="summary-val">{total_processes}</div>
+                    <div class="summary-val">{summary.total_processes}</div>
                     <div class="summary-label">功能过程</div>
                 </div>
                 <div class="summary-card" style="grid-column: span 2;">
-                    <div class="summary-val">{total_subprocesses}</div>
+                    <div class="summary-val">{summary.total_subprocesses}</div>
                     <div class="summary-label">子过程总数</div>
                 </div>
             </div>
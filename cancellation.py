@@ -0,0 +1,58 @@
+"""
+    任务取消与超时
+    功能: CancelToken 由调用方持有并传入 excel_to_word / verify_consistency（参数 cancel_token），
+         任务在模块组之间、校对阶段之间调用 check()，被取消或超过墙钟时限时抛出 JobCancelled / JobTimeout。
+    注意: 跨进程使用时传入 multiprocessing.Event 作为取消标志（见 worker_pool）。
+"""
+
+import os
+import threading
+import time
+
+JOB_TIMEOUT_SECONDS = int(os.getenv('JOB_TIMEOUT_SECONDS', '600'))  # 单个任务墙钟时限，0 表示不限制
+
+
+class JobCancelled(Exception):
+    """任务已被取消"""
+
+
+class JobTimeout(JobCancelled):
+    """任务超过墙钟时限"""
+
+
+class CancelToken:
+    """取消令牌：cancel() 置位取消标志；check() 在任务检查点调用
+
+    poll: 可选回调，每次 check() 时调用（例如让界面有机会响应用户操作）
+    """
+
+    def __init__(self, timeout=None, event=None, poll=None):
+        self.timeout = timeout if timeout and timeout > 0 else None
+        self.deadline = time.monotonic() + self.timeout if self.timeout else None
+        self._event = event if event is not None else threading.Event()
+        self._poll = poll
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    @property
+    def timed_out(self):
+        return self.deadline is not None and time.monotonic() > self.deadline
+
+    def check(self):
+        if self._poll is not None:
+            self._poll()
+        if self.cancelled:
+            raise JobCancelled("任务已取消")
+        if self.timed_out:
+            raise JobTimeout(f"任务超过时限（{self.timeout:.0f} 秒）")
+
+
+def check_cancelled(cancel_token):
+    """cancel_token 可为 None 时的便捷检查"""
+    if cancel_token is not None:
+        cancel_token.check()
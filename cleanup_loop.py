@@ -1,26 +1,49 @@
 """
     后台清理守护进程
-    启动方式: 与 run_web.bat 同时启动，独立后台运行。
-    功能: 每隔 INTERVAL_SECONDS 秒扫描 excel_input 与 word_output，删除超过 RETENTION_HOURS 未访问的临时文件。
+    启动方式: 与 run_web.bat 同时启动，独立后台运行；或由 app.py 在后台线程中启动。
+    功能: 删除 excel_input 与 word_output 中超过 RETENTION_HOURS 未修改的临时文件，
+         以及 session_data 下超过保留时长未更新的会话目录。
+    实现: 维护一个按到期时间排序的最小堆（过期索引）。上传保存、转换输出、新建会话时调用 schedule_expiry 登记，
+         启动时用一次 scandir 对账把已有文件补进索引；守护线程睡眠到最近的到期时间，
+         到期后再 stat 一次：期间被重新写入（mtime 变化）的文件顺延，否则删除。
+         每隔 RECONCILE_INTERVAL_SECONDS 再对账一次，兜底其他进程（如独立运行或已退出的界面实例）创建的文件。
+    磁盘预算: excel_input 与 word_output 的文件总大小超过 DISK_BUDGET_MB 时，在写入新文件的同时
+         按最近使用顺序淘汰最久未使用、且不属于任何活跃会话（set_session_files 登记）的文件。
+         用量与使用顺序不保存在进程内，而是在锁 BUDGET_LOCK_PATH 下扫描共享目录得到
+         （最近使用时间取 atime 与 mtime 的较大者，touch_file 只更新 atime），所有实例按同一份全局用量淘汰。
+    多实例: 多个界面实例共享同一组目录时，通过锁文件 CLEANUP_LOCK_PATH 选举唯一的清理负责实例，
+         只有它执行目录对账，按到期时间清理全部实例（包括已退出的实例）写入的文件；
+         其余实例只按到期时间清理自己登记的文件，每隔 OWNER_RETRY_SECONDS 尝试接管（负责实例退出后锁自动释放）。
+         会话使用中的文件记录在会话目录的 IN_USE_FILENAME 中，所有实例淘汰文件时都会跳过。
     注意: 仅删除基于时间戳命名的文件。
 """
 
+import heapq
 import os
 import re
+import shutil
+import stat
+import threading
 import time
-from typing import Tuple
 from pathlib import Path
-from datetime import datetime, timedelta
+from file_store import FileLock, TEMP_PREFIX, atomic_write
 from logger import get_logger
+from metrics import CLEANUP_DELETED_FILES, CLEANUP_FREED_BYTES, CLEANUP_DELETED_SESSIONS
 
 logger = get_logger("cleanup_loop")
 
 BASE_DIR = Path(__file__).parent.resolve()
 INPUT_DIR = BASE_DIR / 'excel_input'
 OUTPUT_DIR = BASE_DIR / 'word_output'
+SESSION_DIR = BASE_DIR / 'session_data'
 RETENTION_HOURS = 1           # 保留小时
-INTERVAL_SECONDS = 1800          # 清理间隔: 30分钟
+RECONCILE_INTERVAL_SECONDS = 15 * 60  # 兜底对账间隔: 15分钟，不超过保留时长（0 表示只在启动时对账）
+DISK_BUDGET_MB = int(os.getenv('DISK_BUDGET_MB', '2048'))  # 上传与输出文件的总大小上限（0 表示不限制）
 TIMESTAMP_PATTERN = re.compile(r".+_(\d{13})\..+")  # 仅匹配末尾含13位毫秒时间戳的文件名
+CLEANUP_LOCK_PATH = BASE_DIR / 'cleanup.lock'  # 清理负责实例锁
+BUDGET_LOCK_PATH = BASE_DIR / 'disk_budget.lock'  # 磁盘预算淘汰锁（各实例串行扫描与淘汰）
+OWNER_RETRY_SECONDS = 30      # 非负责实例尝试接管的间隔
+IN_USE_FILENAME = 'in_use_files.txt'  # 会话目录中记录使用中文件的清单
 
 INPUT_DIR.mkdir(exist_ok=True)
 OUTPUT_DIR.mkdir(exist_ok=True)
@@ -30,28 +53,6 @@ def is_timestamp_file(path: Path) -> bool:
     return TIMESTAMP_PATTERN.match(path.name) is not None
 
 
-def cleanup_dir(directory: Path, cutoff: datetime) -> Tuple[int, int]:
-    deleted_count = 0
-    freed_bytes = 0
-    for file_path in directory.iterdir():
-        if not file_path.is_file():
-            continue
-        if not is_timestamp_file(file_path):
-            continue  # 跳过非临时命名文件
-        try:
-            # 使用修改时间(mtime)而非访问时间(atime)，避免因扫描/查看导致无法清理
-            last_modified = datetime.fromtimestamp(file_path.stat().st_mtime)
-            if last_modified < cutoff:
-                size = file_path.stat().st_size
-                file_path.unlink()
-                deleted_count += 1
-                freed_bytes += size
-        except Exception:
-            # 忽略单文件异常
-            pass
-    return deleted_count, freed_bytes
-
-
 def format_size(bytes_value: int) -> str:
     if bytes_value < 1024:
         return f"{bytes_value} B"
@@ -60,24 +61,317 @@ def format_size(bytes_value: int) -> str:
     return f"{bytes_value/1024/1024:.2f} MB"
 
 
+def directory_bytes(directory):
+    """目录中文件的总大小（不递归）"""
+    total = 0
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file():
+                        total += entry.stat().st_size
+                except OSError:
+                    pass
+    except FileNotFoundError:
+        pass
+    return total
+
+
+def scan_store():
+    """扫描 excel_input 与 word_output 中的时间戳文件，返回 [(最近使用时间, 路径, 大小)]，最久未使用在前"""
+    files = []
+    for directory in (INPUT_DIR, OUTPUT_DIR):
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if TIMESTAMP_PATTERN.match(entry.name) is None or entry.name.startswith(TEMP_PREFIX):
+                        continue
+                    try:
+                        if not entry.is_file():
+                            continue
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    files.append((max(st.st_atime, st.st_mtime), entry.path, st.st_size))
+        except FileNotFoundError:
+            continue
+    files.sort()
+    return files
+
+
+class ExpiryScheduler:
+    """过期索引：最小堆保存 (到期时间, 路径)，run() 睡眠到最近的到期时间再处理"""
+
+    def __init__(self, retention_seconds=RETENTION_HOURS * 3600,
+                 reconcile_interval=RECONCILE_INTERVAL_SECONDS, disk_budget_mb=DISK_BUDGET_MB):
+        self.retention_seconds = retention_seconds
+        self.reconcile_interval = reconcile_interval
+        self.disk_budget_bytes = disk_budget_mb * 1024 * 1024
+        self._heap = []
+        self._deadlines = {}  # 路径 -> 当前有效的到期时间（堆中其余同路径条目视为作废）
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._deadlines)
+
+    def schedule(self, path, deadline=None):
+        """登记（或更新）路径的到期时间；默认为当前时间 + 保留时长"""
+        if deadline is None:
+            deadline = time.time() + self.retention_seconds
+        path = str(path)
+        with self._cond:
+            self._deadlines[path] = deadline
+            heapq.heappush(self._heap, (deadline, path))
+            if self._heap[0][1] == path:
+                self._cond.notify()  # 新的最早到期时间：唤醒守护线程重新计算睡眠时长
+
+    def forget(self, path):
+        """注销已被删除的文件（如用户移除上传时）：到期条目随之作废"""
+        with self._cond:
+            self._deadlines.pop(str(path), None)
+
+    @property
+    def usage_bytes(self):
+        """共享目录中时间戳文件的总大小（所有实例写入的文件）"""
+        return sum(size for _, _, size in scan_store())
+
+    def enforce_budget(self, keep=()):
+        """总大小超出磁盘预算时，淘汰最久未使用且不在使用中的文件；返回淘汰的文件数
+        在锁 BUDGET_LOCK_PATH 下扫描共享目录，多个实例同时写入时不会重复淘汰或各自只看到自己的文件
+
+        :param keep: 额外保留的路径（如刚写入、尚未登记到会话的文件）
+        """
+        if self.disk_budget_bytes <= 0:
+            return 0
+        with FileLock(BUDGET_LOCK_PATH):
+            files = scan_store()
+            remaining = sum(size for _, _, size in files)
+            if remaining <= self.disk_budget_bytes:
+                return 0
+            in_use = read_session_files() | {str(path) for path in keep}
+            deleted = freed_bytes = 0
+            for _, path, size in files:
+                if remaining <= self.disk_budget_bytes:
+                    break
+                if path in in_use:
+                    continue
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass  # 已被其他途径删除
+                except OSError:
+                    continue  # 仍被占用（到期时由守护线程重试）
+                else:
+                    deleted += 1
+                    freed_bytes += size
+                remaining -= size
+                self.forget(path)  # 堆中对应条目随之作废
+        if deleted:
+            CLEANUP_DELETED_FILES.inc(deleted, reason='evicted')
+            CLEANUP_FREED_BYTES.inc(freed_bytes, reason='evicted')
+            logger.info(f"[清理守护] 超出磁盘预算 {format_size(self.disk_budget_bytes)}，"
+                        f"淘汰 {deleted} 个最久未使用的文件, 释放 {format_size(freed_bytes)}")
+        if remaining > self.disk_budget_bytes:
+            logger.warning(f"[清理守护] 使用中的文件共 {format_size(remaining)}，仍超出磁盘预算 "
+                           f"{format_size(self.disk_budget_bytes)}")
+        return deleted
+
+    def reconcile(self):
+        """扫描一次目录，把已有的临时文件与会话目录按 mtime 登记到索引；返回登记数量"""
+        count = 0
+        for directory, want_dir in ((INPUT_DIR, False), (OUTPUT_DIR, False), (SESSION_DIR, True)):
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        try:
+                            if want_dir:
+                                if not entry.is_dir(follow_symlinks=False):
+                                    continue
+                            elif not entry.is_file():
+                                continue
+                            elif entry.name.startswith(TEMP_PREFIX):
+                                # 中断写出遗留的临时文件：只按保留时长清理，不计入磁盘预算
+                                self.schedule(entry.path, entry.stat().st_mtime + self.retention_seconds)
+                                continue
+                            elif TIMESTAMP_PATTERN.match(entry.name) is None:
+                                continue  # 跳过非临时命名文件
+                            self.schedule(entry.path, entry.stat().st_mtime + self.retention_seconds)
+                            count += 1
+                        except OSError:
+                            pass
+            except FileNotFoundError:
+                continue
+        return count
+
+    def _pop_due(self, now):
+        """取出所有已到期且未作废的路径"""
+        due = []
+        with self._cond:
+            while self._heap and self._heap[0][0] <= now:
+                deadline, path = heapq.heappop(self._heap)
+                if self._deadlines.get(path) == deadline:
+                    del self._deadlines[path]
+                    due.append(path)
+        return due
+
+    def _expire(self, path, now):
+        """删除到期路径；返回释放的字节数（会话目录计 0），未删除时返回 None"""
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None  # 已被用户移除或其他途径删除
+        except OSError:
+            return None
+        is_dir = stat.S_ISDIR(st.st_mode)
+        deadline = st.st_mtime + self.retention_seconds
+        if deadline > now:
+            self.schedule(path, deadline)  # 期间被重新写入：按新的 mtime 顺延
+            return None
+        try:
+            if is_dir:
+                shutil.rmtree(path, ignore_errors=True)
+                return 0
+            os.unlink(path)
+            return st.st_size
+        except OSError:
+            # 忽略单文件异常（如 Windows 上文件仍被占用）
+            return None
+
+    def _wait(self, until):
+        """睡眠到最近的到期时间或下一次对账时间（有更早的登记时提前唤醒）"""
+        with self._cond:
+            wake_at = until
+            if self._heap:
+                wake_at = min(wake_at, self._heap[0][0]) if wake_at else self._heap[0][0]
+            if wake_at is None:
+                self._cond.wait()
+            else:
+                timeout = wake_at - time.time()
+                if timeout > 0:
+                    self._cond.wait(timeout)
+
+    def run(self, owner_lock=None):
+        """
+        守护线程主循环
+        :param owner_lock: 清理负责实例锁（FileLock）；为 None 时本进程直接负责目录对账
+        """
+        logger.info("[清理守护] 启动成功，保留: %gh，兜底对账间隔: %ds" % (self.retention_seconds / 3600, self.reconcile_interval))
+        is_owner = owner_lock is None
+        next_election = None if is_owner else time.time()
+        next_reconcile = time.time() if is_owner else None
+        while True:
+            now = time.time()
+            if next_election is not None and now >= next_election:
+                if owner_lock.acquire(blocking=False):
+                    logger.info(f"[清理守护] 本实例（pid={os.getpid()}）成为清理负责实例")
+                    is_owner = True
+                    next_election = None
+                    next_reconcile = now
+                else:
+                    next_election = now + OWNER_RETRY_SECONDS
+            if next_reconcile is not None and now >= next_reconcile:
+                count = self.reconcile()
+                logger.info(f"[清理守护] 对账完成，索引 {count} 个文件/会话目录，文件共 {format_size(self.usage_bytes)}")
+                self.enforce_budget()
+                next_reconcile = now + self.reconcile_interval if self.reconcile_interval > 0 else None
+            deleted_files = deleted_sessions = freed_bytes = 0
+            for path in self._pop_due(now):
+                freed = self._expire(path, now)
+                if freed is None:
+                    continue
+                if Path(path).parent == SESSION_DIR:
+                    deleted_sessions += 1
+                else:
+                    deleted_files += 1
+                    freed_bytes += freed
+            if deleted_sessions > 0:
+                CLEANUP_DELETED_SESSIONS.inc(deleted_sessions)
+                logger.info(f"[清理守护] 删除 {deleted_sessions} 个过期会话目录")
+            if deleted_files > 0:
+                CLEANUP_DELETED_FILES.inc(deleted_files, reason='expired')
+                CLEANUP_FREED_BYTES.inc(freed_bytes, reason='expired')
+                logger.info(f"[清理守护] 删除 {deleted_files} 个文件, 释放 {format_size(freed_bytes)}")
+            wake_ats = [t for t in (next_reconcile, next_election) if t is not None]
+            self._wait(min(wake_ats) if wake_ats else None)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_expiry_scheduler():
+    """进程级共享的过期索引"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = ExpiryScheduler()
+    return _scheduler
+
+
+def schedule_expiry(path):
+    """登记新创建（或重新写入）的文件/会话目录，保留时长后由守护线程删除；
+    新文件同时计入磁盘预算，超出时立即淘汰最久未使用的文件"""
+    path = Path(path).resolve()
+    scheduler = get_expiry_scheduler()
+    if path.parent == SESSION_DIR:
+        scheduler.schedule(path)
+        return
+    if not is_timestamp_file(path) or not path.is_file():
+        return
+    scheduler.schedule(path)
+    scheduler.enforce_budget(keep=(path,))
+
+
+def remove_file(path):
+    """删除文件并从过期索引中注销；文件不存在时只注销"""
+    path = Path(path).resolve()
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+    get_expiry_scheduler().forget(path)
+
+
+def touch_file(path):
+    """标记文件被再次使用（磁盘预算按最近使用顺序淘汰）：只更新 atime，mtime 不变，不影响到期时间"""
+    try:
+        st = os.stat(path)
+        os.utime(path, ns=(time.time_ns(), st.st_mtime_ns))
+    except OSError:
+        pass
+
+
+def set_session_files(session_id, *paths):
+    """登记会话当前使用的文件（写入会话目录，所有实例淘汰文件时跳过；会话目录过期删除后自动解除）"""
+    session_dir = SESSION_DIR / session_id
+    if not session_dir.is_dir():
+        return
+    content = ''.join(f"{Path(path).resolve()}\n" for path in paths if path)
+    atomic_write(session_dir / IN_USE_FILENAME, content.encode('utf-8'))
+
+
+def read_session_files():
+    """所有会话使用中的文件路径"""
+    in_use = set()
+    try:
+        with os.scandir(SESSION_DIR) as entries:
+            for entry in entries:
+                if not entry.is_dir(follow_symlinks=False):
+                    continue
+                try:
+                    with open(os.path.join(entry.path, IN_USE_FILENAME), encoding='utf-8') as f:
+                        in_use.update(line for line in f.read().splitlines() if line)
+                except OSError:
+                    continue
+    except FileNotFoundError:
+        pass
+    return in_use
+
+
 def run_loop():
-    logger.info("[清理守护] 启动成功，间隔: %ds，保留: %dh" % (INTERVAL_SECONDS, RETENTION_HOURS))
-    while True:
-        start_ts = time.time()
-        now = datetime.now()
-        cutoff = now - timedelta(hours=RETENTION_HOURS)
-        in_del, in_bytes = cleanup_dir(INPUT_DIR, cutoff)
-        out_del, out_bytes = cleanup_dir(OUTPUT_DIR, cutoff)
-        total_del = in_del + out_del
-        total_bytes = in_bytes + out_bytes
-        if total_del > 0:
-            logger.info(f"[清理守护] {now:%Y-%m-%d %H:%M:%S} 删除 {total_del} 个文件, 释放 {format_size(total_bytes)}")
-        else:
-            logger.info(f"[清理守护] {now:%Y-%m-%d %H:%M:%S} 无需清理")
-        # 睡眠剩余时间
-        elapsed = time.time() - start_ts
-        sleep_sec = max(5, INTERVAL_SECONDS - elapsed)
-        time.sleep(sleep_sec)
+    get_expiry_scheduler().run(FileLock(CLEANUP_LOCK_PATH))
 
 
 if __name__ == '__main__':
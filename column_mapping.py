@@ -0,0 +1,64 @@
+"""
+    工作表列映射规则
+    功能: 转换、流式读取与结构预览共用的数据 Sheet 选择、表头识别、标准列与模块分组键定义。
+    注意: 本模块不依赖 pandas / python-docx，界面进程可直接导入。
+"""
+
+from logger import get_logger
+
+logger = get_logger("column_mapping")
+
+# 模块分组键（CustomerReq 确保不同客户需求下的相同模块不会被合并）
+MODULE_KEYS = ['CustomerReq', 'Level1', 'Level2', 'Level3']
+
+# 标准列 -> 表头关键字
+REQUIRED_COLUMNS = {
+    'CustomerReq': ['客户需求'],
+    'Level1': ['一级模块'],
+    'Level2': ['二级模块'],
+    'Level3': ['三级模块'],
+    'Process': ['功能过程'],
+    'Description': ['子过程描述']
+}
+# "功能过程"列中的无效关键字（这些应该在子过程描述中）
+INVALID_PROCESS_KEYWORDS = ['呈现', '查询', '保存', '输入', '校验', '输出']
+
+# CFP 列表头关键字（仅结构预览统计使用）
+CFP_COLUMNS = ['CFP', '功能点CFP', '功能点（CFP）']
+
+
+def pick_data_sheet(sheet_names):
+    """查找包含数据的Sheet：优先名称包含'拆分表'/'功能点'的，否则使用第一个"""
+    for sheet in sheet_names:
+        if '拆分表' in sheet or '功能点' in sheet:
+            logger.info(f"使用Sheet: {sheet}")
+            return sheet
+    # 如果没找到特定名称的sheet，尝试使用最大的sheet（通常数据最多）
+    # 或者默认使用第一个
+    target_sheet = sheet_names[0]
+    logger.warning(f"未找到名称包含'拆分表'的Sheet，默认使用: {target_sheet}")
+    return target_sheet
+
+
+def score_header_row(values):
+    """表头行得分：同时包含"客户需求"和"一级模块"，或包含"功能过程"和"子过程描述"的行得分高"""
+    row_text = ' '.join(values)
+    score = 0
+    if '客户需求' in row_text: score += 1
+    if '一级模块' in row_text: score += 1
+    if '功能过程' in row_text or '功能名称' in row_text: score += 1
+    if '子过程描述' in row_text or '功能描述' in row_text: score += 1
+    return score
+
+
+def match_columns(header, columns=None):
+    """按表头精确匹配标准列，返回 标准列 -> 列序号（同名列取第一个）"""
+    columns = REQUIRED_COLUMNS if columns is None else columns
+    names = [str(v).strip() if v is not None else '' for v in header]
+    col_index = {}
+    for key, keywords in columns.items():
+        for idx, name in enumerate(names):
+            if name in keywords:
+                col_index[key] = idx
+                break
+    return col_index
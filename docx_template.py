@@ -0,0 +1,176 @@
+"""
+    Word 文档模板缓存
+    功能: 每个进程只解析一次文档模板（python-docx 默认模板，或 DOCX_TEMPLATE 指定的公司 .dotx/.docx），
+         并建立 样式名称 -> 样式ID 索引；每个任务从已解析的模板深拷贝出新文档，
+         添加标题时直接写入样式ID，不再逐次在样式表中按名称查找。
+         可重现输出：核心属性（创建/修改时间、修订号）在复制新文档时固定，zip 条目时间由 normalize_zip_timestamps 固定，
+         同一工作簿多次转换得到完全相同的字节（用于比对文件、构建可重现的发布物）。
+         文档缓存不依赖该选项：缓存键是不含核心属性与 zip 条目时间的内容指纹（file_store.package_digest）。
+    配置: 环境变量 DOCX_TEMPLATE 为模板文件路径（留空使用 python-docx 默认模板）。
+         .dotx 模板会把主文档的内容类型从“模板”改为“文档”后再加载。
+         DETERMINISTIC_DOCX 非 0 时开启可重现输出（默认关闭：核心属性沿用模板，zip 条目为实际写出时间）；
+         new_document(deterministic=) 可按文档覆盖。
+"""
+
+import copy
+import io
+import os
+import struct
+import threading
+import zipfile
+from datetime import datetime
+from pathlib import Path
+from docx import Document
+from docx.enum.style import WD_STYLE_TYPE
+from logger import get_logger
+
+logger = get_logger("docx_template")
+
+DOCX_TEMPLATE = os.getenv('DOCX_TEMPLATE', '')
+DETERMINISTIC_DOCX = os.getenv('DETERMINISTIC_DOCX', '0') != '0'
+
+# 可重现输出使用的固定时间：zip 条目时间可表示的最早时刻，核心属性的创建/修改时间与之相同
+FIXED_TIMESTAMP = datetime(1980, 1, 1)
+_FIXED_DOS_TIME = 0
+_FIXED_DOS_DATE = ((FIXED_TIMESTAMP.year - 1980) << 9) | (FIXED_TIMESTAMP.month << 5) | FIXED_TIMESTAMP.day
+
+_ZIP_END_RECORD = struct.Struct('<4s4H2LH')          # 中央目录结束记录
+_ZIP_CENTRAL_HEADER = struct.Struct('<4s6H3L5H2L')   # 中央目录条目
+_ZIP_END_SIGNATURE = b'PK\x05\x06'
+_ZIP_CENTRAL_SIGNATURE = b'PK\x01\x02'
+_ZIP_LOCAL_TIME_OFFSET = 10    # 本地文件头中修改时间的位置
+_ZIP_CENTRAL_TIME_OFFSET = 12  # 中央目录条目中修改时间的位置
+
+_TEMPLATE_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.template.main+xml'
+_DOCUMENT_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml'
+
+_template = None
+_template_lock = threading.Lock()
+
+
+def _read_template_bytes(template_path):
+    """读取模板文件；.dotx 修正主文档内容类型后返回可按 .docx 加载的字节"""
+    data = Path(template_path).read_bytes()
+    if Path(template_path).suffix.lower() != '.dotx':
+        return data
+    source = zipfile.ZipFile(io.BytesIO(data))
+    buffer = io.BytesIO()
+    with source, zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as target:
+        for info in source.infolist():
+            content = source.read(info)
+            if info.filename == '[Content_Types].xml':
+                content = content.replace(_TEMPLATE_CONTENT_TYPE.encode(), _DOCUMENT_CONTENT_TYPE.encode())
+            target.writestr(info, content)
+    return buffer.getvalue()
+
+
+def pin_core_properties(doc):
+    """固定文档核心属性（创建/修改时间、修订号），不随生成时间变化"""
+    properties = doc.core_properties
+    properties.created = FIXED_TIMESTAMP
+    properties.modified = FIXED_TIMESTAMP
+    properties.revision = 1
+
+
+def normalize_zip_timestamps(stream):
+    """把 zip 中所有条目的修改时间就地改为 FIXED_TIMESTAMP（只改本地文件头与中央目录，不重新压缩）
+    stream 为可读写、可定位的文件对象；条目顺序与内容保持不变"""
+    size = stream.seek(0, io.SEEK_END)
+    tail_size = min(size, _ZIP_END_RECORD.size + 0xFFFF)  # 结束记录之后最多有 64KB 注释
+    stream.seek(size - tail_size)
+    tail = stream.read(tail_size)
+    position = tail.rfind(_ZIP_END_SIGNATURE)
+    if position < 0:
+        raise zipfile.BadZipFile("未找到 zip 中央目录")
+    _, _, _, _, count, directory_size, directory_offset, _ = _ZIP_END_RECORD.unpack_from(tail, position)
+    stream.seek(directory_offset)
+    directory = bytearray(stream.read(directory_size))
+    fixed = struct.pack('<2H', _FIXED_DOS_TIME, _FIXED_DOS_DATE)
+    offset = 0
+    for _ in range(count):
+        fields = _ZIP_CENTRAL_HEADER.unpack_from(directory, offset)
+        if fields[0] != _ZIP_CENTRAL_SIGNATURE:
+            raise zipfile.BadZipFile("zip 中央目录条目损坏")
+        name_length, extra_length, comment_length, local_offset = fields[10], fields[11], fields[12], fields[16]
+        directory[offset + _ZIP_CENTRAL_TIME_OFFSET:offset + _ZIP_CENTRAL_TIME_OFFSET + 4] = fixed
+        stream.seek(local_offset + _ZIP_LOCAL_TIME_OFFSET)
+        stream.write(fixed)
+        offset += _ZIP_CENTRAL_HEADER.size + name_length + extra_length + comment_length
+    stream.seek(directory_offset)
+    stream.write(directory)
+    stream.seek(0, io.SEEK_END)
+
+
+class DocumentTemplate:
+    """已解析的文档模板：new_document() 深拷贝出独立文档，style_id() 查询段落样式ID"""
+
+    def __init__(self, template_path=None):
+        self.template_path = template_path or None
+        if self.template_path:
+            self._document = Document(io.BytesIO(_read_template_bytes(self.template_path)))
+            logger.info(f"已加载文档模板: {self.template_path}")
+        else:
+            self._document = Document()
+        self._lock = threading.Lock()
+        self._package_bytes = {}
+
+        # 样式名称 -> 样式ID（默认段落样式对应 None，与 python-docx 设置样式时的行为一致）
+        styles = self._document.styles
+        self._style_ids = {}
+        for style in styles:
+            if style.type == WD_STYLE_TYPE.PARAGRAPH and style.name is not None:
+                self._style_ids.setdefault(style.name, styles.get_style_id(style, WD_STYLE_TYPE.PARAGRAPH))
+
+    def new_document(self, deterministic=None):
+        """从已解析的模板复制出一个新文档（比重新解压、解析模板快）
+        :param deterministic: 是否固定核心属性，默认取 DETERMINISTIC_DOCX"""
+        with self._lock:
+            doc = copy.deepcopy(self._document)
+        if DETERMINISTIC_DOCX if deterministic is None else deterministic:
+            pin_core_properties(doc)
+        return doc
+
+    def package_bytes(self, deterministic=None):
+        """模板保存后的 .docx 字节（流式写出时提供除正文外的其余部件），按是否固定核心属性分别缓存"""
+        if deterministic is None:
+            deterministic = DETERMINISTIC_DOCX
+        with self._lock:
+            data = self._package_bytes.get(deterministic)
+        if data is None:
+            buffer = io.BytesIO()
+            self.new_document(deterministic).save(buffer)
+            data = buffer.getvalue()
+            with self._lock:
+                data = self._package_bytes.setdefault(deterministic, data)
+        return data
+
+    def style_id(self, style_name):
+        """段落样式ID；模板中没有该样式时抛出 KeyError"""
+        return self._style_ids[style_name]
+
+
+def get_template():
+    """进程级共享模板（首次调用时加载）"""
+    global _template
+    if _template is None:
+        with _template_lock:
+            if _template is None:
+                _template = DocumentTemplate(DOCX_TEMPLATE)
+    return _template
+
+
+def new_document(deterministic=None):
+    """基于共享模板创建新文档（deterministic 为 None 时取 DETERMINISTIC_DOCX）"""
+    return get_template().new_document(deterministic)
+
+
+def add_heading(doc, text, level):
+    """与 doc.add_heading 相同，但直接使用模板的样式ID索引，不在样式表中逐次查找"""
+    try:
+        style_id = get_template().style_id(f"Heading {level}")
+    except KeyError:
+        # 模板中没有该标题样式：交给 python-docx 处理（会给出明确的错误信息）
+        return doc.add_heading(text, level)
+    paragraph = doc.add_paragraph(text)
+    paragraph._p.style = style_id
+    return paragraph
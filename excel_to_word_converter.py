@@ -5,13 +5,29 @@ Excel到Word转换脚本
 
 import re
 import os
+import io
+import itertools
+import zipfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
 import pandas as pd
-from docx import Document
+import openpyxl
+from lxml import etree
+from docx.oxml import parse_xml
+from docx.opc.oxml import serialize_part_xml
 from docx.shared import Pt, RGBColor
 from docx.oxml.ns import qn
 from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
-from logger import get_logger
+from logger import get_logger, log_stage
+from progress import report
+from cancellation import check_cancelled
+from job_scheduler import estimate_job_cost
+from docx_template import new_document, get_template, add_heading, normalize_zip_timestamps, DETERMINISTIC_DOCX
+from file_store import atomic_output, open_source, source_name, temp_path_for, SpillFile
+from text_renderers import HEADING, PARAGRAPH, render_markdown, render_html
+from column_mapping import (MODULE_KEYS, REQUIRED_COLUMNS, INVALID_PROCESS_KEYWORDS, CFP_COLUMNS,
+                            pick_data_sheet, score_header_row, match_columns)
 
 logger = get_logger("excel_to_word_converter")
 
@@ -21,6 +37,16 @@ try:
 except ImportError:
     verify_consistency = None
 
+# 并行渲染进程数：按一级模块拆分后在进程池中分别渲染，0/1 表示顺序渲染
+RENDER_PROCESSES = int(os.getenv('RENDER_PROCESSES', '0'))
+RENDER_WAIT_INTERVAL = 0.5  # 并行渲染时检查取消的间隔（秒）
+# 估算内存超过该值（MB）的 .xlsx 使用流式模式（逐行读取、逐模块写出），0 表示不使用
+STREAMING_THRESHOLD_MB = int(os.getenv('STREAMING_THRESHOLD_MB', '512'))
+
+
+class NonContiguousModules(Exception):
+    """流式模式下发现同一模块在工作表中不连续出现（普通模式会合并为一组，流式输出无法回头合并）"""
+
 
 def set_font(run, font_name='宋体', font_size=10.5, bold=False):
     """设置字体格式"""
@@ -35,7 +61,7 @@ def set_font(run, font_name='宋体', font_size=10.5, bold=False):
 
 def add_styled_heading(doc, text, level):
     """添加带格式的标题"""
-    heading = doc.add_heading(text, level=level)
+    heading = add_heading(doc, text, level)
     for run in heading.runs:
         # 标题通常加粗，字号根据层级可能不同，这里统一按用户要求"黑色宋体"
         # Word默认标题字号较大，用户未指定字号，只说"黑色宋体"。
@@ -125,54 +151,34 @@ def split_subprocess_description(text):
 def read_excel_robust(excel_path):
     """
     健壮地读取Excel文件，自动查找正确的Sheet和表头
+    excel_path 可以是文件路径，也可以是内存中的 bytes / memoryview（不落盘、不复制）；
+    工作簿只打开一次，预览行与完整数据都从同一个 ExcelFile 读取
     """
     try:
-        xl = pd.ExcelFile(excel_path)
+        xl = pd.ExcelFile(open_source(excel_path))
     except Exception as e:
-        print(f"无法打开Excel文件: {e}")
         logger.error(f"无法打开Excel文件: {e}")
         return None
 
     # 1. 查找包含数据的Sheet
-    target_sheet = None
-    for sheet in xl.sheet_names:
-        if '拆分表' in sheet or '功能点' in sheet:
-            target_sheet = sheet
-            break
-    
-    if not target_sheet:
-        # 如果没找到特定名称的sheet，尝试使用最大的sheet（通常数据最多）
-        # 或者默认使用第一个
-        target_sheet = xl.sheet_names[0]
-        print(f"未找到名称包含'拆分表'的Sheet，默认使用: {target_sheet}")
-        logger.warning(f"未找到名称包含'拆分表'的Sheet，默认使用: {target_sheet}")
-    else:
-        print(f"使用Sheet: {target_sheet}")
-        logger.info(f"使用Sheet: {target_sheet}")
+    target_sheet = pick_data_sheet(xl.sheet_names)
 
     # 2. 查找表头行 - 处理多行表头
     # 读取前10行来分析
-    df_preview = pd.read_excel(excel_path, sheet_name=target_sheet, header=None, nrows=10)
+    df_preview = xl.parse(target_sheet, header=None, nrows=10)
     
     # 尝试找到包含完整列信息的行
     # 策略：同时包含"客户需求"和"一级模块"的行，或包含"功能过程"和"子过程描述"的行
     header_candidates = []
     for idx, row in df_preview.iterrows():
-        row_str = row.astype(str).values
-        row_text = ' '.join(row_str)
-        score = 0
-        if '客户需求' in row_text: score += 1
-        if '一级模块' in row_text: score += 1
-        if '功能过程' in row_text or '功能名称' in row_text: score += 1
-        if '子过程描述' in row_text or '功能描述' in row_text: score += 1
+        score = score_header_row(row.astype(str).values)
         if score >= 2:
             header_candidates.append((idx, score, row))
     
     if not header_candidates:
-        print("未找到标准表头行，尝试使用多行表头策略")
         logger.info("未找到标准表头行，尝试使用多行表头策略")
         # 读取前3行作为多级表头
-        df = pd.read_excel(excel_path, sheet_name=target_sheet, header=[0, 1, 2])
+        df = xl.parse(target_sheet, header=[0, 1, 2])
         # 合并多级列名
         df.columns = [' '.join([str(c).strip() for c in col if 'Unnamed' not in str(c)]).strip() 
                       for col in df.columns]
@@ -180,37 +186,27 @@ def read_excel_robust(excel_path):
         # 使用得分最高的行作为表头
         header_candidates.sort(key=lambda x: x[1], reverse=True)
         header_row_idx = header_candidates[0][0]
-        print(f"定位到表头在第 {header_row_idx} 行 (得分: {header_candidates[0][1]})")
         logger.info(f"定位到表头在第 {header_row_idx} 行 (得分: {header_candidates[0][1]})")
-        df = pd.read_excel(excel_path, sheet_name=target_sheet, header=header_row_idx)
+        df = xl.parse(target_sheet, header=header_row_idx)
     
     return df
 
 
-def excel_to_word(excel_path, word_path=None, perform_verify=True, open_output=True):
+def load_module_frame(excel_path, with_cfp=False):
     """
-    将Excel文件转换为Word文档
-    :param open_output: 转换完成后是否自动打开文件（服务器模式下应设为False）
+    读取Excel并整理为标准列 CustomerReq/Level1/Level2/Level3/Process/Description
+    （列识别、无效关键字清理、合并单元格向下填充）
+    :param with_cfp: 同时提取 CFP 列（按列名识别，找不到时不提取）
+    :return: DataFrame（attrs['col_map'] 记录 标准列 -> 原列名），无法识别时返回 None
     """
-    print(f"正在处理: {excel_path.name}")
-    logger.info(f"正在处理: {excel_path.name}")
-    
-    # 读取Excel文件
     df = read_excel_robust(excel_path)
     if df is None:
-        return
+        return None
 
     # 自动识别列索引 - 增强模糊匹配能力
     # 我们需要找到: 客户需求, 一级模块, 二级模块, 三级模块, 功能过程, 子过程描述
     col_map = {}
-    required_cols = {
-        'CustomerReq': ['客户需求'],
-        'Level1': ['一级模块'],
-        'Level2': ['二级模块'],
-        'Level3': ['三级模块'],
-        'Process': ['功能过程'],
-        'Description': ['子过程描述']
-    }
+    required_cols = REQUIRED_COLUMNS
     
     # 先尝试从列名精确匹配(优先级高)
     for col_idx, col_name in enumerate(df.columns):
@@ -248,7 +244,6 @@ def excel_to_word(excel_path, word_path=None, perform_verify=True, open_output=T
     
     # 如果没找到，尝试按固定索引回退 (针对 cosmic 表格结构)
     if missing_cols:
-        print(f"警告: 未能通过列名自动识别所有列: {missing_cols}，尝试使用固定列索引策略...")
         logger.warning(f"未能通过列名自动识别所有列: {missing_cols}，尝试使用固定列索引策略...")
         
         # 检查列数是否足够
@@ -262,11 +257,15 @@ def excel_to_word(excel_path, word_path=None, perform_verify=True, open_output=T
             if 'Process' not in col_map: col_map['Process'] = df.columns[6]
             if 'Description' not in col_map: col_map['Description'] = df.columns[7]
         else:
-            print("列数不足，无法继续")
             logger.error("列数不足，无法继续")
-            return
+            return None
+
+    if with_cfp:
+        for col_name in df.columns:
+            if str(col_name).strip() in CFP_COLUMNS:
+                col_map['CFP'] = col_name
+                break
 
-    print(f"列映射: {col_map}")
     logger.info(f"列映射: {col_map}")
 
     # 重命名列
@@ -278,13 +277,18 @@ def excel_to_word(excel_path, word_path=None, perform_verify=True, open_output=T
         col_map['Process']: 'Process',
         col_map['Description']: 'Description'
     })
+    if 'CFP' in col_map:
+        df_renamed = df_renamed.rename(columns={col_map['CFP']: 'CFP'})
     
     # 提取需要的列
-    df = df_renamed[['CustomerReq', 'Level1', 'Level2', 'Level3', 'Process', 'Description']].copy()
+    columns = ['CustomerReq', 'Level1', 'Level2', 'Level3', 'Process', 'Description']
+    if 'CFP' in col_map:
+        columns.append('CFP')
+    df = df_renamed[columns].copy()
+    df.attrs['col_map'] = {key: str(name) for key, name in col_map.items()}
     
     # 清理"功能过程"列中的无效关键字（这些应该在子过程描述中，而不是功能过程列）
-    invalid_keywords = ['呈现', '查询', '保存', '输入', '校验', '输出']
-    df.loc[df['Process'].isin(invalid_keywords), 'Process'] = None
+    df.loc[df['Process'].isin(INVALID_PROCESS_KEYWORDS), 'Process'] = None
     
     # 向下填充模块列和功能过程列（处理合并单元格）
     # 【关键】加上CustomerReq列，确保不同客户需求下的相同模块不会被合并
@@ -292,150 +296,626 @@ def excel_to_word(excel_path, word_path=None, perform_verify=True, open_output=T
     
     # 过滤掉可能是表头重复的行（例如值为"一级模块"的行）
     df = df[df['Level1'].astype(str).str.contains('一级模块', na=False) == False]
-    
-    # 关键：对数据进行排序，确保 Word 文档的顺序与逻辑结构一致
-    # 这也确保了如果 Excel 乱序，生成的文档是规整的，且验证脚本也能通过（如果验证脚本也排序）
-    # 注意：这里假设模块名称是字符串，排序可能按字典序。如果需要按原文件出现顺序排序但又要分组，
-    # 则需要更复杂的逻辑（例如记录首次出现的索引）。
-    # 鉴于通常需求是按 Excel 原序（如果原序就是分组好的），或者按模块聚类。
-    # 为了稳妥，我们保持 Excel 原序的"分组"。
-    # 即：不显式 sort_values，而是依赖 groupby(sort=False)。
-    # 但是，如果 Excel 是乱序的 (A, B, A)，groupby(sort=False) 会输出 A, B (A被合并到第一个A)。
-    # 这会导致 Word 内容顺序 = A(all), B(all).
-    # 而 Excel 原序 = A1, B1, A2.
-    # 验证脚本按原序读取: A1, B1, A2.
-    # Word 文档: A1, A2, B1.
-    # 于是验证失败。
-    
-    # 解决方案：强制验证脚本也按"分组后"的顺序来预期。
-    # 或者，我们假设 Excel 本身就是排好序的。
-    # 既然验证失败，说明 Excel 可能不是严格排序的，或者 groupby 改变了顺序。
-    # 让我们在 converter 中不做改变（保持 groupby 聚合），但在 verify 中模拟这种聚合。
-    
-    # 创建Word文档
-    doc = Document()
-    
+
+    return df
+
+
+def plan_module_groups(module_groups, total_groups, progress=None, cancel_token=None):
+    """
+    文档计划：按模块组顺序依次产生内容块（一级/二级标题在模块切换时输出），与具体输出格式无关
+    内容块为 (HEADING, 级别, 文本) 或 (PARAGRAPH, 文本)，由 Word/Markdown/HTML 渲染器消费
+    :param module_groups: 可迭代的 ((CustomerReq, L1, L2, L3), group_df)，顺序即文档顺序
+    :param total_groups: 模块组总数（用于进度上报；为 None 时由调用方自行上报）
+    """
     # 状态变量，用于控制标题输出
     current_l1 = None
     current_l2 = None
-    
+
     # 序号计数器
     idx_l1 = 0
     idx_l2 = 0
     idx_l3 = 0
-    
-    # 按模块分组 (CustomerReq, L1, L2, L3)
-    # 【关键】加上CustomerReq确保不同客户需求下的相同模块不会被合并
-    # 使用 groupby(sort=False) 保持 Excel 中的顺序
-    module_groups = df.groupby(['CustomerReq', 'Level1', 'Level2', 'Level3'], sort=False)
-    
-    for (customer_req, l1, l2, l3), group_df in module_groups:
+
+    for group_no, ((customer_req, l1, l2, l3), group_df) in enumerate(module_groups):
+        # 读取占 10%，生成占 80%，保存占 10%
+        if total_groups:
+            report(progress, "生成文档", 0.1 + 0.8 * group_no / total_groups)
+        check_cancelled(cancel_token)
+
         # 1. 处理一级模块 (标题 3)
         if l1 != current_l1:
             idx_l1 += 1
             idx_l2 = 0 # 重置二级计数
             idx_l3 = 0 # 重置三级计数
-            
+        
             title_text = f"{l1}"
-            add_styled_heading(doc, title_text, level=3)
-            
+            yield (HEADING, 3, title_text)
+        
             current_l1 = l1
             current_l2 = None # 重置二级模块状态
-            
+        
         # 2. 处理二级模块 (标题 4)
         if l2 != current_l2:
             idx_l2 += 1
             idx_l3 = 0 # 重置三级计数
-            
+        
             title_text = f"{l2}"
-            add_styled_heading(doc, title_text, level=4)
-            
+            yield (HEADING, 4, title_text)
+        
             current_l2 = l2
-            
+        
         # 3. 处理三级模块 (标题 5)
         idx_l3 += 1
         title_text = f"{l3}"
-        add_styled_heading(doc, title_text, level=5)
-        
+        yield (HEADING, 5, title_text)
+    
         # 4. 关键时序图/业务逻辑图 (标题 6)
         # 序号: L1.L2.L3.1
         title_text = "关键时序图/业务逻辑图"
-        add_styled_heading(doc, title_text, level=6)
+        yield (HEADING, 6, title_text)
+    
+        yield (PARAGRAPH, '无。')
         
-        para = doc.add_paragraph('无。')
-        for run in para.runs:
-            set_font(run)
-            
         # 5. 功能描述 (标题 6)
         # 序号: L1.L2.L3.2
         title_text = "功能描述"
-        add_styled_heading(doc, title_text, level=6)
-        
+        yield (HEADING, 6, title_text)
+    
         # 6. 整体功能列表
         # 获取该模块下所有唯一的功能过程
         processes = group_df['Process'].dropna().unique()
         # 过滤掉单纯的关键字（如果有）
         valid_processes = [p for p in processes if str(p).strip() not in ['呈现', '查询', '保存', '输入', '校验', '输出']]
-        
+    
         if valid_processes:
             summary_text = "　整体功能列表包含如下：" + "、".join(valid_processes) + "。"
-            para = doc.add_paragraph(summary_text)
-            for run in para.runs:
-                set_font(run)
-        
+            yield (PARAGRAPH, summary_text)
+    
         # 7. 详细功能列表
         # 在当前三级模块组内，按功能过程分组
         process_groups = group_df.groupby('Process', sort=False)
-        
+    
         p_idx = 1
         for p_name, p_rows in process_groups:
             p_name_str = str(p_name).strip()
             if p_name_str in ['呈现', '查询', '保存', '输入', '校验', '输出']:
                 continue
-                
+            
             # 输出功能过程标题 (正文格式，带序号)
             # 例如: 1.传输-传输管线系统链路数据呈现
-            title_para = doc.add_paragraph(f"{p_idx}.{p_name_str}")
-            for run in title_para.runs:
-                set_font(run)
+            yield (PARAGRAPH, f"{p_idx}.{p_name_str}")
             p_idx += 1
-            
+        
             # 输出子过程描述
             for _, row in p_rows.iterrows():
                 desc = row['Description']
                 if pd.isna(desc):
                     continue
-                
+            
                 # 拆分描述（如果一行包含多个步骤）
                 lines = split_subprocess_description(desc)
                 for line in lines:
-                    p = doc.add_paragraph(line)
-                    for run in p.runs:
-                        set_font(run)
+                    yield (PARAGRAPH, line)
+
+
+def render_module_groups(doc, module_groups, total_groups, progress=None, cancel_token=None):
+    """
+    按文档计划把内容写入 Word 文档
+    :param module_groups: 可迭代的 ((CustomerReq, L1, L2, L3), group_df)，顺序即文档顺序
+    :param total_groups: 模块组总数（用于进度上报；为 None 时由调用方自行上报）
+    """
+    for block in plan_module_groups(module_groups, total_groups, progress, cancel_token):
+        if block[0] == HEADING:
+            add_styled_heading(doc, block[2], level=block[1])
+        else:
+            para = doc.add_paragraph(block[1])
+            for run in para.runs:
+                set_font(run)
+
+
+def split_by_level1(module_groups):
+    """
+    按一级模块把模块组切分为若干连续片段（一级模块变化处切分）
+    每个片段以一级标题开头，可独立渲染，按顺序拼接后与整体渲染结果一致
+    :return: [DataFrame, ...]，每个片段内的行按模块组顺序排列
+    """
+    chunks = []
+    current_l1 = None
+    frames = []
+    for (customer_req, l1, l2, l3), group_df in module_groups:
+        if frames and l1 != current_l1:
+            chunks.append(pd.concat(frames))
+            frames = []
+        frames.append(group_df)
+        current_l1 = l1
+    if frames:
+        chunks.append(pd.concat(frames))
+    return chunks
+
+
+def _render_chunk(chunk_df, as_docx=False, deterministic=None):
+    """
+    （在渲染进程中执行）渲染一个一级模块片段
+    :param deterministic: as_docx 时是否生成可重现的 .docx，默认取 DETERMINISTIC_DOCX
+    :return: as_docx 为 True 时返回完整 .docx 字节，否则返回文档 body 的 XML
+    """
+    if deterministic is None:
+        deterministic = DETERMINISTIC_DOCX
+    module_groups = chunk_df.groupby(MODULE_KEYS, sort=False)
+    doc = new_document(deterministic)
+    render_module_groups(doc, module_groups, module_groups.ngroups)
+    if as_docx:
+        buffer = io.BytesIO()
+        doc.save(buffer)
+        if deterministic:
+            normalize_zip_timestamps(buffer)
+        return buffer.getvalue()
+    return etree.tostring(doc.element.body)
+
+
+def _shutdown_render_executor(executor, terminate):
+    """关闭渲染进程池；terminate 为 True 时（取消/出错）直接终止仍在渲染的进程，不等待其完成"""
+    processes = list((executor._processes or {}).values())
+    executor.shutdown(wait=False, cancel_futures=True)
+    if terminate:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+    for process in processes:
+        process.join()
+
+
+def render_chunks_parallel(chunks, processes, as_docx=False, progress=None, cancel_token=None, deterministic=None):
+    """
+    在进程池中并行渲染各片段，按原顺序返回结果；按已完成片段的模块组数上报进度
+    渲染进程池随任务创建、随任务关闭：任务结束（包括取消/出错）后不遗留渲染进程
+    :param deterministic: 传给各片段的 _render_chunk（在本进程中确定，不依赖渲染进程的环境变量）
+    """
+    if deterministic is None:
+        deterministic = DETERMINISTIC_DOCX
+    executor = ProcessPoolExecutor(max_workers=min(processes, len(chunks)),
+                                   mp_context=multiprocessing.get_context('spawn'))
+    completed = False
+    try:
+        futures = [executor.submit(_render_chunk, chunk, as_docx, deterministic) for chunk in chunks]
+        weights = [chunk.groupby(MODULE_KEYS, sort=False).ngroups for chunk in chunks]
+        total_groups = max(sum(weights), 1)
+        pending = set(futures)
+        while pending:
+            check_cancelled(cancel_token)
+            _, pending = wait(pending, timeout=RENDER_WAIT_INTERVAL, return_when=FIRST_COMPLETED)
+            done_groups = sum(w for f, w in zip(futures, weights) if f.done())
+            report(progress, "生成文档", 0.1 + 0.8 * done_groups / total_groups)
+        results = [f.result() for f in futures]
+        completed = True
+        return results
+    finally:
+        _shutdown_render_executor(executor, terminate=not completed)
+
+
+def merge_rendered_bodies(doc, bodies):
+    """将并行渲染得到的 body 内容按顺序追加到 doc 的节属性(sectPr)之前"""
+    body = doc.element.body
+    sect_pr = body.sectPr
+    for body_xml in bodies:
+        for child in list(parse_xml(body_xml)):
+            if child.tag == qn('w:sectPr'):
+                continue
+            if sect_pr is not None:
+                sect_pr.addprevious(child)
+            else:
+                body.append(child)
+
+
+def build_document(df, render_processes=None, progress=None, cancel_token=None, deterministic=None):
+    """
+    根据整理好的数据生成 Word 文档对象
+    :param render_processes: 并行渲染进程数，默认取 RENDER_PROCESSES；0/1 或只有一个一级模块时顺序渲染
+    :param deterministic: 是否固定文档核心属性，默认取 DETERMINISTIC_DOCX
+    """
+    if render_processes is None:
+        render_processes = RENDER_PROCESSES
+    # 按模块分组 (CustomerReq, L1, L2, L3)
+    # 【关键】加上CustomerReq确保不同客户需求下的相同模块不会被合并
+    # 使用 groupby(sort=False) 保持 Excel 中的顺序
+    module_groups = df.groupby(MODULE_KEYS, sort=False)
+
+    # 创建Word文档
+    doc = new_document(deterministic)
+    if render_processes > 1:
+        chunks = split_by_level1(module_groups)
+        if len(chunks) > 1:
+            logger.info(f"按一级模块拆分为 {len(chunks)} 个片段，使用 {render_processes} 个进程并行渲染")
+            bodies = render_chunks_parallel(chunks, render_processes, progress=progress, cancel_token=cancel_token,
+                                            deterministic=deterministic)
+            merge_rendered_bodies(doc, bodies)
+            return doc
+    render_module_groups(doc, module_groups, module_groups.ngroups, progress, cancel_token)
+    return doc
+
+
+def _safe_filename(name, max_length=50):
+    """去除文件名中的非法字符"""
+    cleaned = re.sub(r'[\\/:*?"<>|\s]+', '_', str(name)).strip('_.')
+    return cleaned[:max_length] or 'module'
+
+
+def excel_to_word_split(excel_path, zip_path, render_processes=None, progress=None, cancel_token=None, file_name=None,
+                        deterministic=None):
+    """
+    按一级模块拆分输出：每个一级模块生成一个 .docx，打包为 zip
+    zip 内文件名为 "序号_一级模块名.docx"，序号与文档中的顺序一致
+    :param excel_path: 文件路径，或内存中的内容（bytes / memoryview / 文件对象，此时可用 file_name 指定文件名）
+    :param deterministic: 各 .docx 与 zip 均可重现，默认取环境变量 DETERMINISTIC_DOCX
+    :return: 生成的文档数，读取失败时返回 None
+    """
+    if deterministic is None:
+        deterministic = DETERMINISTIC_DOCX
+    logger.info(f"正在按一级模块拆分处理: {source_name(excel_path, file_name)}")
+    report(progress, "读取 Excel", 0.0)
+    with log_stage(logger, "read_excel"):
+        df = load_module_frame(excel_path)
+    if df is None:
+        return None
+    check_cancelled(cancel_token)
+
+    if render_processes is None:
+        render_processes = RENDER_PROCESSES
+    with log_stage(logger, "render"):
+        chunks = split_by_level1(df.groupby(MODULE_KEYS, sort=False))
+        if render_processes > 1 and len(chunks) > 1:
+            documents = render_chunks_parallel(chunks, render_processes, as_docx=True,
+                                               progress=progress, cancel_token=cancel_token, deterministic=deterministic)
+        else:
+            documents = []
+            for chunk_no, chunk in enumerate(chunks):
+                report(progress, "生成文档", 0.1 + 0.8 * chunk_no / max(len(chunks), 1))
+                check_cancelled(cancel_token)
+                documents.append(_render_chunk(chunk, as_docx=True, deterministic=deterministic))
+
+    report(progress, "保存文档", 0.9)
+    with log_stage(logger, "save_zip"):
+        with atomic_output(zip_path) as tmp_path, zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_STORED) as zf:
+            for chunk_no, (chunk, data) in enumerate(zip(chunks, documents), start=1):
+                l1 = chunk['Level1'].iloc[0]
+                zf.writestr(f"{chunk_no:02d}_{_safe_filename(l1)}.docx", data)
+            zf.close()
+            if deterministic:
+                with open(tmp_path, 'r+b') as f:
+                    normalize_zip_timestamps(f)
+    report(progress, "保存文档", 1.0)
+    logger.info(f"已按一级模块生成 {len(documents)} 个文档")
+    return len(documents)
+
+
+def _normalize_cell(value):
+    """与 pandas.read_excel 保持一致：空字符串视为空值，整数值的浮点数转为 int"""
+    if isinstance(value, str) and value == '':
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def open_module_stream(excel_path, progress=None):
+    """
+    流式读取Excel：以只读模式逐行读取工作表，边读边向下填充并识别模块边界
+    只在内存中保留当前三级模块的行，峰值内存取决于最大的单个模块而不是整个工作簿
+    :return: 依次产生 ((CustomerReq, L1, L2, L3), group_df) 的迭代器；
+             表头无法按列名识别时返回 None（调用方应改用普通模式）
+    """
+    try:
+        wb = openpyxl.load_workbook(open_source(excel_path), read_only=True, data_only=True)
+    except Exception as e:
+        logger.error(f"无法打开Excel文件: {e}")
+        return None
+
+    try:
+        ws = wb[pick_data_sheet(wb.sheetnames)]
+        rows = ws.iter_rows(values_only=True)
+
+        # 在前10行中查找表头（与普通模式相同的打分规则）
+        preview = []
+        for row in rows:
+            preview.append(row)
+            if len(preview) >= 10:
+                break
+        header_candidates = []
+        for idx, row in enumerate(preview):
+            score = score_header_row([str(v) for v in row])
+            if score >= 2:
+                header_candidates.append((idx, score))
+        if not header_candidates:
+            logger.warning("流式模式未找到标准表头行，改用普通模式")
+            wb.close()
+            return None
+        header_candidates.sort(key=lambda x: x[1], reverse=True)
+        header_row_idx = header_candidates[0][0]
+        logger.info(f"定位到表头在第 {header_row_idx} 行 (得分: {header_candidates[0][1]})")
+
+        # 按列名精确匹配列索引
+        col_index = match_columns(preview[header_row_idx])
+        missing_cols = [k for k in REQUIRED_COLUMNS if k not in col_index]
+        if missing_cols:
+            logger.warning(f"流式模式未能通过列名识别所有列: {missing_cols}，改用普通模式")
+            wb.close()
+            return None
+        logger.info(f"列索引: {col_index}")
+    except Exception:
+        wb.close()
+        raise
+
+    total_rows = ws.max_row or 0
+    pending_rows = preview[header_row_idx + 1:]
+    return _iter_modules(wb, itertools.chain(pending_rows, rows), col_index, header_row_idx + 1,
+                         total_rows, progress)
+
+
+def _iter_modules(wb, rows, col_index, first_row_no, total_rows, progress):
+    """open_module_stream 的逐行处理：清理无效关键字 -> 向下填充 -> 过滤重复表头 -> 按模块键切分"""
+    fill_keys = MODULE_KEYS + ['Process']
+    last_values = dict.fromkeys(fill_keys)
+    current_key = None
+    module_rows = []
+    seen_keys = set()
+    columns = MODULE_KEYS + ['Process', 'Description']
+    try:
+        for row_no, row in enumerate(rows, start=first_row_no):
+            values = {}
+            for key, idx in col_index.items():
+                values[key] = _normalize_cell(row[idx]) if idx < len(row) else None
+            if all(v is None for v in values.values()):
+                continue
+
+            if values['Process'] in INVALID_PROCESS_KEYWORDS:
+                values['Process'] = None
+            # 向下填充模块列和功能过程列（处理合并单元格）
+            for key in fill_keys:
+                if values[key] is None:
+                    values[key] = last_values[key]
+                else:
+                    last_values[key] = values[key]
+            # 过滤掉表头重复的行，以及模块列仍为空的行（普通模式下 groupby 同样会丢弃）
+            if values['Level1'] is not None and '一级模块' in str(values['Level1']):
+                continue
+            key = tuple(values[k] for k in MODULE_KEYS)
+            if any(v is None for v in key):
+                continue
+
+            if key != current_key:
+                if module_rows:
+                    yield current_key, pd.DataFrame(module_rows, columns=columns)
+                    if total_rows:
+                        report(progress, "生成文档", 0.1 + 0.8 * row_no / total_rows)
+                if key in seen_keys:
+                    raise NonContiguousModules(f"模块 {key} 在工作表中不连续出现（第 {row_no + 1} 行）")
+                seen_keys.add(key)
+                current_key = key
+                module_rows = []
+            module_rows.append([values[c] for c in columns])
+
+        if module_rows:
+            yield current_key, pd.DataFrame(module_rows, columns=columns)
+    finally:
+        wb.close()
+
+
+def _body_content(xml_bytes):
+    """从序列化的 document.xml 中截取 <w:body> 与节属性 <w:sectPr> 之间的内容"""
+    start = xml_bytes.index(b'<w:body>') + len(b'<w:body>')
+    end = xml_bytes.rindex(b'<w:sectPr')
+    return xml_bytes[start:end]
+
+
+def write_docx_streaming(modules, word_path, cancel_token=None, deterministic=None):
+    """
+    流式写出 .docx：每渲染完一个模块即把其 XML 写入输出文件并从内存文档中移除
+    文档的其余部件（样式、节属性等）取自空白文档，document.xml 的内容与普通模式一致
+    :param deterministic: 是否固定文档核心属性，默认取 DETERMINISTIC_DOCX（zip 条目时间由调用方固定）
+    """
+    doc = new_document(deterministic)
+    body = doc.element.body
+    template = io.BytesIO(get_template().package_bytes(deterministic))
+    empty_xml = serialize_part_xml(doc.element)
+    head = empty_xml[:empty_xml.index(b'<w:body>') + len(b'<w:body>')]
+    tail = empty_xml[empty_xml.rindex(b'<w:sectPr'):]
+
+    try:
+        with zipfile.ZipFile(template) as zin, zipfile.ZipFile(word_path, 'w', zipfile.ZIP_DEFLATED) as zout:
+            for info in zin.infolist():
+                if info.filename != 'word/document.xml':
+                    zout.writestr(info, zin.read(info))
+                    continue
+                entry = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+                entry.compress_type = info.compress_type
+                with zout.open(entry, 'w') as out:
+                    out.write(head)
+
+                    def flush():
+                        out.write(_body_content(serialize_part_xml(doc.element)))
+                        for child in list(body):
+                            if child.tag != qn('w:sectPr'):
+                                body.remove(child)
+
+                    def flushing(items):
+                        # 渲染器取下一个模块时，上一个模块已渲染完毕，先写出再继续
+                        for item in items:
+                            flush()
+                            yield item
+                        flush()
+
+                    render_module_groups(doc, flushing(modules), None, cancel_token=cancel_token)
+                    out.write(tail)
+    except BaseException:
+        # 取消或失败时不保留不完整的文件（写入内存缓冲时由调用方丢弃）
+        if isinstance(word_path, (str, os.PathLike)):
+            Path(word_path).unlink(missing_ok=True)
+        raise
+
+
+def should_stream(excel_path, file_name=None):
+    """估算内存超过 STREAMING_THRESHOLD_MB 的 .xlsx 使用流式模式（内存中的内容按 file_name 或文件头判断格式）"""
+    if STREAMING_THRESHOLD_MB <= 0 or Path(source_name(excel_path, file_name)).suffix.lower() != '.xlsx':
+        return False
+    return estimate_job_cost(excel_path).memory_bytes >= STREAMING_THRESHOLD_MB * 1024 * 1024
+
+
+def excel_to_text(excel_path, formats=('markdown',), progress=None, cancel_token=None, file_name=None):
+    """
+    将Excel转换为 Markdown / HTML 文本（与 Word 使用同一文档计划，不经过 python-docx）
+    :param excel_path: 文件路径，或内存中的内容（bytes / memoryview / 文件对象，此时可用 file_name 指定文件名）
+    :param formats: 输出格式，可选 'markdown' / 'html'
+    :return: {格式: 文本}，读取失败时返回 None
+    """
+    unknown = [fmt for fmt in formats if fmt not in ('markdown', 'html')]
+    if unknown:
+        raise ValueError(f"不支持的输出格式: {unknown}")
+    name = source_name(excel_path, file_name)
+    logger.info(f"正在生成文本格式 {list(formats)}: {name}")
+
+    report(progress, "读取 Excel", 0.0)
+    with log_stage(logger, "read_excel"):
+        df = load_module_frame(excel_path)
+    if df is None:
+        return None
+    check_cancelled(cancel_token)
+
+    with log_stage(logger, "plan"):
+        module_groups = df.groupby(MODULE_KEYS, sort=False)
+        blocks = list(plan_module_groups(module_groups, module_groups.ngroups, progress, cancel_token))
+    with log_stage(logger, "render_text"):
+        results = {}
+        for fmt in formats:
+            if fmt == 'html':
+                results[fmt] = render_html(blocks, title=Path(name).stem)
+            else:
+                results[fmt] = render_markdown(blocks)
+    report(progress, "生成文本", 1.0)
+    return results
+
+
+def excel_to_word(excel_path, word_path=None, perform_verify=True, open_output=True, progress=None,
+                  cancel_token=None, render_processes=None, streaming=None, in_memory=False, deterministic=None,
+                  file_name=None):
+    """
+    将Excel文件转换为Word文档
+    :param excel_path: 文件路径，或内存中的内容（bytes / memoryview / 文件对象）；内存中的内容须指定 word_path，
+                       file_name 为其文件名（用于日志与判断格式，未指定时按文件头推断）
+    :param open_output: 转换完成后是否自动打开文件（服务器模式下应设为False）
+    :param in_memory: 在内存中生成文档并返回 OutputBuffer，不写出 word_path（是否落盘由调用方决定）；
+                      文档超过 MEMORY_OUTPUT_MB 时转存到 word_path 同目录的临时文件
+    :param deterministic: 可重现输出（固定核心属性与 zip 条目时间），同一工作簿每次生成相同的字节；
+                          默认取环境变量 DETERMINISTIC_DOCX
+    :param render_processes: 并行渲染进程数（默认取环境变量 RENDER_PROCESSES）
+    :param streaming: 是否使用流式模式；默认按 STREAMING_THRESHOLD_MB 自动选择，表头无法识别时回退普通模式
+    :param progress: 进度回调 progress(阶段, 完成比例)，按已处理的模块组数上报
+    :param cancel_token: 取消令牌，在模块组之间检查；被取消/超时时抛出 JobCancelled
+    """
+    if word_path is None and not isinstance(excel_path, (str, os.PathLike)):
+        raise ValueError("Excel 内容不是文件路径时必须指定 word_path")
+    logger.info(f"正在处理: {source_name(excel_path, file_name)}")
+    if deterministic is None:
+        deterministic = DETERMINISTIC_DOCX
+    
+    # 读取Excel文件并整理列
+    report(progress, "读取 Excel", 0.0)
+    if streaming is None:
+        streaming = should_stream(excel_path, file_name)
+    modules = None
+    if streaming:
+        # 流式模式：此处只定位表头，逐行读取与渲染在写出文档时进行
+        logger.info("使用流式模式（逐行读取、逐模块写出）")
+        modules = open_module_stream(excel_path, progress)
+    if modules is None:
+        with log_stage(logger, "read_excel"):
+            df = load_module_frame(excel_path)
+        if df is None:
+            return
+    check_cancelled(cancel_token)
+    
+    # 关键：对数据进行排序，确保 Word 文档的顺序与逻辑结构一致
+    # 这也确保了如果 Excel 乱序，生成的文档是规整的，且验证脚本也能通过（如果验证脚本也排序）
+    # 注意：这里假设模块名称是字符串，排序可能按字典序。如果需要按原文件出现顺序排序但又要分组，
+    # 则需要更复杂的逻辑（例如记录首次出现的索引）。
+    # 鉴于通常需求是按 Excel 原序（如果原序就是分组好的），或者按模块聚类。
+    # 为了稳妥，我们保持 Excel 原序的"分组"。
+    # 即：不显式 sort_values，而是依赖 groupby(sort=False)。
+    # 但是，如果 Excel 是乱序的 (A, B, A)，groupby(sort=False) 会输出 A, B (A被合并到第一个A)。
+    # 这会导致 Word 内容顺序 = A(all), B(all).
+    # 而 Excel 原序 = A1, B1, A2.
+    # 验证脚本按原序读取: A1, B1, A2.
+    # Word 文档: A1, A2, B1.
+    # 于是验证失败。
+    
+    # 解决方案：强制验证脚本也按"分组后"的顺序来预期。
+    # 或者，我们假设 Excel 本身就是排好序的。
+    # 既然验证失败，说明 Excel 可能不是严格排序的，或者 groupby 改变了顺序。
+    # 让我们在 converter 中不做改变（保持 groupby 聚合），但在 verify 中模拟这种聚合。
+    
+    if modules is None:
+        with log_stage(logger, "render"):
+            doc = build_document(df, render_processes, progress, cancel_token, deterministic)
+
+    check_cancelled(cancel_token)
 
     # 确定输出路径
     if word_path is None:
         excel_file = Path(excel_path)
         word_path = excel_file.parent / f"{excel_file.stem}.docx"
     
+    output = (excel_path, word_path, perform_verify, open_output, in_memory, deterministic, progress, cancel_token)
+    if modules is None:
+        return _save_document(None, doc, *output)
+    try:
+        return _save_document(modules, None, *output)
+    except NonContiguousModules as e:
+        # 已写出的部分由 _save_document 清理；改用普通模式按模块分组，保证与普通模式生成的文档一致
+        logger.warning(f"{e}，流式模式无法合并，改用普通模式")
+    with log_stage(logger, "read_excel"):
+        df = load_module_frame(excel_path)
+    if df is None:
+        return
+    check_cancelled(cancel_token)
+    with log_stage(logger, "render"):
+        doc = build_document(df, render_processes, progress, cancel_token, deterministic)
+    check_cancelled(cancel_token)
+    return _save_document(None, doc, *output)
+
+
+def _save_document(modules, doc, excel_path, word_path, perform_verify, open_output, in_memory, deterministic,
+                   progress, cancel_token):
+    """写出文档：modules 不为 None 时流式渲染并写出，否则保存已生成的 doc；in_memory 时返回 OutputBuffer"""
+    if in_memory:
+        return _build_in_memory(excel_path, word_path, modules, doc,
+                                perform_verify, deterministic, progress, cancel_token)
+
     # 如果输出文件已存在，先删除
     if Path(word_path).exists():
         try:
             Path(word_path).unlink()
         except PermissionError:
-            print(f"无法删除文件 {word_path}，请确保文件未被打开。")
             logger.error(f"无法删除文件 {word_path}，请确保文件未被打开。")
             return
     
     # 保存Word文档
+    if modules is not None:
+        report(progress, "生成文档", 0.1)
+        with log_stage(logger, "stream_docx"), atomic_output(word_path) as tmp_path:
+            write_docx_streaming(modules, tmp_path, cancel_token, deterministic)
+            if deterministic:
+                _normalize_file(tmp_path)
     try:
-        doc.save(word_path)
-        print("Word文档已生成~")
+        if modules is None:
+            report(progress, "保存文档", 0.9)
+            with log_stage(logger, "save_docx"), atomic_output(word_path) as tmp_path:
+                doc.save(tmp_path)
+                if deterministic:
+                    _normalize_file(tmp_path)
+        report(progress, "保存文档", 1.0)
         logger.info("Word文档已生成~")
 
         # 调用验证
         if perform_verify and verify_consistency:
-            print("正在进行内容校对...")
             logger.info("正在进行内容校对...")
             verify_consistency(excel_path, word_path)
 
@@ -444,20 +924,49 @@ def excel_to_word(excel_path, word_path=None, perform_verify=True, open_output=T
             try:
                 if hasattr(os, 'startfile'):
                     os.startfile(word_path)
-                    print(f"已打开文件: {word_path}")
                     logger.info(f"已打开文件: {word_path}")
                 else:
-                    print("当前系统不支持自动打开文件")
                     logger.info("当前系统不支持自动打开文件")
             except Exception as e:
-                print(f"无法自动打开文件: {e}")
                 logger.error(f"无法自动打开文件: {e}")
 
     except Exception as e:
-        print(f"保存Word文档失败: {e}")
         logger.exception(f"保存Word文档失败: {e}")
 
 
+def _normalize_file(path):
+    with open(path, 'r+b') as f:
+        normalize_zip_timestamps(f)
+
+
+def _build_in_memory(excel_path, word_path, modules, doc, perform_verify, deterministic, progress, cancel_token):
+    """在内存缓冲中生成文档（超过上限时转存临时文件），返回 OutputBuffer"""
+    spill = SpillFile(temp_path_for(word_path))
+    try:
+        if modules is not None:
+            report(progress, "生成文档", 0.1)
+            with log_stage(logger, "stream_docx"):
+                write_docx_streaming(modules, spill, cancel_token, deterministic)
+        else:
+            report(progress, "保存文档", 0.9)
+            with log_stage(logger, "save_docx"):
+                doc.save(spill)
+        if deterministic:
+            normalize_zip_timestamps(spill)
+        document = spill.finish()
+    except BaseException:
+        spill.discard()
+        raise
+    report(progress, "保存文档", 1.0)
+    logger.info(f"Word文档已生成~（{'临时文件' if document.spilled else '内存中'}，{document.size / 1024:.0f} KB，"
+                f"指纹 {document.digest[:12]}）")
+
+    if perform_verify and verify_consistency:
+        logger.info("正在进行内容校对...")
+        verify_consistency(excel_path, document)
+    return document
+
+
 if __name__ == "__main__":
     logger.info("此脚本仅供 Web 服务内部调用，不支持直接命令行运行")
     logger.info("请通过 Streamlit 应用界面使用转换功能")
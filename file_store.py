@@ -0,0 +1,404 @@
+"""
+    共享文件存储
+    功能: 同一主机上运行多个界面实例（不同端口，共享 excel_input / word_output / session_data）时的文件操作：
+         - create_unique_file: 以独占方式创建带13位毫秒时间戳的文件名，跨进程不会重名；
+         - atomic_output / atomic_write: 先写同目录临时文件再原子替换，其他实例只会看到完整的文件；
+         - FileLock: 基于锁文件的进程间互斥锁（进程退出时由操作系统自动释放），用于选举清理负责实例；
+         - open_source / content_digest: 上传内容在内存中直接解析与计算哈希（不复制缓冲区）；
+         - package_digest: 生成的 .docx 的内容指纹（不含随生成时间变化的部件），用作文档缓存键；
+         - write_async / wait_written: 上传内容在后台线程落盘，只有交给工作进程或需要保留时才等待写完；
+         - SpillFile / OutputBuffer: 在内存中生成输出文件，超过 MEMORY_OUTPUT_MB 时转存到同目录的临时文件。
+    注意: 这里只保证共享目录中文件的写入与清理在多实例间安全；缓存（文档字节、结构预览、文档模板）与调度器的准入计数
+         仍在各实例进程内，不在实例间共享。
+"""
+
+import contextlib
+import hashlib
+import io
+import os
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from logger import get_logger
+
+logger = get_logger("file_store")
+
+if os.name == 'nt':
+    import msvcrt
+else:
+    import fcntl
+
+# 临时文件前缀（不匹配清理守护的时间戳文件名规则，不会计入磁盘预算；遗留的临时文件在对账时按保留时长清理）
+TEMP_PREFIX = '.tmp_'
+LOCK_POLL_SECONDS = 0.1
+WRITER_THREADS = 2  # 后台落盘线程数
+HASH_CHUNK_BYTES = 1024 * 1024
+ZIP_MAGIC = b'PK\x03\x04'                         # zip 本地文件头（.xlsx / .docx）
+XLS_MAGIC = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'  # OLE2 复合文档文件头（.xls）
+MEMORY_OUTPUT_MB = int(os.getenv('MEMORY_OUTPUT_MB', '32'))  # 内存中生成的输出文件上限，超过后转存临时文件
+VOLATILE_PARTS = frozenset({'docProps/core.xml'})  # 随生成时间变化的 .docx 部件（创建/修改时间、修订号），不计入内容指纹
+
+_writer = None
+_pending_writes = {}  # 路径 -> 写入中的 Future
+_pending_lock = threading.Lock()
+
+
+def create_unique_file(folder, stem, suffix):
+    """独占创建 {stem}_{毫秒时间戳}{suffix} 空文件并返回路径；同名已存在时时间戳加 1 重试"""
+    timestamp = int(time.time() * 1000)
+    while True:
+        path = Path(folder) / f"{stem}_{timestamp}{suffix}"
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            timestamp += 1
+            continue
+        os.close(fd)
+        return path
+
+
+def temp_path_for(path):
+    """与目标文件同目录、进程间唯一的临时文件路径（同一文件系统内才能原子替换）"""
+    path = Path(path)
+    return path.with_name(f"{TEMP_PREFIX}{os.getpid()}_{uuid.uuid4().hex}.tmp")
+
+
+@contextlib.contextmanager
+def atomic_output(path):
+    """在临时文件中写出，成功后原子替换为 path；失败或取消时删除临时文件
+
+    用法: with atomic_output(word_path) as tmp_path: doc.save(tmp_path)
+    """
+    tmp_path = temp_path_for(path)
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp_path)
+        raise
+
+
+def atomic_write(path, data):
+    """原子写入字节内容"""
+    with atomic_output(path) as tmp_path:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+
+
+class MemoryFile(io.RawIOBase):
+    """只读、可定位的内存文件：直接读取 bytes / memoryview，不复制整个缓冲区（zipfile / openpyxl / pandas 均可读取）"""
+
+    def __init__(self, buffer):
+        self._view = memoryview(buffer).cast('B')
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        chunk = self._view[self._position:self._position + len(b)]
+        b[:len(chunk)] = chunk
+        self._position += len(chunk)
+        return len(chunk)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._position = max(0, offset)
+        return self._position
+
+    def tell(self):
+        return self._position
+
+    def __len__(self):
+        return len(self._view)
+
+
+@dataclass(frozen=True)
+class OutputBuffer:
+    """在内存中生成的文件（可跨进程传递）：data 为内容；转存时 data 为 None，内容在临时文件 path 中
+    digest 为内容指纹（见 package_digest），同一工作簿生成的文档指纹相同，可作为缓存键"""
+    data: bytes = None
+    path: str = None
+    size: int = 0
+    digest: str = None
+
+    @property
+    def spilled(self):
+        return self.data is None
+
+    def read_bytes(self):
+        return Path(self.path).read_bytes() if self.spilled else self.data
+
+    def persist(self, target, on_done=None, on_error=None):
+        """保存为 target：转存的临时文件与 target 同目录，直接原子改名；内存中的内容在后台写出（见 write_async）"""
+        if self.spilled:
+            os.replace(self.path, target)
+            if on_done is not None:
+                on_done(Path(target))
+        else:
+            write_async(target, self.data, on_done, on_error)
+
+    def discard(self):
+        if self.spilled:
+            with contextlib.suppress(OSError):
+                os.unlink(self.path)
+
+
+class SpillFile(io.RawIOBase):
+    """可读写、可定位的输出缓冲：先写入内存，超过 max_bytes 后把已写内容转存到 spill_path 并继续写入文件"""
+
+    def __init__(self, spill_path, max_bytes=MEMORY_OUTPUT_MB * 1024 * 1024):
+        self.spill_path = Path(spill_path)
+        self.max_bytes = max_bytes
+        self._file = io.BytesIO()
+        self.spilled = False
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def write(self, b):
+        if not self.spilled and self._file.tell() + memoryview(b).nbytes > self.max_bytes:
+            self._spill()
+        return self._file.write(b)
+
+    def _spill(self):
+        position = self._file.tell()
+        spill = open(self.spill_path, 'w+b')
+        spill.write(self._file.getbuffer())
+        spill.seek(position)
+        self._file, self.spilled = spill, True
+
+    def readinto(self, b):
+        return self._file.readinto(b)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self._file.seek(offset, whence)
+
+    def tell(self):
+        return self._file.tell()
+
+    def flush(self):
+        self._file.flush()
+
+    def finish(self):
+        """写完后取出结果（OutputBuffer，附内容指纹）"""
+        size = self._file.seek(0, io.SEEK_END)
+        if self.spilled:
+            digest = package_digest(self._file)
+            self._file.close()
+            return OutputBuffer(path=str(self.spill_path), size=size, digest=digest)
+        data = self._file.getvalue()
+        return OutputBuffer(data=data, size=size, digest=package_digest(data))
+
+    def discard(self):
+        """放弃输出（失败或取消时），删除转存的临时文件"""
+        self._file.close()
+        if self.spilled:
+            with contextlib.suppress(OSError):
+                os.unlink(self.spill_path)
+
+
+def open_source(source):
+    """Excel / Word 来源 -> 可交给解析函数的对象：路径原样返回；bytes / memoryview 包装为 MemoryFile；
+    OutputBuffer 按内容所在位置处理；文件对象回到开头"""
+    if isinstance(source, OutputBuffer):
+        return source.path if source.spilled else MemoryFile(source.data)
+    if isinstance(source, (str, os.PathLike)):
+        return source
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return MemoryFile(source)
+    source.seek(0)
+    return source
+
+
+def source_name(source, file_name=None):
+    """Excel 来源的文件名（用于日志、按扩展名判断格式）：优先取 file_name，路径取文件名；
+    内存中的内容未提供 file_name 时按文件头推断扩展名（.xlsx / .xls）"""
+    if file_name:
+        return Path(file_name).name
+    if isinstance(source, (str, os.PathLike)):
+        return Path(source).name
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        head = bytes(memoryview(source).cast('B')[:len(XLS_MAGIC)])
+    else:
+        position = source.tell()
+        source.seek(0)
+        head = source.read(len(XLS_MAGIC))
+        source.seek(position)
+    if head.startswith(ZIP_MAGIC):
+        return 'upload.xlsx'
+    return 'upload.xls' if head == XLS_MAGIC else 'upload'
+
+
+def source_size(source):
+    """Excel 来源的字节数（路径不存在时为 0）"""
+    if isinstance(source, (str, os.PathLike)):
+        path = Path(source)
+        return path.stat().st_size if path.exists() else 0
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return memoryview(source).nbytes
+    position = source.tell()
+    size = source.seek(0, io.SEEK_END)
+    source.seek(position)
+    return size
+
+
+def content_digest(buffer):
+    """内容哈希（SHA-256 十六进制），直接对缓冲区计算，不复制"""
+    return hashlib.sha256(memoryview(buffer)).hexdigest()
+
+
+def package_digest(source):
+    """zip 包（.docx）的内容指纹（SHA-256 十六进制）：按条目顺序对各部件的名称与解压后的内容计算，
+    不含 VOLATILE_PARTS 与 zip 条目时间，文档属性保留真实时间时同一工作簿生成的文档指纹仍然相同；
+    source 为 bytes 或可定位的文件对象，不是 zip 时退回整个内容的哈希"""
+    file = MemoryFile(source) if isinstance(source, (bytes, bytearray, memoryview)) else source
+    digest = hashlib.sha256()
+    try:
+        with zipfile.ZipFile(file) as package:
+            for info in package.infolist():
+                if info.filename in VOLATILE_PARTS:
+                    continue
+                digest.update(f"{info.filename}\0{info.file_size}\0".encode('utf-8'))
+                with package.open(info) as part:
+                    for chunk in iter(lambda: part.read(HASH_CHUNK_BYTES), b''):
+                        digest.update(chunk)
+        return digest.hexdigest()
+    except zipfile.BadZipFile:
+        pass
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return content_digest(source)
+    source.seek(0)
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: source.read(HASH_CHUNK_BYTES), b''):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _get_writer():
+    global _writer
+    with _pending_lock:
+        if _writer is None:
+            _writer = ThreadPoolExecutor(max_workers=WRITER_THREADS, thread_name_prefix='file-writer')
+        return _writer
+
+
+def write_async(path, data, on_done=None, on_error=None):
+    """在后台线程中原子写入 data（写入期间持有缓冲区引用）；成功后调用 on_done(path)。返回 Future
+    失败时记录一次错误并调用 on_error(path, 异常)，随后与成功时一样从写入表中移除（由调用方呈现“保存失败”）"""
+    path = Path(path)
+
+    def write():
+        atomic_write(path, data)
+        if on_done is not None:
+            on_done(path)
+        return path
+
+    def finished(future):
+        error = future.exception()
+        if error is not None:
+            logger.error(f"[文件存储] 写入失败 {path.name}: {error}")
+            if on_error is not None:
+                try:
+                    on_error(path, error)
+                except Exception as e:
+                    logger.warning(f"[文件存储] 写入失败回调出错 {path.name}: {type(e).__name__}: {e}")
+        with _pending_lock:
+            if _pending_writes.get(path) is future:
+                del _pending_writes[path]
+
+    future = _get_writer().submit(write)
+    with _pending_lock:
+        _pending_writes[path] = future
+    future.add_done_callback(finished)
+    return future
+
+
+def is_writing(path):
+    """path 是否正在后台写入"""
+    with _pending_lock:
+        return Path(path) in _pending_writes
+
+
+def wait_written(path, timeout=None):
+    """等待 path 的后台写入完成（没有写入中的任务时立即返回）；返回是否写入成功
+    写入失败已由 write_async 记录并交给 on_error，这里不再抛出"""
+    with _pending_lock:
+        future = _pending_writes.get(Path(path))
+    if future is None:
+        return True
+    return future.exception(timeout) is None
+
+
+class FileLock:
+    """锁文件互斥锁（跨进程）：acquire(blocking=False) 立即返回是否获得；持有者进程退出时自动释放"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._fd = None
+
+    @property
+    def locked(self):
+        return self._fd is not None
+
+    def _try_lock(self, fd):
+        try:
+            if os.name == 'nt':
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+            else:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+    def acquire(self, blocking=True):
+        if self._fd is not None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        while not self._try_lock(fd):
+            if not blocking:
+                os.close(fd)
+                return False
+            time.sleep(LOCK_POLL_SECONDS)
+        # 记录持有者 pid，便于排查
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{os.getpid()}\n".encode())
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is None:
+            return
+        fd, self._fd = self._fd, None
+        try:
+            if os.name == 'nt':
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
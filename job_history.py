@@ -0,0 +1,167 @@
+"""
+    任务历史
+    功能: 每个转换/校对/文本任务结束后在本地 SQLite 数据库中记录一行：输入大小、行数与模块数、各阶段耗时、
+         峰值内存、文档缓存是否命中、校对结果等，用于容量规划与定位慢路径（app.py 管理页面汇总展示）。
+    配置: 环境变量 JOB_HISTORY_DB 为数据库路径（默认 job_history.db，留空关闭记录）。
+    注意: 多个实例可共享同一数据库文件（WAL 模式，写入时短暂加锁）；记录失败只写警告，不影响任务结果。
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+from logger import get_logger
+
+logger = get_logger("job_history")
+
+BASE_DIR = Path(__file__).parent.resolve()
+JOB_HISTORY_DB = os.getenv('JOB_HISTORY_DB', str(BASE_DIR / 'job_history.db'))
+BUSY_TIMEOUT_SECONDS = 5
+
+# 字段顺序即 record() 可接受的字段
+COLUMNS = (
+    'finished_at',      # 结束时间（本地时间 ISO 格式）
+    'kind',             # convert / verify / text
+    'outcome',          # success / mismatch / failed / cancelled / crashed
+    'file_name',        # 上传时的文件名
+    'input_bytes',      # 输入文件大小
+    'rows',             # 子过程行数
+    'modules',          # 三级模块数
+    'processes',        # 功能过程数
+    'queue_wait_ms',    # 调度排队耗时
+    'duration_ms',      # 运行耗时（获得运行名额之后）
+    'stages',           # 各阶段耗时 JSON {阶段: 毫秒}
+    'peak_rss_bytes',   # 任务期间工作进程及其并行渲染进程的峰值常驻内存（子进程部分为采样值）
+    'cache',            # hit / miss：校对任务读取的文档是否命中文档缓存（不读取缓存的任务为空）
+    'verify_passed',    # 校对结果 1 / 0（非校对任务为空）
+    'instance_pid',     # 记录该任务的界面进程
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    finished_at TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    outcome TEXT NOT NULL,
+    file_name TEXT,
+    input_bytes INTEGER,
+    rows INTEGER,
+    modules INTEGER,
+    processes INTEGER,
+    queue_wait_ms REAL,
+    duration_ms REAL,
+    stages TEXT,
+    peak_rss_bytes INTEGER,
+    cache TEXT,
+    verify_passed INTEGER,
+    instance_pid INTEGER
+);
+CREATE INDEX IF NOT EXISTS jobs_kind_duration ON jobs (kind, duration_ms);
+CREATE INDEX IF NOT EXISTS jobs_finished_at ON jobs (finished_at);
+"""
+
+_history = None
+_history_lock = threading.Lock()
+
+
+class JobHistory:
+    """任务历史数据库；每次操作使用独立连接，可在多线程、多进程中使用"""
+
+    def __init__(self, db_path=JOB_HISTORY_DB):
+        self.db_path = str(db_path)
+        with closing(self._connect()) as conn, conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_SECONDS)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def record(self, **fields):
+        """写入一条任务记录；stages 可传入字典"""
+        unknown = set(fields) - set(COLUMNS)
+        if unknown:
+            raise ValueError(f"未知的任务历史字段: {sorted(unknown)}")
+        fields.setdefault('finished_at', datetime.now().isoformat(timespec='seconds'))
+        fields.setdefault('instance_pid', os.getpid())
+        if isinstance(fields.get('stages'), dict):
+            fields['stages'] = json.dumps(fields['stages'], ensure_ascii=False)
+        names = [name for name in COLUMNS if name in fields]
+        with closing(self._connect()) as conn, conn:
+            conn.execute(f"INSERT INTO jobs ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})",
+                         [fields[name] for name in names])
+
+    def aggregates(self, since=None):
+        """按任务类型汇总：次数、成功率、平均/最大耗时、平均/最大峰值内存、缓存命中率、校对通过率"""
+        where, params = ('WHERE finished_at >= ?', [since]) if since else ('', [])
+        with closing(self._connect()) as conn:
+            rows = conn.execute(f"""
+                SELECT kind,
+                       COUNT(*) AS jobs,
+                       AVG(outcome IN ('success', 'mismatch')) AS completed_rate,
+                       AVG(duration_ms) AS avg_duration_ms,
+                       MAX(duration_ms) AS max_duration_ms,
+                       AVG(queue_wait_ms) AS avg_queue_wait_ms,
+                       AVG(peak_rss_bytes) AS avg_peak_rss_bytes,
+                       MAX(peak_rss_bytes) AS max_peak_rss_bytes,
+                       AVG(cache = 'hit') AS cache_hit_rate,
+                       AVG(verify_passed) AS verify_pass_rate,
+                       AVG(input_bytes) AS avg_input_bytes,
+                       AVG(rows) AS avg_rows
+                FROM jobs {where}
+                GROUP BY kind
+                ORDER BY kind
+            """, params).fetchall()
+        return [dict(row) for row in rows]
+
+    def slowest(self, kind=None, limit=10, since=None):
+        """耗时最长的任务（可按类型筛选）"""
+        clauses, params = [], []
+        if kind:
+            clauses.append('kind = ?')
+            params.append(kind)
+        if since:
+            clauses.append('finished_at >= ?')
+            params.append(since)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        with closing(self._connect()) as conn:
+            rows = conn.execute(f"SELECT * FROM jobs {where} ORDER BY duration_ms DESC LIMIT ?",
+                                params + [limit]).fetchall()
+        return [_decode(row) for row in rows]
+
+    def stage_averages(self, kind, limit=500):
+        """最近 limit 个成功任务的各阶段平均耗时（毫秒），按耗时降序"""
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT stages FROM jobs WHERE kind = ? AND outcome IN ('success', 'mismatch') "
+                                "AND stages IS NOT NULL ORDER BY id DESC LIMIT ?", (kind, limit)).fetchall()
+        totals, counts = {}, {}
+        for row in rows:
+            for stage, elapsed_ms in json.loads(row['stages']).items():
+                totals[stage] = totals.get(stage, 0.0) + elapsed_ms
+                counts[stage] = counts.get(stage, 0) + 1
+        return sorted(((stage, totals[stage] / counts[stage]) for stage in totals), key=lambda item: -item[1])
+
+
+def _decode(row):
+    item = dict(row)
+    if item.get('stages'):
+        item['stages'] = json.loads(item['stages'])
+    return item
+
+
+def get_job_history():
+    """进程级共享的任务历史；未配置或数据库不可用时返回 None"""
+    global _history
+    if _history is None and JOB_HISTORY_DB:
+        with _history_lock:
+            if _history is None:
+                try:
+                    _history = JobHistory(JOB_HISTORY_DB)
+                except sqlite3.Error as e:
+                    logger.warning(f"[任务历史] 无法打开数据库 {JOB_HISTORY_DB}: {e}")
+                    return None
+    return _history
@@ -0,0 +1,163 @@
+"""
+    转换任务调度（准入控制）
+    功能: 全服务器范围限制同时运行的转换/校对任务数与估算内存总量。
+         任务成本由工作簿内工作表 XML 的压缩/解压大小快速估算（只读 zip 目录，不解析内容），
+         小任务走快速通道，大任务走限流通道；排队中的用户可以看到自己的排队位置。
+    配置: 通过环境变量 MAX_CONCURRENT_JOBS / LARGE_JOB_CONCURRENCY / JOB_MEMORY_BUDGET_MB /
+         LARGE_JOB_THRESHOLD_MB 调整。
+"""
+
+import itertools
+import os
+import threading
+import time
+import zipfile
+from collections import deque
+from contextlib import contextmanager
+from file_store import open_source, source_size
+from logger import get_logger
+
+logger = get_logger("job_scheduler")
+
+MAX_CONCURRENT_JOBS = int(os.getenv('MAX_CONCURRENT_JOBS', '4'))          # 同时运行的任务总数
+LARGE_JOB_CONCURRENCY = int(os.getenv('LARGE_JOB_CONCURRENCY', '1'))      # 大任务通道并发数
+JOB_MEMORY_BUDGET_MB = int(os.getenv('JOB_MEMORY_BUDGET_MB', '2048'))     # 运行中任务的估算内存总预算
+LARGE_JOB_THRESHOLD_MB = int(os.getenv('LARGE_JOB_THRESHOLD_MB', '256'))  # 估算内存超过该值视为大任务
+
+# 经验系数：解压后的工作表 XML 每字节在 pandas/python-docx 处理中约占用的内存字节数
+XML_MEMORY_FACTOR = 8
+# 非 zip 格式（.xls）按文件大小估算的系数
+BINARY_MEMORY_FACTOR = 20
+
+FAST_LANE = 'fast'
+LARGE_LANE = 'large'
+
+
+class JobCost:
+    """任务成本估算结果"""
+
+    def __init__(self, compressed_bytes, uncompressed_bytes, memory_bytes):
+        self.compressed_bytes = compressed_bytes
+        self.uncompressed_bytes = uncompressed_bytes
+        self.memory_bytes = memory_bytes
+
+    def __repr__(self):
+        return (f"JobCost(compressed={self.compressed_bytes}, uncompressed={self.uncompressed_bytes}, "
+                f"memory={self.memory_bytes})")
+
+
+def estimate_job_cost(excel_path):
+    """根据工作表 XML（及共享字符串表）的压缩/解压大小估算任务内存占用
+    excel_path 可以是文件路径，也可以是内存中的上传内容（只读取压缩包目录）
+    """
+    try:
+        with zipfile.ZipFile(open_source(excel_path)) as zf:
+            compressed = 0
+            uncompressed = 0
+            for info in zf.infolist():
+                name = info.filename
+                if name.startswith('xl/worksheets/') or name == 'xl/sharedStrings.xml':
+                    compressed += info.compress_size
+                    uncompressed += info.file_size
+        return JobCost(compressed, uncompressed, uncompressed * XML_MEMORY_FACTOR)
+    except (zipfile.BadZipFile, OSError):
+        # .xls 等非 zip 格式：按文件大小粗略估算
+        size = source_size(excel_path)
+        return JobCost(size, size, size * BINARY_MEMORY_FACTOR)
+
+
+class JobTicket:
+    """排队/运行中的任务凭证"""
+
+    def __init__(self, ticket_id, cost, lane):
+        self.ticket_id = ticket_id
+        self.cost = cost
+        self.lane = lane
+        self.enqueued_at = time.monotonic()
+
+
+class JobScheduler:
+    """全服务器单例调度器：FIFO 双通道 + 并发上限 + 内存预算"""
+
+    def __init__(self, max_concurrent=MAX_CONCURRENT_JOBS, large_concurrency=LARGE_JOB_CONCURRENCY,
+                 memory_budget_mb=JOB_MEMORY_BUDGET_MB, large_threshold_mb=LARGE_JOB_THRESHOLD_MB):
+        self.max_concurrent = max(1, max_concurrent)
+        self.lane_limits = {FAST_LANE: self.max_concurrent, LARGE_LANE: max(1, large_concurrency)}
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self.large_threshold = large_threshold_mb * 1024 * 1024
+        self._cond = threading.Condition()
+        self._ids = itertools.count(1)
+        self._queues = {FAST_LANE: deque(), LARGE_LANE: deque()}
+        self._running = {FAST_LANE: 0, LARGE_LANE: 0}
+        self._memory_in_use = 0
+
+    def lane_for(self, cost):
+        return LARGE_LANE if cost.memory_bytes >= self.large_threshold else FAST_LANE
+
+    @contextmanager
+    def admit(self, cost, on_wait=None, poll_interval=0.5):
+        """申请运行名额；排队期间每隔 poll_interval 秒以排队位置(从1开始)回调 on_wait
+
+        Example:
+            with scheduler.admit(estimate_job_cost(path), on_wait=show_position):
+                excel_to_word(...)
+        """
+        with self._cond:
+            ticket = JobTicket(next(self._ids), cost, self.lane_for(cost))
+            self._queues[ticket.lane].append(ticket)
+        try:
+            while True:
+                with self._cond:
+                    if self._can_start(ticket):
+                        self._queues[ticket.lane].popleft()
+                        self._running[ticket.lane] += 1
+                        self._memory_in_use += cost.memory_bytes
+                        break
+                    position = self._position(ticket)
+                if on_wait:
+                    on_wait(position)
+                with self._cond:
+                    self._cond.wait(poll_interval)
+        except BaseException:
+            # 排队期间被中断（如页面重跑）：移出队列
+            with self._cond:
+                if ticket in self._queues[ticket.lane]:
+                    self._queues[ticket.lane].remove(ticket)
+                self._cond.notify_all()
+            raise
+
+        waited = time.monotonic() - ticket.enqueued_at
+        if waited >= 1:
+            logger.info(f"[调度] 任务 #{ticket.ticket_id} ({ticket.lane}) 排队 {waited:.1f}s 后开始运行")
+        try:
+            yield ticket
+        finally:
+            with self._cond:
+                self._running[ticket.lane] -= 1
+                self._memory_in_use -= cost.memory_bytes
+                self._cond.notify_all()
+
+    def _can_start(self, ticket):
+        if self._queues[ticket.lane][0] is not ticket:
+            return False  # 同一通道内先到先得
+        total_running = sum(self._running.values())
+        if total_running >= self.max_concurrent:
+            return False
+        if self._running[ticket.lane] >= self.lane_limits[ticket.lane]:
+            return False
+        # 超出内存预算时等待；但没有任务在运行时总是放行，避免超大任务永远饿死
+        if total_running and self._memory_in_use + ticket.cost.memory_bytes > self.memory_budget:
+            return False
+        return True
+
+    def _position(self, ticket):
+        return self._queues[ticket.lane].index(ticket) + 1
+
+    def stats(self):
+        """当前调度状态快照"""
+        with self._cond:
+            return {
+                'running': dict(self._running),
+                'queued': {lane: len(q) for lane, q in self._queues.items()},
+                'memory_in_use': self._memory_in_use,
+            }
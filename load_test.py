@@ -0,0 +1,249 @@
+"""
+    并发会话压测工具
+    功能: 通过 Streamlit 测试接口（streamlit.testing.v1.AppTest）在本进程内无界面驱动 app.py，
+         模拟 N 个并发会话各自执行 上传 → 转换 → 校对 → 下载（按指定规模生成工作簿），
+         输出每个动作的 P50/P95/P99 延迟、错误率，以及压测期间本进程与工作进程的峰值内存（RSS 之和）。
+         各会话共享同一组 st.cache_resource 单例（工作进程池、调度器、文档缓存），与一台服务器上的多个浏览器会话一致。
+    用法: python load_test.py --sessions 8 --rounds 2 --modules 200
+    注意: 需要支持 file_uploader 的 AppTest（较新版本的 Streamlit）；峰值内存依赖 /proc，仅在 Linux 上统计。
+         AppTest 的模拟运行时为进程级共享，“下载”按点击下载按钮后的页面重跑计时，不经过 HTTP 传输文件内容。
+"""
+
+import argparse
+import io
+import json
+import math
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent.resolve()
+APP_PATH = BASE_DIR / 'app.py'
+XLSX_MIME = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+ACTIONS = ('upload', 'convert', 'verify', 'download')
+ACTION_LABELS = {'upload': '上传', 'convert': '转换', 'verify': '校对', 'download': '下载'}
+RSS_SAMPLE_SECONDS = 0.2
+
+
+def build_workbook(modules, processes=3, subprocesses=3):
+    """生成压测工作簿（表头与 COSMIC 功能点拆分表一致，合并单元格按首行填写），返回 .xlsx 字节"""
+    from openpyxl import Workbook
+    from warmup import SAMPLE_HEADER, SAMPLE_SHEET_NAME
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(SAMPLE_SHEET_NAME)
+    ws.append(SAMPLE_HEADER)
+    prefixes = ('输入-', '查询-', '输出-')
+    for m in range(modules):
+        l1, l2 = m // 25, m // 5
+        for p in range(processes):
+            for s in range(subprocesses):
+                first_in_module = p == 0 and s == 0
+                ws.append([
+                    '压测需求' if m == 0 and first_in_module else None,
+                    f"一级{l1}" if m % 25 == 0 and first_in_module else None,
+                    f"二级{l2}" if m % 5 == 0 and first_in_module else None,
+                    f"三级{m}" if first_in_module else None,
+                    '用户', '触发',
+                    f"功能过程{m}-{p}" if s == 0 else None,
+                    f"{prefixes[s % len(prefixes)]}压测数据{m}-{p}-{s}；",
+                    'E', 'dg', 'attr', '新增', 1,
+                ])
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def _process_tree_rss(root_pid):
+    """进程及其全部子孙进程的 RSS 之和（Linux /proc），不可用时返回 None"""
+    try:
+        children = {}
+        for entry in os.scandir('/proc'):
+            if not entry.name.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry.name}/stat") as f:
+                    ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, ValueError, IndexError):
+                continue
+            children.setdefault(ppid, []).append(int(entry.name))
+        total = 0
+        pending = [root_pid]
+        while pending:
+            pid = pending.pop()
+            try:
+                with open(f"/proc/{pid}/statm") as f:
+                    total += int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+            except (OSError, ValueError, IndexError):
+                pass
+            pending.extend(children.get(pid, ()))
+        return total
+    except (OSError, AttributeError):
+        return None
+
+
+class RssSampler(threading.Thread):
+    """后台采样进程树 RSS，记录峰值"""
+
+    def __init__(self, interval=RSS_SAMPLE_SECONDS):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = None
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            rss = _process_tree_rss(os.getpid())
+            if rss is not None:
+                self.peak = max(self.peak or 0, rss)
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def percentile(values, q):
+    """最近秩法分位数"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+class ActionFailed(Exception):
+    pass
+
+
+def _button(at, label):
+    for button in at.button:
+        if label in button.label:
+            return button
+    raise ActionFailed(f"页面中没有“{label.strip()}”按钮")
+
+
+def _expect_success(at, text):
+    if at.exception:
+        raise ActionFailed(at.exception[0].value)
+    if not any(text in message.value for message in at.success):
+        errors = [message.value for message in at.error]
+        raise ActionFailed(errors[0] if errors else f"未出现“{text}”")
+
+
+def run_session(session_no, workbook, rounds, timeout, record):
+    """单个会话：每轮依次执行 上传 → 转换 → 校对 → 下载，结束后移除上传（应用随即清理文件）"""
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(str(APP_PATH), default_timeout=timeout)
+    at.run()
+    steps = (
+        ('upload', lambda r: at.file_uploader[0].set_value((f"loadtest_{session_no}_{r}.xlsx", workbook, XLSX_MIME)).run(),
+         '文件已上传'),
+        ('convert', lambda r: _button(at, '开始转换').click().run(), '转换成功'),
+        ('verify', lambda r: _button(at, '执行内容校对').click().run(), '验证通过'),
+        ('download', lambda r: at.get('download_button')[0].click().run(), '文件已下载'),
+    )
+    for round_no in range(rounds):
+        for action, perform, expected in steps:
+            start = time.perf_counter()
+            try:
+                perform(round_no)
+                _expect_success(at, expected)
+            except Exception as e:
+                record(action, time.perf_counter() - start, f"{type(e).__name__}: {e}")
+                break  # 本轮后续动作依赖前一步，跳过
+            record(action, time.perf_counter() - start, None)
+        try:
+            at.file_uploader[0].set_value(None).run()
+        except Exception:
+            pass
+
+
+def run_load_test(sessions, rounds, modules, timeout, ramp_seconds):
+    workbook = build_workbook(modules)
+    print(f"压测工作簿: {modules} 个三级模块, {len(workbook) / 1024:.0f} KB；并发会话 {sessions}，每会话 {rounds} 轮")
+
+    lock = threading.Lock()
+    latencies = {action: [] for action in ACTIONS}
+    errors = {action: [] for action in ACTIONS}
+
+    def record(action, elapsed, error):
+        with lock:
+            latencies[action].append(elapsed)
+            if error:
+                errors[action].append(error)
+
+    sampler = RssSampler()
+    sampler.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as executor:
+        futures = []
+        for session_no in range(sessions):
+            futures.append(executor.submit(run_session, session_no, workbook, rounds, timeout, record))
+            if ramp_seconds > 0:
+                time.sleep(ramp_seconds / sessions)
+        for future in futures:
+            future.result()
+    wall = time.perf_counter() - start
+    sampler.stop()
+
+    report = {'sessions': sessions, 'rounds': rounds, 'modules': modules,
+              'wall_seconds': wall, 'peak_rss_bytes': sampler.peak, 'actions': {}}
+    for action in ACTIONS:
+        values = latencies[action]
+        report['actions'][action] = {
+            'count': len(values),
+            'errors': len(errors[action]),
+            'error_rate': len(errors[action]) / len(values) if values else 0.0,
+            'p50': percentile(values, 50),
+            'p95': percentile(values, 95),
+            'p99': percentile(values, 99),
+            'sample_errors': sorted(set(errors[action]))[:5],
+        }
+    return report
+
+
+def print_report(report):
+    def fmt(seconds):
+        return '-' if seconds is None else f"{seconds:.2f}s"
+
+    print(f"\n{'动作':<6}{'次数':>6}{'错误率':>8}{'P50':>9}{'P95':>9}{'P99':>9}")
+    for action in ACTIONS:
+        stats = report['actions'][action]
+        print(f"{ACTION_LABELS[action]:<6}{stats['count']:>8}{stats['error_rate']:>10.1%}"
+              f"{fmt(stats['p50']):>9}{fmt(stats['p95']):>9}{fmt(stats['p99']):>9}")
+    completed = report['actions']['download']['count'] - report['actions']['download']['errors']
+    print(f"\n总耗时 {report['wall_seconds']:.1f}s，完整流程 {completed} 次"
+          f"（{completed / report['wall_seconds'] * 60:.1f} 次/分钟）")
+    peak = report['peak_rss_bytes']
+    print(f"峰值内存（本进程 + 工作进程）: {peak / 1024 / 1024:.0f} MB" if peak else "峰值内存: 不可用（需要 /proc）")
+    for action in ACTIONS:
+        for error in report['actions'][action]['sample_errors']:
+            print(f"[{ACTION_LABELS[action]}] {error}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="并发会话压测：上传 → 转换 → 校对 → 下载")
+    parser.add_argument('--sessions', type=int, default=4, help="并发会话数（默认 4）")
+    parser.add_argument('--rounds', type=int, default=1, help="每个会话重复的轮数（默认 1）")
+    parser.add_argument('--modules', type=int, default=100, help="压测工作簿的三级模块数，每个模块 3 个功能过程 × 3 个子过程（默认 100）")
+    parser.add_argument('--timeout', type=float, default=600, help="单个动作的超时秒数（默认 600）")
+    parser.add_argument('--ramp', type=float, default=0, help="在该秒数内逐个启动会话（默认同时启动）")
+    parser.add_argument('--json', dest='json_path', help="将结果另存为 JSON 文件")
+    args = parser.parse_args(argv)
+
+    os.chdir(BASE_DIR)
+    sys.path.insert(0, str(BASE_DIR))
+    report = run_load_test(args.sessions, args.rounds, args.modules, args.timeout, args.ramp)
+    print_report(report)
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+    failed = sum(stats['errors'] for stats in report['actions'].values())
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
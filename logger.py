@@ -1,9 +1,16 @@
+import atexit
+import contextvars
+import json
 import logging
 import os
+import queue
 import sys
-from logging.handlers import RotatingFileHandler
+import time
+import uuid
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Optional
 
 _BASE_DIR = Path(__file__).parent.resolve()
 _LOG_DIR = _BASE_DIR / "logs"
@@ -11,32 +18,219 @@ _LOG_DIR.mkdir(exist_ok=True)
 
 _LOGGER_NAME = "converter_app"
 
+# LOG_ASYNC=0 时退回同步写入；LOG_FORMAT=json 时控制台/文件输出结构化 JSON
+_LOG_ASYNC = os.getenv("LOG_ASYNC", "1") != "0"
+_LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+
+_listener: Optional[QueueListener] = None
+
+# 当前线程/上下文所属任务的日志缓冲区（由 capture_job_logs 设置）
+_current_job_log = contextvars.ContextVar("converter_job_log", default=None)
+
+
+class JobLog:
+    """单个任务的日志缓冲区"""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.lines = []
+        self.stages = {}  # 阶段 -> 累计耗时（毫秒），来自 log_stage 记录
+
+    def append(self, line: str) -> None:
+        self.lines.append(line)
+
+    def add_stage(self, stage: str, elapsed_ms: float) -> None:
+        self.stages[stage] = round(self.stages.get(stage, 0.0) + elapsed_ms, 1)
+
+    def text(self) -> str:
+        return "\n".join(self.lines)
+
+
+class _JobFormatter(logging.Formatter):
+    """任务日志格式：INFO 只输出消息本身，WARNING 及以上带级别前缀"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = super().format(record)
+        if record.levelno >= logging.WARNING:
+            return f"[{record.levelname}] {message}"
+        return message
+
+
+class JobLogHandler(logging.Handler):
+    """将日志记录路由到当前上下文所属任务的缓冲区；不属于任何任务的记录直接忽略"""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        job_log = _current_job_log.get()
+        if job_log is None:
+            return
+        if getattr(record, "stage", None) is not None:
+            # 阶段耗时记录不展示给用户，只计入任务的阶段耗时
+            job_log.add_stage(record.stage, getattr(record, "elapsed_ms", 0.0))
+            return
+        try:
+            job_log.append(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+
+@contextmanager
+def capture_job_logs(job_id: Optional[str] = None):
+    """在当前上下文内捕获任务日志（基于 contextvars，并发会话互不干扰）
+
+    Example:
+        with capture_job_logs() as job_log:
+            excel_to_word(...)
+        st.code(job_log.text())
+    """
+    _ensure_configured()
+    job_log = JobLog(job_id or uuid.uuid4().hex)
+    token = _current_job_log.set(job_log)
+    try:
+        yield job_log
+    finally:
+        _current_job_log.reset(token)
+
+
+def get_job_id() -> Optional[str]:
+    """当前上下文所属任务的 ID（无任务时返回 None）"""
+    job_log = _current_job_log.get()
+    return job_log.job_id if job_log is not None else None
+
+
+class _JobContextFilter(logging.Filter):
+    """入队前在调用线程上记录 job_id（后台写线程拿不到调用方的 contextvars）"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "job_id", None) is None:
+            record.job_id = get_job_id()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """结构化 JSON 日志：每条一行，包含 job_id 以及阶段耗时（如有）"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": self.formatTime(record, "%Y-%m-%d %H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "job_id": getattr(record, "job_id", None),
+        }
+        stage = getattr(record, "stage", None)
+        if stage is not None:
+            payload["stage"] = stage
+            payload["elapsed_ms"] = getattr(record, "elapsed_ms", None)
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False)
+
+
+@contextmanager
+def log_stage(logger: logging.Logger, stage: str):
+    """记录一个处理阶段的耗时（以 stage/elapsed_ms 字段输出，便于 JSON 日志统计）
+
+    Example:
+        with log_stage(logger, "read_excel"):
+            df = read_excel_robust(path)
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        logger.info(f"阶段 {stage} 耗时 {elapsed_ms:.1f} ms", extra={"stage": stage, "elapsed_ms": round(elapsed_ms, 1)})
+
+
+def _stop_listener() -> None:
+    """进程退出时刷新队列中剩余的日志"""
+    if _listener is not None:
+        _listener.stop()
+
+
+class _ForwardHandler(QueueHandler):
+    """将（已格式化消息的）日志记录交给 send 回调，用于工作进程 -> 主进程转发"""
+
+    def __init__(self, send: Callable[[logging.LogRecord], None]):
+        super().__init__(None)
+        self._send = send
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        self._send(record)
+
+
+def forward_logs(send: Callable[[logging.LogRecord], None]) -> None:
+    """工作进程内调用：不再直接写控制台/文件，而是把日志记录交给 send 转发到主进程，
+    由主进程统一写文件（避免多进程同时轮转同一日志文件）并路由到对应任务的缓冲区。
+    """
+    global _listener
+    logger = _ensure_configured()
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+    logger.addHandler(_ForwardHandler(send))
+
+
+def handle_forwarded_record(record: logging.LogRecord) -> None:
+    """主进程内调用：按当前上下文处理工作进程转发来的日志记录"""
+    _ensure_configured()
+    logging.getLogger(record.name).handle(record)
+
 
 def _ensure_configured() -> logging.Logger:
-    """Configure root app logger once with stdout and rotating file handlers."""
+    """Configure root app logger once with stdout, rotating file and job capture handlers.
+
+    Stdout and file output go through a queue drained by a background thread
+    (unless LOG_ASYNC=0), so callers never block on I/O or log rotation.
+    """
+    global _listener
     logger = logging.getLogger(_LOGGER_NAME)
     if logger.handlers:
         return logger
 
     level_name = os.getenv("LOG_LEVEL", "INFO").upper()
     level = getattr(logging, level_name, logging.INFO)
-    logger.setLevel(level)
+    # 任务日志始终需要 INFO 级别（界面展示），控制台/文件按 LOG_LEVEL 过滤
+    logger.setLevel(min(level, logging.INFO))
 
     fmt = "%(asctime)s %(levelname)s [%(name)s] %(message)s"
     datefmt = "%Y-%m-%d %H:%M:%S"
-    formatter = logging.Formatter(fmt=fmt, datefmt=datefmt)
+    if _LOG_FORMAT == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(fmt=fmt, datefmt=datefmt)
 
-    # Console handler -> stdout (so Streamlit redirect_stdout can capture logs)
+    # Console handler -> stdout (service console / journald)
     sh = logging.StreamHandler(stream=sys.stdout)
     sh.setLevel(level)
     sh.setFormatter(formatter)
-    logger.addHandler(sh)
 
     # Rotating file handler
     fh = RotatingFileHandler(_LOG_DIR / "app.log", maxBytes=2 * 1024 * 1024, backupCount=3, encoding="utf-8")
     fh.setLevel(level)
     fh.setFormatter(formatter)
-    logger.addHandler(fh)
+
+    if _LOG_ASYNC:
+        # Queue handler -> background listener thread writes stdout/file (rotation included)
+        qh = QueueHandler(queue.SimpleQueue())
+        qh.setLevel(level)
+        qh.addFilter(_JobContextFilter())
+        logger.addHandler(qh)
+        _listener = QueueListener(qh.queue, sh, fh, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_stop_listener)
+    else:
+        for handler in (sh, fh):
+            handler.addFilter(_JobContextFilter())
+            logger.addHandler(handler)
+
+    # Job capture handler -> per-job buffer of the current context
+    jh = JobLogHandler(level=logging.INFO)
+    jh.setFormatter(_JobFormatter(fmt="%(message)s"))
+    logger.addHandler(jh)
 
     # Do not propagate to root to avoid duplicate logging
     logger.propagate = False
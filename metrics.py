@@ -0,0 +1,253 @@
+"""
+    运行指标
+    功能: 进程内的计数器 / 仪表 / 直方图（与 Prometheus 数据模型一致，不依赖 prometheus_client），
+         以 Prometheus 文本格式在本地端口暴露（GET /metrics），并供 app.py 的管理页面展示。
+         指标均在界面进程中记录：转换/校对在工作进程中执行，其次数与耗时由界面进程在任务前后统计。
+    配置: 环境变量 METRICS_PORT 为指标端口（默认 9108，0 关闭）；METRICS_HOST 为监听地址（默认 127.0.0.1，仅本机可访问）。
+         多实例部署时各实例需配置不同的 METRICS_PORT，端口被占用时只记录警告。
+         ADMIN_TOKEN 非空时，可通过 ?admin=<ADMIN_TOKEN> 打开界面中的管理页面（留空则不开放）。
+"""
+
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logger import get_logger
+
+logger = get_logger("metrics")
+
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9108'))
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# 任务耗时分桶（秒）：小文件亚秒级，大文件可达数分钟
+DURATION_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+_registry = {}
+_registry_lock = threading.Lock()
+_server = None
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """指标基类：按标签值元组保存数据，注册到进程级指标表"""
+
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        with _registry_lock:
+            if name in _registry:
+                raise ValueError(f"指标重复注册: {name}")
+            _registry[name] = self
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"指标 {self.name} 的标签应为 {self.labelnames}，实际为 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """[(样本名, 标签字典, 值)]"""
+        with self._lock:
+            items = sorted(self._values.items())
+        return [(self.name, dict(zip(self.labelnames, key)), value) for key, value in items]
+
+
+class Counter(Metric):
+    """只增计数器"""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        if amount < 0:
+            raise ValueError("计数器只能增加")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Metric):
+    """仪表：直接设置，或注册回调在采集时计算（回调返回数值，带标签时返回 {标签值元组: 数值}）"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._function = None
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, function):
+        self._function = function
+
+    def samples(self):
+        if self._function is None:
+            return super().samples()
+        try:
+            result = self._function()
+        except Exception as e:
+            logger.warning(f"[指标] {self.name} 采集失败: {type(e).__name__}: {e}")
+            return []
+        if not self.labelnames:
+            return [(self.name, {}, result)]
+        return [(self.name, dict(zip(self.labelnames, key)), value) for key, value in sorted(result.items())]
+
+
+class Histogram(Metric):
+    """直方图：累计分桶计数 + 总和 + 次数"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, ([*counts], total, count)) for key, (counts, total, count) in self._values.items())
+        result = []
+        for key, (counts, total, count) in items:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                result.append((f"{self.name}_bucket", {**labels, 'le': _format_value(float(bound))}, cumulative))
+            result.append((f"{self.name}_sum", labels, total))
+            result.append((f"{self.name}_count", labels, count))
+        return result
+
+    def quantile(self, q, **labels):
+        """按分桶估算分位数（取所在桶的上界，供管理页面概览）"""
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            if state is None or state[2] == 0:
+                return None
+            counts, _, count = [*state[0]], state[1], state[2]
+        target = q * count
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            if cumulative >= target:
+                return bound
+        return math.inf
+
+
+def collect():
+    """所有已注册指标 [(指标, 样本列表)]"""
+    with _registry_lock:
+        metrics = list(_registry.values())
+    return [(metric, metric.samples()) for metric in metrics]
+
+
+def render_text():
+    """Prometheus 文本格式"""
+    lines = []
+    for metric, samples in collect():
+        lines.append(f"# HELP {metric.name} {_escape(metric.documentation)}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for sample_name, labels, value in samples:
+            label_text = ''
+            if labels:
+                label_text = '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + '}'
+            lines.append(f"{sample_name}{label_text} {_format_value(value)}")
+    return '\n'.join(lines) + '\n'
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        body = render_text().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # 抓取请求频繁，不写访问日志
+
+
+def start_http_server(port=METRICS_PORT, host=METRICS_HOST):
+    """在后台线程中启动指标端口（进程内只启动一次）；返回服务器对象，未启用或端口被占用时返回 None"""
+    global _server
+    if port <= 0:
+        return None
+    with _registry_lock:
+        if _server is not None:
+            return _server
+        try:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        except OSError as e:
+            logger.warning(f"[指标] 无法监听 {host}:{port}（{e}），Prometheus 端口未启用")
+            return None
+        _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, name='metrics-http', daemon=True).start()
+    logger.info(f"[指标] Prometheus 指标端口: http://{host}:{port}/metrics")
+    return _server
+
+
+# ---- 指标定义（界面进程） ----
+JOBS_TOTAL = Counter('converter_jobs_total', '已完成的任务数（kind: convert/verify/text；outcome: success/mismatch/failed/cancelled/crashed）',
+                     ('kind', 'outcome'))
+JOB_DURATION = Histogram('converter_job_duration_seconds', '任务运行耗时（获得运行名额之后）', ('kind',))
+QUEUE_WAIT = Histogram('converter_queue_wait_seconds', '任务在调度器中的排队耗时')
+QUEUE_DEPTH = Gauge('converter_queue_depth', '调度器中排队的任务数', ('lane',))
+RUNNING_JOBS = Gauge('converter_running_jobs', '正在运行的任务数', ('lane',))
+CACHE_REQUESTS = Counter('converter_cache_requests_total', '缓存读取次数', ('cache',))
+CACHE_MISSES = Counter('converter_cache_misses_total', '缓存未命中次数', ('cache',))
+PREFLIGHT_TOTAL = Counter('converter_preflight_total', '上传预检次数（outcome: accepted/rejected）', ('outcome',))
+ACTIVE_SESSIONS = Gauge('converter_active_sessions', '最近有操作的会话数')
+STORAGE_BYTES = Gauge('converter_storage_bytes', '临时目录中的文件总大小', ('directory',))
+CLEANUP_DELETED_FILES = Counter('converter_cleanup_deleted_files_total', '清理守护删除的文件数（reason: expired/evicted）',
+                                ('reason',))
+CLEANUP_FREED_BYTES = Counter('converter_cleanup_freed_bytes_total', '清理守护释放的字节数', ('reason',))
+CLEANUP_DELETED_SESSIONS = Counter('converter_cleanup_deleted_sessions_total', '清理守护删除的过期会话目录数')
@@ -0,0 +1,230 @@
+"""
+    模块结构预览
+    功能: 不生成文档，按与转换相同的列映射和分组键统计 一级 -> 二级 -> 三级 模块树，
+         以及各节点的功能过程数、子过程数与 CFP 合计，用于在转换前核对列映射是否正确。
+    实现: .xlsx 直接用正则扫描工作表 XML 中需要的几列（不解析整张表、不导入 pandas），数万行的表也在一秒内完成；
+         .xls 或表头无法按列名识别时，回退为转换时使用的 load_module_frame（pandas 读取）。
+    注意: 整表扫描与 pandas 回退的内存占用与工作簿大小成正比，界面中经调度器准入后在工作进程中执行（见 app.load_outline）。
+"""
+
+import time
+import zipfile
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+from pathlib import Path
+from column_mapping import (MODULE_KEYS, REQUIRED_COLUMNS, INVALID_PROCESS_KEYWORDS, CFP_COLUMNS,
+                            score_header_row, match_columns)
+from file_store import open_source
+from xlsx_scan import (HEADER_SCAN_ROWS, ROW_END_RE, SharedStrings, cell_pattern, cell_value, column_letter,
+                       data_sheet_path, scan_head_cells, typed_value)
+from logger import get_logger
+
+logger = get_logger("outline")
+
+
+@dataclass
+class OutlineNode:
+    """模块树节点（一级/二级/三级模块）"""
+    name: str
+    processes: int = 0
+    subprocesses: int = 0
+    cfp: float = 0.0
+    children: list = field(default_factory=list)
+
+
+@dataclass
+class Outline:
+    """结构预览结果：nodes 为一级模块节点，顺序与生成文档中的标题顺序一致"""
+    nodes: list
+    columns: dict          # 标准列 -> 表头说明（如 "B列「一级模块」"）
+    has_cfp: bool
+    elapsed: float
+    source: str            # 'xml'（快速扫描）或 'pandas'
+
+    @property
+    def total_l2(self):
+        return sum(len(l1.children) for l1 in self.nodes)
+
+    @property
+    def total_l3(self):
+        return sum(len(l2.children) for l1 in self.nodes for l2 in l1.children)
+
+    @property
+    def total_processes(self):
+        return sum(node.processes for node in self.nodes)
+
+    @property
+    def total_subprocesses(self):
+        return sum(node.subprocesses for node in self.nodes)
+
+    @property
+    def total_cfp(self):
+        return sum(node.cfp for node in self.nodes)
+
+
+def _to_number(value):
+    """CFP 单元格取数值，无法转换时视为 0（与 pd.to_numeric(errors='coerce') 求和一致）"""
+    if isinstance(value, bool) or value is None:
+        return 0.0
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class _OutlineBuilder:
+    """逐行累计模块统计；add_row 接收已向下填充、已清理的行"""
+
+    def __init__(self):
+        self.modules = {}  # (CustomerReq, L1, L2, L3) -> [功能过程集合, 子过程数, CFP]
+        self._last = dict.fromkeys(MODULE_KEYS + ['Process'])
+
+    def add_raw_row(self, values):
+        """未处理的原始行：清理无效关键字 -> 向下填充 -> 过滤重复表头（与转换的 load_module_frame 一致）"""
+        if values.get('Process') in INVALID_PROCESS_KEYWORDS:
+            values['Process'] = None
+        for key in self._last:
+            if values.get(key) is None:
+                values[key] = self._last[key]
+            else:
+                self._last[key] = values[key]
+        if values['Level1'] is not None and '一级模块' in str(values['Level1']):
+            return
+        self.add_row(values)
+
+    def add_row(self, values):
+        key = tuple(values[k] for k in MODULE_KEYS)
+        if any(v is None for v in key):
+            return  # 转换时 groupby 同样会丢弃模块列为空的行
+        stats = self.modules.get(key)
+        if stats is None:
+            stats = self.modules[key] = [set(), 0, 0.0]
+        process = values.get('Process')
+        if process is None:
+            return
+        stats[0].add(process)
+        if values.get('Description') is not None:
+            stats[1] += 1
+        stats[2] += _to_number(values.get('CFP'))
+
+    def build(self):
+        """按模块出现顺序组装树：一级/二级模块变化时新建节点（与文档标题的输出规则一致）"""
+        nodes = []
+        current_l1 = current_l2 = None
+        l1_node = l2_node = None
+        for (customer_req, l1, l2, l3), (processes, subprocesses, cfp) in self.modules.items():
+            if l1 != current_l1:
+                l1_node = OutlineNode(f"{l1}")
+                nodes.append(l1_node)
+                current_l1, current_l2 = l1, None
+            if l2 != current_l2:
+                l2_node = OutlineNode(f"{l2}")
+                l1_node.children.append(l2_node)
+                current_l2 = l2
+            l2_node.children.append(OutlineNode(f"{l3}", len(processes), subprocesses, cfp))
+            for node in (l1_node, l2_node):
+                node.processes += len(processes)
+                node.subprocesses += subprocesses
+                node.cfp += cfp
+        return nodes
+
+
+def _scan_xlsx(excel_path):
+    """快速扫描 .xlsx；表头或列无法识别时返回 None"""
+    with zipfile.ZipFile(open_source(excel_path)) as zf:
+        data = zf.read(data_sheet_path(zf))
+        names = set(zf.namelist())
+        shared_strings = SharedStrings(zf.read('xl/sharedStrings.xml') if 'xl/sharedStrings.xml' in names else b'')
+
+    # 1. 在前几行中查找表头
+    head_end = 0
+    for _ in range(HEADER_SCAN_ROWS):
+        match = ROW_END_RE.search(data, head_end)
+        if match is None:
+            break
+        head_end = match.end()
+    raw_rows = scan_head_cells(data, head_end)
+    if raw_rows is None:
+        return None  # 单元格省略了 r 属性，无法按列定位
+    head_rows = {row_no: {col: typed_value(*raw, shared_strings) for col, raw in cells.items()}
+                 for row_no, cells in raw_rows.items()}
+    candidates = []
+    for row_no, cells in sorted(head_rows.items()):
+        score = score_header_row([str(v) for v in cells.values()])
+        if score >= 2:
+            candidates.append((row_no, score))
+    if not candidates:
+        return None
+    header_row_no = max(candidates, key=lambda x: x[1])[0]
+    cells = head_rows[header_row_no]
+    header = [cells.get(i) for i in range(max(cells) + 1)]
+    col_index = match_columns(header)
+    if any(key not in col_index for key in REQUIRED_COLUMNS):
+        return None
+    col_index.update(match_columns(header, {'CFP': CFP_COLUMNS}))
+
+    # 2. 只匹配需要的列，逐行累计
+    letters = {column_letter(idx): key for key, idx in col_index.items()}
+    cell_re = cell_pattern(letters)
+    builder = _OutlineBuilder()
+    current_row, values = None, {}
+    for m in cell_re.finditer(data):
+        row_no = int(m.group(2))
+        if row_no <= header_row_no:
+            continue
+        if row_no != current_row:
+            if values:
+                builder.add_raw_row(values)
+            current_row, values = row_no, {}
+        key = letters[m.group(1).decode()]
+        if key == 'Description':
+            # 子过程描述只用于计数，不解码内容
+            value = True if m.group(4) else None
+        else:
+            value = cell_value(m.group(3), m.group(4), shared_strings)
+        if value is not None:
+            values[key] = value
+    if values:
+        builder.add_raw_row(values)
+
+    columns = {key: f"{column_letter(idx)}列「{header[idx]}」" for key, idx in col_index.items()}
+    return builder.build(), columns, 'CFP' in col_index
+
+
+def _scan_with_pandas(excel_path):
+    """回退：使用转换时的 load_module_frame 读取"""
+    from excel_to_word_converter import load_module_frame
+    import pandas as pd
+
+    df = load_module_frame(excel_path, with_cfp=True)
+    if df is None:
+        return None
+    builder = _OutlineBuilder()
+    fields = list(df.columns)
+    for row in df.itertuples(index=False, name=None):
+        builder.add_row({k: (None if pd.isna(v) else v) for k, v in zip(fields, row)})
+    columns = {key: f"「{name}」" for key, name in df.attrs.get('col_map', {}).items()}
+    return builder.build(), columns, 'CFP' in fields
+
+
+def build_outline(excel_path, file_name=None):
+    """统计模块结构；无法识别时返回 None
+    excel_path 可以是文件路径，也可以是内存中的上传内容（bytes / memoryview，此时由 file_name 判断格式）
+    """
+    start = time.monotonic()
+    result, source = None, 'xml'
+    if Path(file_name or excel_path).suffix.lower() == '.xlsx':
+        try:
+            result = _scan_xlsx(excel_path)
+        except (zipfile.BadZipFile, KeyError, ET.ParseError, ValueError, IndexError) as e:
+            logger.warning(f"[结构预览] 快速扫描失败: {type(e).__name__}: {e}")
+    if result is None:
+        logger.info("[结构预览] 改用 pandas 读取")
+        result, source = _scan_with_pandas(excel_path), 'pandas'
+        if result is None:
+            return None
+    nodes, columns, has_cfp = result
+    outline = Outline(nodes, columns, has_cfp, time.monotonic() - start, source)
+    logger.info(f"[结构预览] 一级 {len(nodes)} / 二级 {outline.total_l2} / 三级 {outline.total_l3} / "
+                f"功能过程 {outline.total_processes}，耗时 {outline.elapsed * 1000:.0f} ms ({source})")
+    return outline
@@ -0,0 +1,191 @@
+"""
+    上传预检
+    功能: 在保存、解析上传文件之前直接检查其字节内容：读取压缩包目录、Sheet 名称与数据 Sheet 的前几行，
+         在毫秒级内判断是否找到“拆分表”Sheet 与可用表头，并估算数据行数。
+         明显无法转换的文件（非 Excel、空表、表头无法识别且列数不足）在占用解析与调度名额之前即被拒绝。
+    规则: 与转换一致——数据 Sheet 按 pick_data_sheet 选择，表头在前几行中按 score_header_row 查找；
+         找不到表头但列数不少于 8 列时，转换会按固定列位置读取，预检只给出提示，不拒绝。
+         正则快速扫描不出单元格（或单元格省略 r 属性）时改用 XML 解析器读取前几行，只有解析器也确认为空才拒绝。
+         .xls 只检查文件头（不解析），交由转换时的 pandas 读取。
+"""
+
+import time
+import zipfile
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+from pathlib import Path
+from column_mapping import REQUIRED_COLUMNS, pick_data_sheet, score_header_row, match_columns
+from xlsx_scan import (HEADER_SCAN_ROWS, ROW_START_RE, ROW_END_RE, SHARED_STRING_END_RE, DIMENSION_RE, SharedStrings,
+                       parse_head_rows, scan_head_cells, typed_value, workbook_sheets)
+from file_store import open_source, XLS_MAGIC
+from logger import get_logger
+
+logger = get_logger("preflight")
+
+FALLBACK_MIN_COLUMNS = 8       # 转换按固定列位置回退时要求的最少列数
+READ_CHUNK_BYTES = 64 * 1024   # 流式解压的块大小：只解压到所需的行/共享字符串为止
+MAX_HEAD_BYTES = 4 * 1024 * 1024  # 前几行超过该大小时停止读取（异常文件）
+
+
+@dataclass
+class PreflightResult:
+    """预检结果：ok 为 False 时 message 说明拒绝原因；warnings 为不影响转换的提示"""
+    ok: bool
+    message: str = ''
+    sheet_names: list = field(default_factory=list)
+    sheet_name: str = None
+    has_split_sheet: bool = False   # 是否找到名称包含“拆分表”/“功能点”的 Sheet
+    header_row: int = None          # 表头所在行号（从 1 开始），未识别时为 None
+    columns: dict = field(default_factory=dict)  # 标准列 -> 表头名称
+    estimated_rows: int = None      # 估算的数据行数（不含表头）
+    warnings: list = field(default_factory=list)
+    elapsed: float = 0.0
+
+
+def _read_until(stream, pattern, count, limit=None):
+    """从解压流中分块读取，直到 pattern 出现 count 次、读完或超过 limit 字节；返回已读字节"""
+    data = bytearray()
+    found = position = 0
+    while found < count and (limit is None or len(data) < limit):
+        chunk = stream.read(READ_CHUNK_BYTES)
+        if not chunk:
+            break
+        data += chunk
+        for match in pattern.finditer(data, position):
+            found += 1
+            position = match.end()
+        # 下一块只需从末尾附近继续查找（标签可能跨块截断）
+        position = max(position, len(data) - 256)
+    return bytes(data)
+
+
+def _head_rows(zf, sheet_path):
+    """读取数据 Sheet 开头的若干行，返回 (原始字节, 行末位置列表, 解压后总大小)"""
+    with zf.open(sheet_path) as stream:
+        data = _read_until(stream, ROW_END_RE, HEADER_SCAN_ROWS, MAX_HEAD_BYTES)
+    ends = [m.end() for m in ROW_END_RE.finditer(data)][:HEADER_SCAN_ROWS]
+    return data, ends, zf.getinfo(sheet_path).file_size
+
+
+def _max_shared_index(raw_rows):
+    """表头区域引用的最大共享字符串序号（没有时为 -1）"""
+    return max((int(raw) for cells in raw_rows.values() for cell_type, raw in cells.values()
+                if cell_type == 's' and raw), default=-1)
+
+
+def _shared_strings(zf, needed):
+    """只解压到所需的最大共享字符串序号为止"""
+    if needed < 0 or 'xl/sharedStrings.xml' not in zf.namelist():
+        return SharedStrings(b'')
+    with zf.open('xl/sharedStrings.xml') as stream:
+        data = _read_until(stream, SHARED_STRING_END_RE, needed + 1)
+    return SharedStrings(data)
+
+
+def _estimate_rows(data, ends, sheet_size, header_row):
+    """估算数据行数：优先使用 <dimension> 记录的末行，否则按前几行的平均字节数推算"""
+    match = DIMENSION_RE.search(data, 0, 2048)
+    if match and match.group(1):
+        return max(0, int(match.group(1)) - (header_row or 0))
+    if not ends:
+        return 0
+    first_row = ROW_START_RE.search(data)
+    first_row_start = first_row.start() if first_row else -1
+    per_row = (ends[-1] - first_row_start) / len(ends) if first_row_start >= 0 else 0
+    if per_row <= 0:
+        return None
+    return max(0, round((sheet_size - first_row_start) / per_row) - (header_row or 0))
+
+
+def _check_xlsx(source, result):
+    try:
+        zf = zipfile.ZipFile(source)
+    except zipfile.BadZipFile:
+        result.ok, result.message = False, "文件不是有效的 .xlsx（无法读取压缩包目录），请确认文件未损坏且确为 Excel 文件。"
+        return
+    with zf:
+        names = set(zf.namelist())
+        if 'xl/workbook.xml' not in names:
+            result.ok, result.message = False, "压缩包中没有 xl/workbook.xml，不是 Excel 工作簿。"
+            return
+        sheets = workbook_sheets(zf)
+        result.sheet_names = [name for name, _ in sheets]
+        if not sheets:
+            result.ok, result.message = False, "工作簿中没有任何 Sheet。"
+            return
+        result.has_split_sheet = any('拆分表' in n or '功能点' in n for n in result.sheet_names)
+        result.sheet_name = pick_data_sheet(result.sheet_names)
+        if not result.has_split_sheet:
+            result.warnings.append(f"未找到名称包含“拆分表”的 Sheet，将使用第一个 Sheet「{result.sheet_name}」。")
+        sheet_path = dict(sheets)[result.sheet_name]
+        if sheet_path not in names:
+            result.ok, result.message = False, f"Sheet「{result.sheet_name}」的数据缺失（{sheet_path}）。"
+            return
+
+        data, ends, sheet_size = _head_rows(zf, sheet_path)
+        head_end = ends[-1] if ends else len(data)
+        raw_rows = scan_head_cells(data, head_end)
+        if not raw_rows:
+            # 正则未扫描出可定位的单元格：用 XML 解析器确认，不只凭快速扫描的结果拒绝
+            with zf.open(sheet_path) as stream:
+                raw_rows = parse_head_rows(stream)
+        if not raw_rows:
+            result.ok, result.message = False, f"Sheet「{result.sheet_name}」为空。"
+            return
+        shared_strings = _shared_strings(zf, _max_shared_index(raw_rows))
+
+    head_rows = {row_no: {col: typed_value(*raw, shared_strings) for col, raw in cells.items()}
+                 for row_no, cells in raw_rows.items()}
+    candidates = [(row_no, score_header_row([str(v) for v in row.values()]))
+                  for row_no, row in sorted(head_rows.items())]
+    candidates = [c for c in candidates if c[1] >= 2]
+    width = max(max(row) + 1 for row in head_rows.values())
+    if candidates:
+        result.header_row = max(candidates, key=lambda x: x[1])[0]
+        row = head_rows[result.header_row]
+        header = [row.get(i) for i in range(max(row) + 1)]
+        col_index = match_columns(header)
+        result.columns = {key: str(header[idx]).strip() for key, idx in col_index.items()}
+        missing = [REQUIRED_COLUMNS[key][0] for key in REQUIRED_COLUMNS if key not in col_index]
+        # 表头下一行含“X级模块”时，转换会从该行补齐模块列（转置表头），此时不拒绝
+        next_row = head_rows.get(result.header_row + 1, {})
+        transposed = any('级模块' in str(v) for v in next_row.values())
+        if missing and width < FALLBACK_MIN_COLUMNS and not transposed:
+            result.ok = False
+            result.message = f"表头缺少列：{'、'.join(missing)}，且列数不足 {FALLBACK_MIN_COLUMNS} 列，无法转换。"
+        elif missing:
+            result.warnings.append(f"表头缺少列：{'、'.join(missing)}，转换时将按固定列位置读取。")
+    elif width < FALLBACK_MIN_COLUMNS:
+        result.ok = False
+        result.message = (f"前 {HEADER_SCAN_ROWS} 行中未找到表头（客户需求/一级模块/二级模块/三级模块/功能过程/子过程描述），"
+                          f"且只有 {width} 列，无法转换。")
+    else:
+        result.warnings.append(f"前 {HEADER_SCAN_ROWS} 行中未找到标准表头，转换时将按固定列位置读取。")
+    result.estimated_rows = _estimate_rows(data, ends, sheet_size, result.header_row)
+
+
+def preflight_upload(data, file_name):
+    """预检上传内容（bytes / memoryview / 可读文件对象），不写磁盘、不导入 pandas"""
+    start = time.monotonic()
+    result = PreflightResult(ok=True)
+    suffix = Path(file_name).suffix.lower()
+    source = open_source(data)
+    try:
+        if suffix == '.xls':
+            if source.read(len(XLS_MAGIC)) != XLS_MAGIC:
+                result.ok, result.message = False, "文件不是有效的 .xls（文件头不匹配），请确认文件未损坏。"
+            else:
+                result.warnings.append(".xls 文件只检查文件头，表头在转换时识别。")
+        else:
+            _check_xlsx(source, result)
+    except (KeyError, ET.ParseError, ValueError, IndexError, zipfile.BadZipFile, EOFError) as e:
+        result.ok, result.message = False, f"文件结构异常，无法读取：{type(e).__name__}: {e}"
+    finally:
+        source.seek(0)
+    result.elapsed = time.monotonic() - start
+    if result.ok:
+        logger.info(f"[预检] {file_name}: Sheet「{result.sheet_name}」, 表头行 {result.header_row}, "
+                    f"估算 {result.estimated_rows} 行，耗时 {result.elapsed * 1000:.1f} ms")
+    else:
+        logger.warning(f"[预检] 拒绝 {file_name}: {result.message}（耗时 {result.elapsed * 1000:.1f} ms）")
+    return result
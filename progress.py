@@ -0,0 +1,42 @@
+"""
+    任务进度上报
+    约定: 进度回调签名为 progress(stage, fraction)，stage 为当前阶段名称，fraction 为整个任务的完成比例(0~1)。
+    功能: ProgressThrottle 对回调限流，避免逐组上报拖慢转换或界面渲染；format_eta 根据已用时间估算剩余时间。
+"""
+
+import time
+
+
+class ProgressThrottle:
+    """包装进度回调：按最小时间间隔限流，阶段切换与完成(1.0)时总是立即上报"""
+
+    def __init__(self, callback, min_interval=0.2):
+        self.callback = callback
+        self.min_interval = min_interval
+        self._last_time = 0.0
+        self._last_stage = None
+
+    def __call__(self, stage, fraction):
+        now = time.monotonic()
+        if (stage == self._last_stage and fraction < 1.0
+                and now - self._last_time < self.min_interval):
+            return
+        self._last_time = now
+        self._last_stage = stage
+        self.callback(stage, min(max(fraction, 0.0), 1.0))
+
+
+def report(progress, stage, fraction):
+    """progress 可为 None 时的便捷上报"""
+    if progress is not None:
+        progress(stage, fraction)
+
+
+def format_eta(elapsed_seconds, fraction):
+    """根据已用时间与完成比例估算剩余时间文本"""
+    if fraction <= 0.02 or fraction >= 1.0:
+        return ""
+    remaining = elapsed_seconds * (1 - fraction) / fraction
+    if remaining < 60:
+        return f"预计剩余 {remaining:.0f} 秒"
+    return f"预计剩余 {remaining / 60:.1f} 分钟"
@@ -0,0 +1,124 @@
+"""
+    会话数据存储
+    功能: 将每个会话的产物（校对统计、日志、文件路径）落盘到 session_data/<会话ID>/，
+         内存中只保留预算范围内最近使用的数据（跨会话 LRU 淘汰），UI 仅持有会话句柄。
+    注意: 被淘汰的数据仍保存在磁盘上，再次读取时自动加载；过期的会话目录由 cleanup_loop 清理（新建会话时登记到其过期索引）。
+"""
+
+import os
+import pickle
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from cleanup_loop import schedule_expiry
+from file_store import atomic_write
+from logger import get_logger
+
+logger = get_logger("session_store")
+
+BASE_DIR = Path(__file__).parent.resolve()
+SESSION_DIR = BASE_DIR / 'session_data'
+MEMORY_BUDGET_MB = int(os.getenv('SESSION_MEMORY_BUDGET_MB', '64'))  # 所有会话共享的内存预算
+ACTIVE_SESSION_SECONDS = 1800  # 最近多少秒内有读写的会话视为活跃（运行指标）
+
+SESSION_DIR.mkdir(exist_ok=True)
+
+
+class SessionStore:
+    """按 (会话ID, 键) 存取会话产物；写入即落盘，内存部分按 LRU 控制在预算内"""
+
+    def __init__(self, root=SESSION_DIR, memory_budget_mb=MEMORY_BUDGET_MB):
+        self.root = Path(root)
+        self.root.mkdir(exist_ok=True)
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self._lock = threading.Lock()
+        self._hot = OrderedDict()  # (会话ID, 键) -> (值, 估算字节数)
+        self._hot_bytes = 0
+        self._last_seen = {}  # 会话ID -> 最近一次读写的时间
+
+    def new_session(self):
+        """创建会话并返回句柄（会话ID）"""
+        session_id = uuid.uuid4().hex
+        (self.root / session_id).mkdir(exist_ok=True)
+        schedule_expiry(self.root / session_id)
+        return session_id
+
+    def _path(self, session_id, key):
+        return self.root / session_id / f"{key}.pkl"
+
+    def put(self, session_id, key, value):
+        """保存会话产物：先原子写盘，再放入内存缓存"""
+        self._last_seen[session_id] = time.monotonic()
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        path = self._path(session_id, key)
+        path.parent.mkdir(exist_ok=True)
+        atomic_write(path, blob)
+        with self._lock:
+            self._remember(session_id, key, value, len(blob))
+
+    def get(self, session_id, key, default=None):
+        """读取会话产物：优先内存，未命中则从磁盘加载"""
+        self._last_seen[session_id] = time.monotonic()
+        with self._lock:
+            item = self._hot.get((session_id, key))
+            if item is not None:
+                self._hot.move_to_end((session_id, key))
+                return item[0]
+        path = self._path(session_id, key)
+        try:
+            blob = path.read_bytes()
+        except FileNotFoundError:
+            return default
+        value = pickle.loads(blob)
+        with self._lock:
+            self._remember(session_id, key, value, len(blob))
+        return value
+
+    def delete(self, session_id, *keys):
+        """删除会话中的指定产物"""
+        with self._lock:
+            for key in keys:
+                self._forget((session_id, key))
+        for key in keys:
+            try:
+                self._path(session_id, key).unlink()
+            except FileNotFoundError:
+                pass
+
+    def drop_session(self, session_id):
+        """删除整个会话（内存与磁盘）"""
+        with self._lock:
+            for hot_key in [k for k in self._hot if k[0] == session_id]:
+                self._forget(hot_key)
+        shutil.rmtree(self.root / session_id, ignore_errors=True)
+
+    def active_sessions(self, window_seconds=ACTIVE_SESSION_SECONDS):
+        """最近 window_seconds 秒内有读写的会话数（本进程）"""
+        cutoff = time.monotonic() - window_seconds
+        with self._lock:
+            for session_id in [s for s, seen in self._last_seen.items() if seen < cutoff]:
+                del self._last_seen[session_id]
+            return len(self._last_seen)
+
+    def memory_usage(self):
+        """当前内存中缓存的估算字节数"""
+        return self._hot_bytes
+
+    def _remember(self, session_id, key, value, size):
+        self._forget((session_id, key))
+        if size > self.memory_budget:
+            return  # 单项超出预算，只保存在磁盘
+        self._hot[(session_id, key)] = (value, size)
+        self._hot_bytes += size
+        while self._hot_bytes > self.memory_budget:
+            (evicted_session, evicted_key), (_, evicted_size) = self._hot.popitem(last=False)
+            self._hot_bytes -= evicted_size
+            logger.debug(f"[会话存储] 内存淘汰 {evicted_session}/{evicted_key} ({evicted_size} B)")
+
+    def _forget(self, hot_key):
+        item = self._hot.pop(hot_key, None)
+        if item is not None:
+            self._hot_bytes -= item[1]
@@ -136,6 +136,19 @@ def load_css():
             font-weight: 600;
         }
         
+        /* 模块结构预览（可展开的树） */
+        .outline-tree summary {
+            cursor: pointer;
+            justify-content: space-between;
+        }
+        .outline-tree details > details { margin-left: 16px; }
+        .outline-meta {
+            margin-left: auto;
+            font-size: 0.8em;
+            font-weight: 500;
+            opacity: 0.85;
+        }
+
         /* 三级模块 Expander 优化 */
         .streamlit-expanderHeader {
             background-color: #ffffff !important;
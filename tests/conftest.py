@@ -0,0 +1,14 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# 各模块位于仓库根目录（未打包），测试直接从根目录导入
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture(scope="session")
+def workbook_bytes():
+    """30 个三级模块、2 个一级模块的工作簿（.xlsx 字节），可触发按一级模块并行渲染"""
+    from load_test import build_workbook
+    return build_workbook(30)
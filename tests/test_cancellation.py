@@ -0,0 +1,45 @@
+import time
+
+import pytest
+
+from cancellation import CancelToken, JobCancelled, JobTimeout, check_cancelled
+
+
+def test_cancel_raises_at_the_next_check():
+    token = CancelToken()
+    token.check()
+    token.cancel()
+    assert token.cancelled
+    with pytest.raises(JobCancelled):
+        token.check()
+
+
+def test_timeout_raises_job_timeout():
+    token = CancelToken(timeout=0.05)
+    token.check()
+    time.sleep(0.1)
+    assert token.timed_out
+    with pytest.raises(JobTimeout):
+        token.check()
+
+
+def test_zero_timeout_means_unlimited():
+    token = CancelToken(timeout=0)
+    assert token.deadline is None
+    token.check()
+
+
+def test_poll_runs_before_each_check():
+    calls = []
+    token = CancelToken(poll=lambda: calls.append(1))
+    token.check()
+    token.check()
+    assert len(calls) == 2
+
+
+def test_check_cancelled_accepts_none():
+    check_cancelled(None)
+    token = CancelToken()
+    token.cancel()
+    with pytest.raises(JobCancelled):
+        check_cancelled(token)
@@ -0,0 +1,40 @@
+import io
+import zipfile
+
+import docx_template
+from excel_to_word_converter import excel_to_word
+from file_store import package_digest
+
+
+def convert(source, tmp_path, **kwargs):
+    return excel_to_word(source, tmp_path / 'out.docx', perform_verify=False, open_output=False, in_memory=True, **kwargs)
+
+
+def test_timestamps_are_not_pinned_by_default(workbook_bytes, tmp_path):
+    assert not docx_template.DETERMINISTIC_DOCX
+    document = convert(workbook_bytes, tmp_path)
+    with zipfile.ZipFile(io.BytesIO(document.read_bytes())) as zf:
+        assert b'1980-01-01T00:00:00Z' not in zf.read('docProps/core.xml')
+        assert all(info.date_time != (1980, 1, 1, 0, 0, 0) for info in zf.infolist())
+
+
+def test_deterministic_flag_pins_timestamps(workbook_bytes, tmp_path):
+    first = convert(workbook_bytes, tmp_path, deterministic=True)
+    second = convert(workbook_bytes, tmp_path, deterministic=True)
+    assert first.read_bytes() == second.read_bytes()
+    with zipfile.ZipFile(io.BytesIO(first.read_bytes())) as zf:
+        assert {info.date_time for info in zf.infolist()} == {(1980, 1, 1, 0, 0, 0)}
+        assert b'1980-01-01T00:00:00Z' in zf.read('docProps/core.xml')
+
+
+def test_digest_ignores_document_timestamps(workbook_bytes, tmp_path):
+    # 文档属性与 zip 条目时间不计入内容指纹：缓存键不依赖可重现输出
+    pinned = convert(workbook_bytes, tmp_path, deterministic=True)
+    real = convert(workbook_bytes, tmp_path, deterministic=False)
+    assert pinned.read_bytes() != real.read_bytes()
+    assert pinned.digest == real.digest == package_digest(real.read_bytes())
+
+
+def test_digest_changes_with_content(workbook_bytes, tmp_path):
+    from load_test import build_workbook
+    assert convert(build_workbook(3), tmp_path).digest != convert(workbook_bytes, tmp_path).digest
@@ -0,0 +1,82 @@
+import os
+import time
+
+import pytest
+
+import cleanup_loop
+from cleanup_loop import ExpiryScheduler, set_session_files, touch_file
+
+
+@pytest.fixture
+def dirs(tmp_path, monkeypatch):
+    """把清理守护的目录与锁文件指向临时目录"""
+    paths = {}
+    for name, attr in (('excel_input', 'INPUT_DIR'), ('word_output', 'OUTPUT_DIR'), ('session_data', 'SESSION_DIR')):
+        paths[name] = tmp_path / name
+        paths[name].mkdir()
+        monkeypatch.setattr(cleanup_loop, attr, paths[name])
+    monkeypatch.setattr(cleanup_loop, 'BUDGET_LOCK_PATH', tmp_path / 'disk_budget.lock')
+    return paths
+
+
+def budget_scheduler(budget_bytes):
+    scheduler = ExpiryScheduler(retention_seconds=3600)
+    scheduler.disk_budget_bytes = budget_bytes
+    return scheduler
+
+
+def add_file(directory, name, age, size=10):
+    """写入文件，并把访问/修改时间设为 age 秒前（决定最近使用顺序）"""
+    path = directory / name
+    path.write_bytes(b'x' * size)
+    past = time.time() - age
+    os.utime(path, (past, past))
+    return path
+
+
+def test_least_recently_used_files_are_evicted(dirs):
+    scheduler = budget_scheduler(25)
+    a = add_file(dirs['excel_input'], 'a_1700000000000.xlsx', age=300)
+    b = add_file(dirs['word_output'], 'b_1700000000001.docx', age=200)
+    touch_file(a)  # a 变为最近使用
+    c = add_file(dirs['excel_input'], 'c_1700000000002.xlsx', age=0)
+    assert scheduler.usage_bytes == 30
+    assert scheduler.enforce_budget(keep=(c,)) == 1
+    assert a.exists() and not b.exists() and c.exists()
+    assert scheduler.usage_bytes == 20
+
+
+def test_touch_keeps_the_modification_time(dirs):
+    path = add_file(dirs['excel_input'], 'a_1700000000000.xlsx', age=300)
+    mtime = path.stat().st_mtime
+    touch_file(path)
+    assert path.stat().st_mtime == mtime
+    assert path.stat().st_atime > mtime
+
+
+def test_files_in_use_by_a_session_are_kept(dirs):
+    scheduler = budget_scheduler(15)
+    (dirs['session_data'] / 'session-1').mkdir()
+    a = add_file(dirs['excel_input'], 'a_1700000000000.xlsx', age=200)
+    b = add_file(dirs['word_output'], 'b_1700000000001.docx', age=100)
+    set_session_files('session-1', a, b)
+    assert scheduler.enforce_budget() == 0
+    assert a.exists() and b.exists()
+    set_session_files('session-1', b)
+    assert scheduler.enforce_budget() == 1
+    assert not a.exists()
+
+
+def test_only_timestamp_files_count(dirs):
+    scheduler = budget_scheduler(15)
+    add_file(dirs['excel_input'], 'manual.xlsx', age=200, size=100)
+    b = add_file(dirs['word_output'], 'b_1700000000001.docx', age=100)
+    assert scheduler.usage_bytes == 10
+    assert scheduler.enforce_budget() == 0
+    assert b.exists()
+
+
+def test_zero_budget_means_unlimited(dirs):
+    scheduler = budget_scheduler(0)
+    add_file(dirs['excel_input'], 'a_1700000000000.xlsx', age=0, size=1000)
+    assert scheduler.enforce_budget() == 0
@@ -0,0 +1,38 @@
+from app import load_document_bytes
+
+
+def test_same_version_returns_cached_bytes(tmp_path):
+    load_document_bytes.clear()
+    path = tmp_path / 'doc.docx'
+    path.write_bytes(b'first')
+    assert load_document_bytes('v1', _path_str=str(path)) == b'first'
+    # 版本不变时不再读盘：文件被改写后仍返回缓存中的内容
+    path.write_bytes(b'second')
+    assert load_document_bytes('v1', _path_str=str(path)) == b'first'
+    assert load_document_bytes('v2', _path_str=str(path)) == b'second'
+
+
+def test_bytes_are_reread_after_eviction(tmp_path):
+    load_document_bytes.clear()
+    path = tmp_path / 'doc.docx'
+    path.write_bytes(b'first')
+    assert load_document_bytes('v1', _path_str=str(path)) == b'first'
+    path.write_bytes(b'second')
+    # 超过 max_entries 个版本后最早的版本被淘汰，再次读取时从磁盘重新读取
+    other = tmp_path / 'other.docx'
+    other.write_bytes(b'other')
+    for version in range(40):
+        load_document_bytes(f'other-{version}', _path_str=str(other))
+    assert load_document_bytes('v1', _path_str=str(path)) == b'second'
+
+
+def test_job_records_whether_the_read_hit_the_cache(tmp_path, monkeypatch):
+    import app
+    load_document_bytes.clear()
+    monkeypatch.setattr(app, 'document_version', lambda file_path: 'v1')
+    path = tmp_path / 'doc_1700000000000.docx'
+    path.write_bytes(b'first')
+    first, second = {}, {}
+    assert app.get_document_bytes(path, first) == b'first'
+    assert app.get_document_bytes(path, second) == b'first'
+    assert first['cache'] == 'miss' and second['cache'] == 'hit'
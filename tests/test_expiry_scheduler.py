@@ -0,0 +1,80 @@
+import os
+import threading
+import time
+
+import pytest
+
+import cleanup_loop
+from cleanup_loop import ExpiryScheduler
+
+
+@pytest.fixture
+def dirs(tmp_path, monkeypatch):
+    """把清理守护的目录指向临时目录"""
+    paths = {}
+    for name, attr in (('excel_input', 'INPUT_DIR'), ('word_output', 'OUTPUT_DIR'), ('session_data', 'SESSION_DIR')):
+        paths[name] = tmp_path / name
+        paths[name].mkdir()
+        monkeypatch.setattr(cleanup_loop, attr, paths[name])
+    return paths
+
+
+def make_file(directory, name, size=10, age=0):
+    path = directory / name
+    path.write_bytes(b'x' * size)
+    if age:
+        past = time.time() - age
+        os.utime(path, (past, past))
+    return path
+
+
+def test_due_paths_are_popped_in_deadline_order():
+    scheduler = ExpiryScheduler(retention_seconds=60)
+    scheduler.schedule('b', deadline=200)
+    scheduler.schedule('a', deadline=100)
+    scheduler.schedule('c', deadline=300)
+    assert scheduler._pop_due(250) == ['a', 'b']
+    assert len(scheduler) == 1
+    assert scheduler._pop_due(1000) == ['c']
+
+
+def test_rescheduling_supersedes_the_earlier_deadline():
+    scheduler = ExpiryScheduler(retention_seconds=60)
+    scheduler.schedule('a', deadline=100)
+    scheduler.schedule('a', deadline=500)
+    assert scheduler._pop_due(200) == []
+    assert scheduler._pop_due(600) == ['a']
+    assert len(scheduler) == 0
+
+
+def test_expire_deletes_old_files_and_postpones_rewritten_ones(dirs):
+    scheduler = ExpiryScheduler(retention_seconds=60)
+    now = time.time()
+    old = make_file(dirs['excel_input'], 'old_1700000000000.xlsx', age=120)
+    rewritten = make_file(dirs['word_output'], 'new_1700000000001.docx')
+    assert scheduler._expire(str(old), now) == 10
+    assert not old.exists()
+    # 期间被重新写入的文件不删除，按新的 mtime 顺延
+    assert scheduler._expire(str(rewritten), now) is None
+    assert rewritten.exists()
+    assert scheduler._pop_due(now + 30) == []
+    assert scheduler._pop_due(now + 120) == [str(rewritten)]
+
+
+def test_reconcile_indexes_only_timestamp_files_and_sessions(dirs):
+    scheduler = ExpiryScheduler(retention_seconds=60)
+    make_file(dirs['excel_input'], 'upload_1700000000000.xlsx')
+    make_file(dirs['word_output'], 'keep_me.docx')
+    (dirs['session_data'] / 'session-1').mkdir()
+    assert scheduler.reconcile() == 2
+    assert len(scheduler) == 2
+
+
+def test_run_expires_files_when_they_come_due(dirs):
+    scheduler = ExpiryScheduler(retention_seconds=0.2, reconcile_interval=0)
+    path = make_file(dirs['excel_input'], 'upload_1700000000000.xlsx')
+    threading.Thread(target=scheduler.run, daemon=True).start()
+    deadline = time.monotonic() + 5
+    while path.exists():
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
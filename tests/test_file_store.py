@@ -0,0 +1,52 @@
+import hashlib
+import io
+import threading
+
+import file_store
+from excel_to_word_converter import excel_to_word
+from file_store import content_digest, is_writing, package_digest, wait_written, write_async
+
+
+def test_write_async_writes_and_reports_done(tmp_path):
+    path = tmp_path / 'upload_1700000000000.xlsx'
+    done = []
+    write_async(path, b'content', on_done=done.append).result(5)
+    assert wait_written(path)
+    assert path.read_bytes() == b'content'
+    assert done == [path]
+    assert not is_writing(path)
+
+
+def test_failed_write_is_reported_once_and_released(tmp_path):
+    path = tmp_path / 'missing' / 'upload_1700000000000.xlsx'  # 目录不存在，写入失败
+    errors = []
+    reported = threading.Event()
+
+    def on_error(failed_path, error):
+        errors.append((failed_path, error))
+        reported.set()
+
+    # 先占住后台写入线程，确保等待时写入仍在进行中
+    release = threading.Event()
+    blockers = [file_store._get_writer().submit(release.wait, 5) for _ in range(file_store.WRITER_THREADS)]
+    write_async(path, b'content', on_error=on_error)
+    assert is_writing(path)
+    threading.Timer(0.1, release.set).start()
+    assert wait_written(path) is False
+    for blocker in blockers:
+        blocker.result(5)
+    assert reported.wait(5)
+    assert len(errors) == 1 and errors[0][0] == path
+    # 失败的写入不再视为写入中，再次等待也不会抛出
+    assert not is_writing(path)
+    assert wait_written(path)
+
+
+def test_digest_matches_content_and_source_kinds(workbook_bytes, tmp_path):
+    path = tmp_path / 'book.xlsx'
+    path.write_bytes(workbook_bytes)
+    documents = [excel_to_word(source, tmp_path / 'out.docx', perform_verify=False, in_memory=True, deterministic=True)
+                 for source in (path, str(path), workbook_bytes, memoryview(workbook_bytes), io.BytesIO(workbook_bytes))]
+    assert len({document.digest for document in documents}) == 1
+    assert documents[0].digest == package_digest(documents[0].read_bytes())
+    assert content_digest(memoryview(workbook_bytes)) == hashlib.sha256(workbook_bytes).hexdigest()
@@ -0,0 +1,46 @@
+import pytest
+
+from job_history import JobHistory
+
+
+@pytest.fixture
+def history(tmp_path):
+    return JobHistory(tmp_path / 'history.db')
+
+
+def test_aggregates_by_kind(history):
+    history.record(kind='verify', outcome='success', duration_ms=100, peak_rss_bytes=100, cache='hit', verify_passed=1)
+    history.record(kind='verify', outcome='mismatch', duration_ms=300, peak_rss_bytes=300, cache='miss', verify_passed=0)
+    history.record(kind='verify', outcome='failed', duration_ms=200, peak_rss_bytes=None, cache=None)
+    history.record(kind='convert', outcome='success', duration_ms=50, peak_rss_bytes=500)
+    convert, verify = history.aggregates()
+    assert convert['kind'] == 'convert' and convert['jobs'] == 1
+    # 不读取缓存的任务 cache 为空，不计入命中率
+    assert convert['cache_hit_rate'] is None
+    assert verify['jobs'] == 3
+    assert verify['completed_rate'] == pytest.approx(2 / 3)
+    assert verify['avg_duration_ms'] == 200 and verify['max_duration_ms'] == 300
+    assert verify['avg_peak_rss_bytes'] == 200 and verify['max_peak_rss_bytes'] == 300
+    assert verify['cache_hit_rate'] == 0.5
+    assert verify['verify_pass_rate'] == 0.5
+
+
+def test_aggregates_since(history):
+    history.record(kind='convert', outcome='success', finished_at='2020-01-01T00:00:00')
+    history.record(kind='convert', outcome='success', finished_at='2030-01-01T00:00:00')
+    assert history.aggregates(since='2025-01-01')[0]['jobs'] == 1
+
+
+def test_slowest_and_stage_averages(history):
+    history.record(kind='convert', outcome='success', duration_ms=10, stages={'render': 4, 'save': 6})
+    history.record(kind='convert', outcome='success', duration_ms=30, stages={'render': 20, 'save': 10})
+    history.record(kind='verify', outcome='success', duration_ms=99)
+    slowest = history.slowest(kind='convert', limit=1)
+    assert [job['duration_ms'] for job in slowest] == [30]
+    assert slowest[0]['stages'] == {'render': 20, 'save': 10}
+    assert history.stage_averages('convert') == [('render', 12), ('save', 8)]
+
+
+def test_unknown_fields_are_rejected(history):
+    with pytest.raises(ValueError):
+        history.record(kind='convert', outcome='success', unknown=1)
@@ -0,0 +1,123 @@
+import threading
+import time
+
+import pytest
+
+from job_scheduler import JobCost, JobScheduler, estimate_job_cost, FAST_LANE, LARGE_LANE
+
+MB = 1024 * 1024
+
+
+def cost(memory_mb):
+    return JobCost(0, 0, memory_mb * MB)
+
+
+class Job(threading.Thread):
+    """在后台线程中申请名额，获得后保持运行直到 finish()"""
+
+    def __init__(self, scheduler, job_cost):
+        super().__init__(daemon=True)
+        self.scheduler = scheduler
+        self.job_cost = job_cost
+        self.positions = []
+        self.started = threading.Event()
+        self._release = threading.Event()
+        self.start()
+
+    def run(self):
+        with self.scheduler.admit(self.job_cost, on_wait=self.positions.append, poll_interval=0.01):
+            self.started.set()
+            self._release.wait(5)
+
+    def finish(self):
+        self._release.set()
+        self.join(5)
+
+
+def wait_running(scheduler, count):
+    deadline = time.monotonic() + 5
+    while sum(scheduler.stats()['running'].values()) != count:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_lane_is_chosen_by_estimated_memory():
+    scheduler = JobScheduler(large_threshold_mb=256)
+    assert scheduler.lane_for(cost(255)) == FAST_LANE
+    assert scheduler.lane_for(cost(256)) == LARGE_LANE
+
+
+def test_large_lane_is_limited_without_blocking_small_jobs():
+    scheduler = JobScheduler(max_concurrent=4, large_concurrency=1, memory_budget_mb=10000, large_threshold_mb=256)
+    first = Job(scheduler, cost(300))
+    assert first.started.wait(5)
+    second = Job(scheduler, cost(300))
+    small = Job(scheduler, cost(10))
+    assert small.started.wait(5)
+    assert not second.started.wait(0.2)
+    assert second.positions and second.positions[0] == 1
+    first.finish()
+    assert second.started.wait(5)
+    second.finish()
+    small.finish()
+
+
+def test_memory_budget_holds_jobs_until_memory_is_released():
+    scheduler = JobScheduler(max_concurrent=4, memory_budget_mb=1000, large_threshold_mb=10000)
+    first = Job(scheduler, cost(600))
+    assert first.started.wait(5)
+    second = Job(scheduler, cost(600))
+    assert not second.started.wait(0.2)
+    assert scheduler.stats()['memory_in_use'] == 600 * MB
+    first.finish()
+    assert second.started.wait(5)
+    second.finish()
+    assert scheduler.stats()['memory_in_use'] == 0
+
+
+def test_job_over_budget_runs_when_nothing_else_is_running():
+    scheduler = JobScheduler(memory_budget_mb=100, large_threshold_mb=10000)
+    job = Job(scheduler, cost(500))
+    assert job.started.wait(5)
+    job.finish()
+
+
+def test_concurrency_limit_and_fifo_order():
+    scheduler = JobScheduler(max_concurrent=1, memory_budget_mb=10000)
+    first = Job(scheduler, cost(1))
+    assert first.started.wait(5)
+    second = Job(scheduler, cost(1))
+    time.sleep(0.05)
+    third = Job(scheduler, cost(1))
+    time.sleep(0.05)
+    assert third.positions[-1] == 2
+    first.finish()
+    assert second.started.wait(5)
+    assert not third.started.is_set()
+    second.finish()
+    assert third.started.wait(5)
+    third.finish()
+    wait_running(scheduler, 0)
+
+
+def test_interrupted_wait_leaves_the_queue():
+    scheduler = JobScheduler(max_concurrent=1)
+    first = Job(scheduler, cost(1))
+    assert first.started.wait(5)
+
+    def interrupt(position):
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        with scheduler.admit(cost(1), on_wait=interrupt):
+            pass
+    assert scheduler.stats()['queued'] == {FAST_LANE: 0, LARGE_LANE: 0}
+    first.finish()
+
+
+def test_estimate_job_cost(workbook_bytes):
+    estimate = estimate_job_cost(workbook_bytes)
+    assert 0 < estimate.compressed_bytes < estimate.uncompressed_bytes
+    assert estimate.memory_bytes > estimate.uncompressed_bytes
+    # 非 zip 内容按大小估算
+    assert estimate_job_cost(b'\0' * 100).compressed_bytes == 100
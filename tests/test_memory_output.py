@@ -0,0 +1,65 @@
+import hashlib
+
+import pytest
+
+from excel_to_word_converter import excel_to_word
+from file_store import OutputBuffer, SpillFile
+from metrics import CACHE_MISSES
+
+
+def convert(source, word_path, **kwargs):
+    """转换并返回文档字节（in_memory 时取 OutputBuffer，否则读取写出的文件）"""
+    document = excel_to_word(source, word_path, perform_verify=False, open_output=False, deterministic=True, **kwargs)
+    return document.read_bytes() if kwargs.get('in_memory') else word_path.read_bytes()
+
+
+@pytest.mark.parametrize('mode', [
+    dict(streaming=False),
+    dict(streaming=True),
+    dict(render_processes=2),
+], ids=['sequential', 'streaming', 'parallel'])
+def test_in_memory_output_matches_disk_output(workbook_bytes, tmp_path, mode):
+    expected = convert(workbook_bytes, tmp_path / 'disk.docx', streaming=False, render_processes=1)
+    assert convert(workbook_bytes, tmp_path / 'memory.docx', in_memory=True, **mode) == expected
+    assert not (tmp_path / 'memory.docx').exists()  # 内存模式不写出文件，由调用方决定落盘
+
+
+def test_spill_file_moves_to_disk_past_the_limit(tmp_path):
+    spill = SpillFile(tmp_path / 'spill.tmp', max_bytes=10)
+    spill.write(b'abcd')
+    assert not spill.spilled
+    spill.write(b'efghijklmnop')
+    assert spill.spilled
+    spill.seek(0)
+    spill.write(b'A')
+    document = spill.finish()
+    content = b'Abcdefghijklmnop'
+    assert document.spilled and document.size == len(content)
+    assert document.read_bytes() == content
+    assert document.digest == hashlib.sha256(content).hexdigest()
+    # 转存的临时文件与目标同目录，保存时直接改名
+    done = []
+    target = tmp_path / 'out.docx'
+    document.persist(target, on_done=done.append)
+    assert target.read_bytes() == content and not (tmp_path / 'spill.tmp').exists()
+    assert done == [target]
+
+
+def test_small_output_stays_in_memory(tmp_path):
+    spill = SpillFile(tmp_path / 'spill.tmp', max_bytes=10)
+    spill.write(b'abc')
+    document = spill.finish()
+    assert not document.spilled and document.data == b'abc'
+    assert not (tmp_path / 'spill.tmp').exists()
+
+
+def test_prefilled_document_is_not_a_cache_miss(tmp_path):
+    from app import load_document_bytes
+    load_document_bytes.clear()
+    path = tmp_path / 'doc.docx'
+    document = OutputBuffer(data=b'generated', size=9, digest='digest-1')
+    misses = CACHE_MISSES.value(cache='document')
+    assert load_document_bytes('digest-1', _path_str=str(path), _document=document) == b'generated'
+    # 预先放入后，按版本读取直接命中，不读盘（文件尚未写出）
+    assert load_document_bytes('digest-1', _path_str=str(path)) == b'generated'
+    assert CACHE_MISSES.value(cache='document') == misses
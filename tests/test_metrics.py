@@ -0,0 +1,67 @@
+import math
+import socket
+import urllib.request
+
+import pytest
+
+import metrics
+from metrics import Counter, Gauge, Histogram, render_text
+
+
+def test_counter_renders_labelled_samples():
+    counter = Counter('test_jobs_total', '测试 "计数"\n第二行', ('kind',))
+    counter.inc(kind='convert')
+    counter.inc(2, kind='verify')
+    text = render_text()
+    assert '# HELP test_jobs_total 测试 \\"计数\\"\\n第二行' in text
+    assert '# TYPE test_jobs_total counter' in text
+    assert 'test_jobs_total{kind="convert"} 1\n' in text
+    assert 'test_jobs_total{kind="verify"} 2\n' in text
+    with pytest.raises(ValueError):
+        counter.inc(-1, kind='convert')
+    with pytest.raises(ValueError):
+        counter.inc(lane='fast')
+
+
+def test_duplicate_names_are_rejected():
+    Counter('test_unique_total', '唯一')
+    with pytest.raises(ValueError):
+        Counter('test_unique_total', '重复')
+
+
+def test_gauge_function_is_evaluated_at_collection():
+    gauge = Gauge('test_queue_depth', '排队数', ('lane',))
+    depth = {('fast',): 1}
+    gauge.set_function(lambda: depth)
+    assert 'test_queue_depth{lane="fast"} 1\n' in render_text()
+    depth[('fast',)] = 3
+    assert 'test_queue_depth{lane="fast"} 3\n' in render_text()
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram('test_duration_seconds', '耗时', buckets=(1, 5))
+    for value in (0.5, 2, 2, 10):
+        histogram.observe(value)
+    text = render_text()
+    assert 'test_duration_seconds_bucket{le="1"} 1\n' in text
+    assert 'test_duration_seconds_bucket{le="5"} 3\n' in text
+    assert 'test_duration_seconds_bucket{le="+Inf"} 4\n' in text
+    assert 'test_duration_seconds_sum 14.5\n' in text
+    assert 'test_duration_seconds_count 4\n' in text
+    assert histogram.quantile(0.5) == 5
+    assert histogram.quantile(1.0) == math.inf
+
+
+def test_http_endpoint_serves_the_text_format(monkeypatch):
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    monkeypatch.setattr(metrics, '_server', None)
+    server = metrics.start_http_server(port=port, host='127.0.0.1')
+    try:
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}/metrics', timeout=5) as response:
+            assert response.headers['Content-Type'] == metrics.CONTENT_TYPE
+            assert '# TYPE converter_jobs_total counter' in response.read().decode('utf-8')
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,63 @@
+import os
+import time
+
+import pytest
+
+import cleanup_loop
+from cleanup_loop import ExpiryScheduler
+from file_store import FileLock
+
+
+@pytest.fixture
+def dirs(tmp_path, monkeypatch):
+    """把清理守护的目录与锁文件指向临时目录"""
+    paths = {}
+    for name, attr in (('excel_input', 'INPUT_DIR'), ('word_output', 'OUTPUT_DIR'), ('session_data', 'SESSION_DIR')):
+        paths[name] = tmp_path / name
+        paths[name].mkdir()
+        monkeypatch.setattr(cleanup_loop, attr, paths[name])
+    monkeypatch.setattr(cleanup_loop, 'BUDGET_LOCK_PATH', tmp_path / 'disk_budget.lock')
+    return paths
+
+
+def test_only_one_instance_owns_the_cleanup_lock(tmp_path):
+    path = tmp_path / 'cleanup.lock'
+    owner, other = FileLock(path), FileLock(path)
+    assert owner.acquire(blocking=False)
+    assert not other.acquire(blocking=False)
+    owner.release()
+    # 负责实例退出（释放锁）后其他实例接管
+    assert other.acquire(blocking=False)
+    assert path.read_text().strip() == str(os.getpid())
+    other.release()
+
+
+def test_budget_counts_files_written_by_other_instances(dirs):
+    other_instance = dirs['word_output'] / 'other_1700000000000.docx'
+    other_instance.write_bytes(b'x' * 10)
+    past = time.time() - 100
+    os.utime(other_instance, (past, past))
+    # 本实例没有登记过 other_instance，仍按共享目录的总用量淘汰它
+    scheduler = ExpiryScheduler(retention_seconds=3600)
+    scheduler.disk_budget_bytes = 15
+    mine = dirs['excel_input'] / 'mine_1700000000001.xlsx'
+    mine.write_bytes(b'x' * 10)
+    assert scheduler.enforce_budget(keep=(mine,)) == 1
+    assert not other_instance.exists() and mine.exists()
+
+
+def test_owner_expires_files_left_by_exited_instances(dirs):
+    leftover = dirs['excel_input'] / 'left_1700000000000.xlsx'
+    leftover.write_bytes(b'x')
+    past = time.time() - 120
+    os.utime(leftover, (past, past))
+    owner = ExpiryScheduler(retention_seconds=60)
+    assert owner.reconcile() == 1
+    now = time.time()
+    for path in owner._pop_due(now):
+        owner._expire(path, now)
+    assert not leftover.exists()
+
+
+def test_reconcile_interval_does_not_exceed_retention():
+    assert 0 < cleanup_loop.RECONCILE_INTERVAL_SECONDS <= cleanup_loop.RETENTION_HOURS * 3600
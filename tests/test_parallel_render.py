@@ -0,0 +1,25 @@
+import io
+import zipfile
+
+from excel_to_word_converter import excel_to_word, excel_to_word_split
+
+
+def convert(source, word_path, **kwargs):
+    excel_to_word(source, word_path, perform_verify=False, open_output=False, deterministic=True, **kwargs)
+    return word_path.read_bytes()
+
+
+def test_parallel_render_matches_sequential(workbook_bytes, tmp_path):
+    expected = convert(workbook_bytes, tmp_path / 'sequential.docx', streaming=False, render_processes=1)
+    assert convert(workbook_bytes, tmp_path / 'parallel.docx', streaming=False, render_processes=2) == expected
+
+
+def test_split_output_has_one_document_per_level1_module(workbook_bytes, tmp_path):
+    zip_path = tmp_path / 'split.zip'
+    assert excel_to_word_split(workbook_bytes, zip_path, render_processes=2, file_name='book.xlsx') == 2
+    with zipfile.ZipFile(zip_path) as archive:
+        names = archive.namelist()
+        assert len(names) == 2 and all(name.endswith('.docx') for name in names)
+        assert [name.split('_')[0] for name in names] == ['01', '02']
+        for name in names:
+            zipfile.ZipFile(io.BytesIO(archive.read(name))).testzip()
@@ -0,0 +1,50 @@
+import io
+import re
+import zipfile
+
+import pytest
+
+from preflight import preflight_upload
+
+
+def rewrite_sheets(data, transform):
+    """对工作簿中各工作表的 XML 做字节级改写，其余部件原样保留"""
+    out = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(data)) as zin, zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED) as zout:
+        for info in zin.infolist():
+            content = zin.read(info)
+            if info.filename.startswith('xl/worksheets/'):
+                content = transform(content)
+            zout.writestr(info, content)
+    return out.getvalue()
+
+
+def reorder_attributes(xml):
+    """r 属性移到单元格其余属性之后（如 <c s="1" t="s" r="A1">）"""
+    return re.sub(rb'<c r="([A-Z]+\d+)"([^>]*?)(/?)>', rb'<c\2 r="\1"\3>', xml)
+
+
+def prefix_namespace(xml):
+    """主命名空间改为带前缀的形式（<x:worksheet>、<x:c> ...）"""
+    xml = xml.replace(b'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"',
+                      b'xmlns:x="http://schemas.openxmlformats.org/spreadsheetml/2006/main"')
+    return re.sub(rb'<(/?)(?!\?)([a-zA-Z]+)([\s>/])', rb'<\1x:\2\3', xml)
+
+
+def drop_cell_refs(xml):
+    """单元格省略 r 属性（按出现顺序定位）"""
+    return re.sub(rb' r="[A-Z]+\d+"', b'', xml)
+
+
+@pytest.mark.parametrize('transform', [reorder_attributes, prefix_namespace, drop_cell_refs],
+                         ids=['reordered', 'prefixed', 'no_refs'])
+def test_preflight_accepts_sheet_variants(workbook_bytes, transform):
+    expected = preflight_upload(workbook_bytes, 'book.xlsx')
+    result = preflight_upload(rewrite_sheets(workbook_bytes, transform), 'book.xlsx')
+    assert expected.ok
+    assert result.ok, result.message
+    assert result.header_row == expected.header_row
+
+
+def test_preflight_rejects_non_excel():
+    assert not preflight_upload(b'not a workbook', 'book.xlsx').ok
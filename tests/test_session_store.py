@@ -0,0 +1,54 @@
+from session_store import SessionStore
+
+BLOB = b'x' * (400 * 1024)
+
+
+def hot_keys(store):
+    return [key for _, key in store._hot]
+
+
+def test_memory_is_bounded_and_evicts_least_recently_used(tmp_path):
+    store = SessionStore(root=tmp_path, memory_budget_mb=1)
+    session = store.new_session()
+    for key in ('a', 'b'):
+        store.put(session, key, BLOB)
+    store.get(session, 'a')  # a 变为最近使用
+    store.put(session, 'c', BLOB)
+    assert hot_keys(store) == ['a', 'c']
+    assert store.memory_usage() <= 1024 * 1024
+    # 被淘汰的数据仍在磁盘上，读取时重新载入
+    assert store.get(session, 'b') == BLOB
+    assert hot_keys(store) == ['c', 'b']
+
+
+def test_budget_is_shared_across_sessions(tmp_path):
+    store = SessionStore(root=tmp_path, memory_budget_mb=1)
+    first, second = store.new_session(), store.new_session()
+    store.put(first, 'log', BLOB)
+    store.put(second, 'log', BLOB)
+    store.put(second, 'stats', BLOB)
+    assert (first, 'log') not in store._hot
+    assert store.get(first, 'log') == BLOB
+
+
+def test_oversized_values_stay_on_disk(tmp_path):
+    store = SessionStore(root=tmp_path, memory_budget_mb=1)
+    session = store.new_session()
+    big = b'y' * (2 * 1024 * 1024)
+    store.put(session, 'big', big)
+    assert store.memory_usage() == 0
+    assert store.get(session, 'big') == big
+
+
+def test_delete_and_drop_session(tmp_path):
+    store = SessionStore(root=tmp_path, memory_budget_mb=1)
+    session = store.new_session()
+    store.put(session, 'a', 1)
+    store.put(session, 'b', 2)
+    store.delete(session, 'a')
+    assert store.get(session, 'a', 'missing') == 'missing'
+    assert store.get(session, 'b') == 2
+    store.drop_session(session)
+    assert store.get(session, 'b') is None
+    assert store.memory_usage() == 0
+    assert not (tmp_path / session).exists()
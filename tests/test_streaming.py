@@ -0,0 +1,36 @@
+import io
+
+from excel_to_word_converter import excel_to_word
+
+
+def convert(source, word_path, **kwargs):
+    excel_to_word(source, word_path, perform_verify=False, open_output=False, deterministic=True, **kwargs)
+    return word_path.read_bytes()
+
+
+def non_contiguous_workbook():
+    """同一三级模块被另一个模块隔开、在工作表中出现两次的工作簿"""
+    from openpyxl import Workbook
+    from warmup import SAMPLE_HEADER
+
+    wb = Workbook()
+    ws = wb.active
+    ws.title = '拆分表'
+    ws.append(SAMPLE_HEADER)
+    for no, l3 in enumerate(['三级A', '三级B', '三级A']):
+        ws.append(['需求' if no == 0 else None, '一级' if no == 0 else None, '二级' if no == 0 else None, l3,
+                   '用户', '触发', f'功能过程{no}', f'输入-数据{no}；', 'E', 'dg', 'attr', '新增', 1])
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def test_streaming_matches_in_memory_rendering(workbook_bytes, tmp_path):
+    expected = convert(workbook_bytes, tmp_path / 'sequential.docx', streaming=False, render_processes=1)
+    assert convert(workbook_bytes, tmp_path / 'streaming.docx', streaming=True) == expected
+
+
+def test_streaming_falls_back_on_non_contiguous_modules(tmp_path):
+    data = non_contiguous_workbook()
+    expected = convert(data, tmp_path / 'sequential.docx', streaming=False, render_processes=1)
+    assert convert(data, tmp_path / 'streaming.docx', streaming=True) == expected
@@ -0,0 +1,35 @@
+import pytest
+
+from excel_to_word_converter import excel_to_word
+from cancellation import CancelToken, JobCancelled
+from verify_word import verify_consistency
+
+
+@pytest.fixture(scope="module")
+def word_bytes(workbook_bytes, tmp_path_factory):
+    target = tmp_path_factory.mktemp('verify') / 'out.docx'
+    return excel_to_word(workbook_bytes, target, perform_verify=False, open_output=False, in_memory=True).read_bytes()
+
+
+def test_progress_is_reported_inside_each_stage(workbook_bytes, word_bytes):
+    reports = []
+    passed, _ = verify_consistency(workbook_bytes, word_bytes, progress=lambda stage, fraction: reports.append((stage, fraction)))
+    assert passed
+    fractions = [fraction for _, fraction in reports]
+    assert fractions == sorted(fractions)
+    assert fractions[-1] == 1.0
+    # 按模块组上报：重复检查与模块统计阶段内部各有逐组的进度，而不是只有阶段起点
+    for stage, start, end in (("检查重复功能过程", 0.1, 0.25), ("生成模块统计", 0.75, 1.0)):
+        inside = {fraction for name, fraction in reports if name == stage and start < fraction < end}
+        assert len(inside) > 10
+
+
+def test_cancel_is_checked_inside_the_loops(workbook_bytes, word_bytes):
+    token = CancelToken()
+
+    def progress(stage, fraction):
+        if stage == "生成模块统计" and fraction > 0.8:
+            token.cancel()
+
+    with pytest.raises(JobCancelled):
+        verify_consistency(workbook_bytes, word_bytes, progress=progress, cancel_token=token)
@@ -0,0 +1,104 @@
+import time
+
+import pytest
+
+from cancellation import CancelToken, JobCancelled, JobTimeout
+from worker_pool import WorkerPool, WorkerCrashed, WorkerError
+
+
+@pytest.fixture
+def make_pool(monkeypatch):
+    monkeypatch.setenv('WARMUP', '0')  # 工作进程跳过样例预热
+    pools = []
+
+    def make(**kwargs):
+        kwargs.setdefault('size', 1)
+        pool = WorkerPool(**kwargs)
+        pools.append(pool)
+        return pool
+
+    yield make
+    for pool in pools:
+        pool.shutdown()
+
+
+def test_results_errors_and_progress(make_pool):
+    pool = make_pool()
+    assert pool.run('worker_jobs:add', 2, b=3) == 5
+    with pytest.raises(WorkerError, match='bad input'):
+        pool.run('worker_jobs:fail')
+    updates = []
+    assert pool.run('worker_jobs:count_steps', 10, on_progress=lambda stage, fraction: updates.append(fraction)) == 10
+    assert updates and all(0 <= fraction <= 1 for fraction in updates)
+
+
+def test_workers_are_recycled_after_max_jobs(make_pool):
+    pool = make_pool(max_jobs_per_worker=2)
+    pids = [pool.run('worker_jobs:pid') for _ in range(3)]
+    assert pids[0] == pids[1] != pids[2]
+
+
+def test_task_errors_keep_the_worker(make_pool):
+    pool = make_pool()
+    before = pool.run('worker_jobs:pid')
+    with pytest.raises(WorkerError):
+        pool.run('worker_jobs:fail')
+    assert pool.run('worker_jobs:pid') == before
+
+
+def test_crashed_worker_is_replaced(make_pool):
+    pool = make_pool()
+    with pytest.raises(WorkerCrashed, match='退出码 3'):
+        pool.run('worker_jobs:exit_abruptly')
+    assert pool.run('worker_jobs:add', 1, 1) == 2
+
+
+@pytest.mark.parametrize('chatty', [False, True], ids=['quiet', 'chatty'])
+def test_memory_limit_kills_the_job(make_pool, chatty):
+    pool = make_pool(memory_limit_mb=512)
+    with pytest.raises(WorkerCrashed, match='内存占用超出限制'):
+        pool.run('worker_jobs:allocate', 768, chatty=chatty)
+    assert pool.run('worker_jobs:add', 1, 1) == 2
+
+
+def test_cpu_limit_kills_the_job(make_pool):
+    pool = make_pool(cpu_limit_seconds=1)
+    with pytest.raises(WorkerCrashed, match='CPU 时间超出限制'):
+        pool.run('worker_jobs:spin')
+
+
+def test_in_process_pool_runs_directly():
+    pool = WorkerPool(size=0)
+    assert pool.run('worker_jobs:add', 1, 2) == 3
+
+
+def test_cancelled_job_stops_and_keeps_the_worker(make_pool):
+    pool = make_pool()
+    before = pool.run('worker_jobs:pid')
+    token = CancelToken()
+
+    def progress(stage, fraction):
+        if fraction >= 0.2:
+            token.cancel()
+
+    with pytest.raises(JobCancelled) as raised:
+        pool.run('worker_jobs:count_steps', 100, on_progress=progress, cancel_token=token)
+    assert not isinstance(raised.value, JobTimeout)
+    # 任务在检查点停止，工作进程可继续复用
+    assert pool.run('worker_jobs:pid') == before
+
+
+def test_timed_out_job_raises_job_timeout(make_pool):
+    pool = make_pool()
+    started = time.monotonic()
+    with pytest.raises(JobTimeout):
+        pool.run('worker_jobs:count_steps', 100, cancel_token=CancelToken(timeout=0.5))
+    assert time.monotonic() - started < 4
+    assert pool.run('worker_jobs:add', 1, 1) == 2
+
+
+def test_peak_memory_includes_child_processes(make_pool):
+    pool = make_pool()
+    stats = {}
+    assert pool.run('worker_jobs:allocate_in_child', 256, job_stats=stats) == 0
+    assert stats['peak_rss_bytes'] >= 256 * 1024 * 1024
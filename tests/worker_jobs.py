@@ -0,0 +1,63 @@
+"""工作进程池测试中在工作进程内执行的任务（按 '模块:函数' 传给 WorkerPool.run）"""
+
+import os
+import time
+from logger import get_logger
+
+logger = get_logger("worker_jobs")
+
+
+def pid():
+    return os.getpid()
+
+
+def add(a, b):
+    return a + b
+
+
+def fail():
+    raise ValueError("bad input")
+
+
+def exit_abruptly():
+    os._exit(3)
+
+
+def spin():
+    """只消耗 CPU，直到被 CPU 时间限制终止"""
+    while True:
+        pass
+
+
+def allocate(mb, seconds=10, chatty=False):
+    """占用 mb MB 常驻内存并保持 seconds 秒；chatty 时持续回传日志（管道中始终有消息）"""
+    blocks = []
+    for _ in range(mb // 8):
+        blocks.append(b'\x01' * (8 * 1024 * 1024))
+        if chatty:
+            logger.info("占用内存中")
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        if chatty:
+            logger.info("占用内存中")
+        time.sleep(0.01)
+    return sum(len(block) for block in blocks)
+
+
+def count_steps(steps, progress=None, cancel_token=None):
+    for step in range(steps):
+        if cancel_token is not None:
+            cancel_token.check()
+        if progress is not None:
+            progress("计数", step / steps)
+        time.sleep(0.05)
+    return steps
+
+
+def allocate_in_child(mb):
+    """在子进程中占用内存（类似并行渲染进程），返回子进程退出码"""
+    import multiprocessing
+    child = multiprocessing.get_context('spawn').Process(target=allocate, args=(mb, 1))
+    child.start()
+    child.join()
+    return child.exitcode
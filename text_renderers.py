@@ -0,0 +1,63 @@
+"""
+    文本格式渲染器
+    功能: 将转换的文档计划（见 excel_to_word_converter.plan_module_groups）渲染为 Markdown 或 HTML，
+         标题级别、功能过程序号与 Word 文档一致，便于粘贴到 Wiki / 评审工具或在浏览器中预览。
+    注意: 本模块只做字符串拼接，不依赖 pandas / python-docx。
+"""
+
+import html
+import re
+
+# 文档计划中的内容块类型
+HEADING = 'heading'      # (HEADING, 级别, 文本)
+PARAGRAPH = 'paragraph'  # (PARAGRAPH, 文本)
+
+_MARKDOWN_SPECIAL_RE = re.compile(r'([\\`*_\[\]<>#|])')
+
+HTML_STYLE = """
+body { font-family: '宋体', SimSun, serif; font-size: 10.5pt; color: #000; line-height: 1.6; margin: 24px; }
+h3 { font-size: 16pt; } h4 { font-size: 14pt; } h5 { font-size: 12pt; } h6 { font-size: 10.5pt; }
+h3, h4, h5, h6 { font-weight: bold; margin: 12px 0 6px; }
+p { margin: 4px 0; }
+"""
+
+
+def _markdown_escape(text):
+    return _MARKDOWN_SPECIAL_RE.sub(r'\\\1', text)
+
+
+def render_markdown(blocks):
+    """文档计划 -> Markdown（标题级别与 Word 中的“标题 N”相同）"""
+    parts = []
+    for block in blocks:
+        if block[0] == HEADING:
+            parts.append(f"{'#' * block[1]} {_markdown_escape(block[2])}")
+        else:
+            parts.append(_markdown_escape(block[1]))
+    return '\n\n'.join(parts) + '\n'
+
+
+def render_html_body(blocks):
+    """文档计划 -> HTML 正文片段"""
+    parts = []
+    for block in blocks:
+        if block[0] == HEADING:
+            parts.append(f"<h{block[1]}>{html.escape(block[2])}</h{block[1]}>")
+        else:
+            parts.append(f"<p>{html.escape(block[1])}</p>")
+    return '\n'.join(parts)
+
+
+def render_html(blocks, title=''):
+    """文档计划 -> 完整 HTML 页面（内联样式，可直接在浏览器中打开）"""
+    return (
+        '<!DOCTYPE html>\n<html lang="zh-CN">\n<head>\n<meta charset="utf-8">\n'
+        f'<title>{html.escape(title)}</title>\n<style>{HTML_STYLE}</style>\n</head>\n<body>\n'
+        f'{render_html_body(blocks)}\n</body>\n</html>\n'
+    )
+
+
+RENDERERS = {
+    'markdown': render_markdown,
+    'html': render_html,
+}
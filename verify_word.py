@@ -3,19 +3,64 @@
 """
 
 import pandas as pd
+from dataclasses import dataclass, field
 from docx import Document
 from pathlib import Path
+from logger import get_logger, log_stage
+from progress import report
+from cancellation import check_cancelled
+from file_store import open_source
+
+logger = get_logger("verify_word")
+
+PROGRESS_EVERY_ROWS = 200  # 逐行/逐段落的循环每处理多少项上报一次进度（按模块分组的循环每组上报）
+
+# 统计明细列（同时也是导出 Excel 的列顺序）
+STAT_COLUMNS = ['一级模块名称', '二级模块名称', '三级模块名称', '功能过程名称', '子过程数量', 'CFP总和', '子过程详情']
+
+
+@dataclass(frozen=True)
+class VerifySummary:
+    """校对统计摘要
+    汇总数值在校对时一次性计算；明细按列存储（列名 -> 元组），避免每次重跑重建 DataFrame
+    """
+    total_l1: int = 0
+    total_l2: int = 0
+    total_l3: int = 0
+    total_processes: int = 0
+    total_subprocesses: int = 0
+    columns: dict = field(default_factory=dict)
+
+    def __bool__(self):
+        return self.total_processes > 0
+
+    @classmethod
+    def from_stats(cls, stats):
+        """由 build_detailed_stats 返回的行列表构建摘要"""
+        columns = {col: tuple(row.get(col, '') for row in stats) for col in STAT_COLUMNS}
+        return cls(
+            total_l1=len(set(columns['一级模块名称'])),
+            total_l2=len(set(columns['二级模块名称'])),
+            total_l3=len(set(columns['三级模块名称'])),
+            total_processes=len(stats),
+            total_subprocesses=int(sum(columns['子过程数量'])),
+            columns=columns,
+        )
+
+    def to_frame(self):
+        """按需还原为 DataFrame（仅导出时使用）"""
+        return pd.DataFrame({col: list(values) for col, values in self.columns.items()})
 
 
 def read_excel_robust(excel_path):
     """
     自动查找正确的Sheet和表头
-    (与 converter 保持一致的逻辑)
+    (与 converter 保持一致的逻辑；excel_path 同样可以是内存中的 bytes / memoryview)
     """
     try:
-        xl = pd.ExcelFile(excel_path)
+        xl = pd.ExcelFile(open_source(excel_path))
     except Exception as e:
-        print(f"无法打开Excel文件: {e}")
+        logger.error(f"无法打开Excel文件: {e}")
         return None
 
     # 1. 查找包含数据的Sheet
@@ -29,7 +74,7 @@ def read_excel_robust(excel_path):
         target_sheet = xl.sheet_names[0]
 
     # 2. 查找表头行（优先找包含CFP等实际列名的行）
-    df_preview = pd.read_excel(excel_path, sheet_name=target_sheet, header=None, nrows=10)
+    df_preview = xl.parse(target_sheet, header=None, nrows=10)
     
     header_row_idx = -1
     # 优先查找包含CFP、功能过程等实际列名的行
@@ -51,13 +96,27 @@ def read_excel_robust(excel_path):
         header_row_idx = 0
 
     # 3. 读取完整数据
-    df = pd.read_excel(excel_path, sheet_name=target_sheet, header=header_row_idx)
+    df = xl.parse(target_sheet, header=header_row_idx)
     return df
 
 
-def extract_excel_processes(excel_path):
-    """从 Excel 提取功能过程列表，并构建 三级模块 -> 功能过程 映射"""
-    df = read_excel_robust(excel_path)
+def stage_progress(progress, cancel_token, stage, start, end):
+    """阶段内进度回调 step(已处理数, 总数)：按阶段内完成比例映射到整个校对任务的 [start, end] 区间上报，并检查取消"""
+    def step(done, total):
+        check_cancelled(cancel_token)
+        report(progress, stage, start + (end - start) * done / max(total, 1))
+    return step
+
+
+def _load_frame(excel_path, df):
+    """使用已读取的数据（复制一份，各步骤会修改数据），未提供时读取 Excel"""
+    return read_excel_robust(excel_path) if df is None else df.copy()
+
+
+def extract_excel_processes(excel_path, df=None, step=None):
+    """从 Excel 提取功能过程列表，并构建 三级模块 -> 功能过程 映射
+    step: 可选的进度回调 step(已处理行数, 总行数)"""
+    df = _load_frame(excel_path, df)
     if df is None:
         return [], [], {}
 
@@ -93,7 +152,7 @@ def extract_excel_processes(excel_path):
         col_map['Description'] = df.columns[7]
 
     if 'Process' not in col_map:
-        print("无法在Excel中找到'功能过程'列")
+        logger.warning("无法在Excel中找到'功能过程'列")
         return [], [], {}
 
     processes = []
@@ -126,7 +185,10 @@ def extract_excel_processes(excel_path):
         df = df.loc[grouped_indices]
 
     last_added_process = None
-    for _, row in df.iterrows():
+    total_rows = len(df)
+    for row_no, (_, row) in enumerate(df.iterrows()):
+        if step is not None and row_no % PROGRESS_EVERY_ROWS == 0:
+            step(row_no, total_rows)
         process_name = row[process_col]
         subprocess_desc = row[desc_col] if desc_col else ""
         level3_value = row[l3_col] if l3_col else "未定义三级模块"
@@ -157,11 +219,12 @@ def extract_excel_processes(excel_path):
     return processes, subprocess_data, level3_map
 
 
-def check_duplicate_processes(excel_path):
+def check_duplicate_processes(excel_path, df=None, step=None):
     """检查 Excel 中是否存在重复的功能过程
+    step: 可选的进度回调 step(已检查模块组数, 模块组总数)
     返回: (是否通过, 错误信息列表)
     """
-    df = read_excel_robust(excel_path)
+    df = _load_frame(excel_path, df)
     if df is None:
         return True, []
     
@@ -219,7 +282,10 @@ def check_duplicate_processes(excel_path):
     
     # 按三级模块分组检查
     if customer_req_col and l1_col and l2_col and l3_col:
-        for group_key, group_df in df.groupby([customer_req_col, l1_col, l2_col, l3_col], sort=False):
+        module_groups = df.groupby([customer_req_col, l1_col, l2_col, l3_col], sort=False)
+        for group_no, (group_key, group_df) in enumerate(module_groups):
+            if step is not None:
+                step(group_no, module_groups.ngroups)
             # 检查是否有真正的重复：功能过程在不同位置段落再次出现
             # 统计每个功能过程的"起始行"（通过检测前一行是否是不同功能过程）
             prev_process = None
@@ -260,8 +326,9 @@ def check_duplicate_processes(excel_path):
     return True, []
 
 
-def extract_word_content(word_path):
+def extract_word_content(word_path, step=None):
     """从 Word 提取结构化内容。
+    step: 可选的进度回调 step(已处理段落数, 段落总数)
     需求：Heading 5 作为三级模块，输出时严格保持文档出现顺序，
     同名模块不合并（每次出现视为一个独立模块实例）。
     功能过程格式：段落前缀 编号.名称。
@@ -269,7 +336,7 @@ def extract_word_content(word_path):
         processes_list: 所有功能过程对象列表
         level3_modules_list: 按出现顺序的模块实例列表，每项 {'module': 原始标题文本, 'processes': [功能过程名,...]}
     """
-    doc = Document(word_path)
+    doc = Document(open_source(word_path))
 
     summary_line = ""
     processes = []
@@ -282,7 +349,10 @@ def extract_word_content(word_path):
     level3_modules = []
     current_level3_process_bucket = None  # 指向 level3_modules 当前模块的 processes 列表
 
-    for para in doc.paragraphs:
+    paragraphs = doc.paragraphs
+    for para_no, para in enumerate(paragraphs):
+        if step is not None and para_no % PROGRESS_EVERY_ROWS == 0:
+            step(para_no, len(paragraphs))
         text = para.text.strip()
         if not text:
             continue
@@ -365,12 +435,13 @@ def extract_word_content(word_path):
     return summary_line, processes, level3_modules
 
 
-def build_detailed_stats(excel_path, word_path):
+def build_detailed_stats(excel_path, word_path, df=None, step=None):
     """构建详细的模块统计数据
+    step: 可选的进度回调 step(已统计模块组数, 模块组总数)
     返回格式：包含一级、二级、三级模块名称和数量，以及功能过程名称、数量和子过程数量
     """
     # 从 Excel 读取数据
-    df = read_excel_robust(excel_path)
+    df = _load_frame(excel_path, df)
     if df is None:
         return []
     
@@ -416,7 +487,7 @@ def build_detailed_stats(excel_path, word_path):
                 non_null_count = numeric_values.notna().sum()
                 if non_null_count > len(df) * 0.3:  # 30%以上的行有数值
                     col_map['CFP'] = test_col
-                    print(f"[CFP兜底] 通过列索引12识别: '{test_col}'")
+                    logger.info(f"[CFP兜底] 通过列索引12识别: '{test_col}'")
             except Exception:
                 pass
         
@@ -432,7 +503,7 @@ def build_detailed_stats(excel_path, word_path):
                         valid_range = numeric_values[(numeric_values >= 0) & (numeric_values <= 100)].count()
                         if valid_range > non_null_count * 0.5:  # 50%以上在合理范围内
                             col_map['CFP'] = test_col
-                            print(f"[CFP兜底] 通过智能探测识别列{idx}: '{test_col}'")
+                            logger.info(f"[CFP兜底] 通过智能探测识别列{idx}: '{test_col}'")
                             break
                 except Exception:
                     continue
@@ -464,7 +535,10 @@ def build_detailed_stats(excel_path, word_path):
     
     # 按一级、二级、三级、功能过程分组
     if l1_col and l2_col and l3_col:
-        for (l1, l2, l3), group in df.groupby([l1_col, l2_col, l3_col], sort=False):
+        module_groups = df.groupby([l1_col, l2_col, l3_col], sort=False)
+        for group_no, ((l1, l2, l3), group) in enumerate(module_groups):
+            if step is not None:
+                step(group_no, module_groups.ngroups)
             if pd.isna(l1) or pd.isna(l2) or pd.isna(l3):
                 continue
             
@@ -505,58 +579,75 @@ def build_detailed_stats(excel_path, word_path):
     return stats
 
 
-def verify_consistency(excel_path, word_path):
-    """验证 Excel 和 Word 的一致性，并返回详细统计数据
+def verify_consistency(excel_path, word_path, progress=None, cancel_token=None):
+    """验证 Excel 和 Word 的一致性
+    excel_path / word_path 可以是文件路径，也可以是内存中的内容（bytes，或转换返回的 OutputBuffer）
+    progress: 进度回调 progress(阶段, 完成比例)，按各阶段已处理的行/段落/模块组数上报
+    cancel_token: 取消令牌，在各阶段的循环中与进度一起检查；被取消/超时时抛出 JobCancelled
+    返回: (是否通过, VerifySummary 统计摘要)
     """
     
-    print("=" * 80)
-    print("Word 文档内容验证")
-    print("=" * 80)
-    print()
+    logger.info("=" * 80)
+    logger.info("Word 文档内容验证")
+    logger.info("=" * 80)
     
     # 步骤1：检查 Excel 中是否有重复的功能过程
-    print("=" * 80)
-    print("检查 Excel 中的重复功能过程")
-    print("=" * 80)
-    duplicate_check_passed, duplicate_errors = check_duplicate_processes(excel_path)
+    logger.info("=" * 80)
+    logger.info("检查 Excel 中的重复功能过程")
+    logger.info("=" * 80)
+    report(progress, "读取 Excel", 0.0)
+    check_cancelled(cancel_token)
+    # Excel 只解析一次，重复检查、内容对比与模块统计共用
+    with log_stage(logger, "read_excel"):
+        df = read_excel_robust(excel_path)
+    check_cancelled(cancel_token)
+    with log_stage(logger, "check_duplicates"):
+        duplicate_check_passed, duplicate_errors = check_duplicate_processes(
+            excel_path, df, stage_progress(progress, cancel_token, "检查重复功能过程", 0.1, 0.25))
     
     if duplicate_check_passed:
-        print("✓ 未发现重复的功能过程")
+        logger.info("✓ 未发现重复的功能过程")
     else:
-        print(f"✗ 发现 {len(duplicate_errors)} 个重复功能过程:")
+        logger.info(f"✗ 发现 {len(duplicate_errors)} 个重复功能过程:")
         for error in duplicate_errors:
-            print(f"  - {error}")
-    print()
+            logger.info(f"  - {error}")
     
     # 步骤2：提取并对比 Excel 和 Word 数据
-    print("=" * 80)
-    print("对比 Excel 与 Word 内容")
-    print("=" * 80)
+    logger.info("=" * 80)
+    logger.info("对比 Excel 与 Word 内容")
+    logger.info("=" * 80)
     
     # 提取 Excel 数据
-    excel_processes, excel_details, _ = extract_excel_processes(excel_path)
-    _, word_processes, word_level3_modules = extract_word_content(word_path)
+    with log_stage(logger, "extract_excel"):
+        excel_processes, excel_details, _ = extract_excel_processes(
+            excel_path, df, stage_progress(progress, cancel_token, "提取 Excel 内容", 0.25, 0.45))
+    with log_stage(logger, "extract_word"):
+        _, word_processes, word_level3_modules = extract_word_content(
+            word_path, stage_progress(progress, cancel_token, "提取 Word 内容", 0.45, 0.7))
     
     # 验证功能过程数量
-    print(f"✓ Excel 功能过程数: {len(excel_processes)}")
-    print(f"✓ Word 功能过程数: {len(word_processes)}")
+    logger.info(f"✓ Excel 功能过程数: {len(excel_processes)}")
+    logger.info(f"✓ Word 功能过程数: {len(word_processes)}")
     
     if len(excel_processes) == len(word_processes):
-        print(f"✓ 功能过程数量一致")
+        logger.info(f"✓ 功能过程数量一致")
     else:
-        print(f"✗ 功能过程数量不一致!")
+        logger.info(f"✗ 功能过程数量不一致!")
         # return False # 继续对比以显示差异
     
-    print()
-    print("=" * 80)
-    print("功能过程对比")
-    print("=" * 80)
+    logger.info("=" * 80)
+    logger.info("功能过程对比")
+    logger.info("=" * 80)
     
     all_match = True
     # 使用 zip_longest 防止长度不一致时漏掉
     from itertools import zip_longest
     
+    compare_step = stage_progress(progress, cancel_token, "对比功能过程", 0.7, 0.75)
+    total_compared = max(len(excel_processes), len(word_processes))
     for i, (excel_p, word_p) in enumerate(zip_longest(excel_processes, word_processes), 1):
+        if i % PROGRESS_EVERY_ROWS == 0:
+            compare_step(i, total_compared)
         word_p_name = word_p['name'] if word_p else "MISSING"
         excel_p_name = excel_p if excel_p else "MISSING"
         
@@ -564,32 +655,34 @@ def verify_consistency(excel_path, word_path):
         symbol = "✓" if match else "✗"
         
         if not match:
-            print(f"{symbol} {i}. 不匹配!")
-            print(f"   Excel: {excel_p_name}")
-            print(f"   Word:  {word_p_name}")
+            logger.info(f"{symbol} {i}. 不匹配!")
+            logger.info(f"   Excel: {excel_p_name}")
+            logger.info(f"   Word:  {word_p_name}")
             all_match = False
         else:
             if i <= 5 or (len(excel_processes) > 10 and i > len(excel_processes) - 5):
-                print(f"{symbol} {i}. {excel_p_name}")
+                logger.info(f"{symbol} {i}. {excel_p_name}")
             elif i == 6:
-                print(f"   ... (中间 {len(excel_processes) - 10} 个过程)")
+                logger.info(f"   ... (中间 {len(excel_processes) - 10} 个过程)")
     
-    # 生成详细模块统计数据
-    detailed_stats = build_detailed_stats(excel_path, word_path)
+    # 生成详细模块统计数据（汇总数值预先计算）
+    with log_stage(logger, "build_stats"):
+        summary = VerifySummary.from_stats(build_detailed_stats(
+            excel_path, word_path, df, stage_progress(progress, cancel_token, "生成模块统计", 0.75, 1.0)))
     
-    print()
-    print("=" * 80)
+    logger.info("=" * 80)
     if all_match and duplicate_check_passed:
-        print("✓ 验证通过！Word 文档与 Excel 源文件完全一致，且无重复功能过程")
+        logger.info("✓ 验证通过！Word 文档与 Excel 源文件完全一致，且无重复功能过程")
     elif all_match and not duplicate_check_passed:
-        print("⚠ 内容一致但存在重复功能过程，请检查 Excel 源文件")
+        logger.info("⚠ 内容一致但存在重复功能过程，请检查 Excel 源文件")
     else:
-        print("✗ 验证失败！存在内容不一致")
-    print("=" * 80)
+        logger.info("✗ 验证失败！存在内容不一致")
+    logger.info("=" * 80)
     
-    return all_match and duplicate_check_passed, detailed_stats
+    report(progress, "校对完成", 1.0)
+    return all_match and duplicate_check_passed, summary
 
 
 if __name__ == "__main__":
-    print("此脚本仅供 Web 服务内部调用，不支持直接命令行运行")
-    print("请通过 Streamlit 应用界面使用校对功能")
+    logger.info("此脚本仅供 Web 服务内部调用，不支持直接命令行运行")
+    logger.info("请通过 Streamlit 应用界面使用校对功能")
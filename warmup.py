@@ -0,0 +1,89 @@
+"""
+    启动预热
+    功能: 服务（或工作进程）启动后用内置的小样例完整执行一次 转换 + 校对，
+         提前完成 pandas/python-docx/openpyxl 等重量级模块的导入与 python-docx 默认模板的加载，
+         避免服务重启后的第一个真实用户承担数秒的冷启动耗时。
+    配置: 环境变量 WARMUP=0 关闭预热；IMPORT_TIME_BUDGET_MS 为界面脚本导入耗时预算，超出时记录警告。
+"""
+
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+from logger import get_logger
+
+logger = get_logger("warmup")
+
+WARMUP_ENABLED = os.getenv('WARMUP', '1') != '0'
+IMPORT_TIME_BUDGET_MS = int(os.getenv('IMPORT_TIME_BUDGET_MS', '300'))
+
+# 内置样例：表头与 COSMIC 功能点拆分表一致，覆盖合并单元格（空值向下填充）与多子过程拆分
+SAMPLE_SHEET_NAME = '功能点拆分表'
+SAMPLE_HEADER = ['客户需求', '一级模块', '二级模块', '三级模块', '功能用户', '触发事件',
+                 '功能过程', '子过程描述', '数据移动类型', '数据组', '数据属性', '复用度', 'CFP']
+SAMPLE_ROWS = [
+    ['预热需求', '预热一级', '预热二级', '预热三级', '用户', '触发', '预热功能过程', '输入-预热数据；', 'E', 'dg', 'attr', '新增', 1],
+    [None, None, None, None, '用户', '触发', None, '查询-预热数据；', 'R', 'dg', 'attr', '新增', 1],
+    [None, None, None, None, '用户', '触发', None, '输出-预热结果；', 'X', 'dg', 'attr', '新增', 1],
+]
+
+
+def check_import_budget(name, elapsed_seconds):
+    """记录导入耗时，超出 IMPORT_TIME_BUDGET_MS 时告警"""
+    elapsed_ms = elapsed_seconds * 1000
+    if IMPORT_TIME_BUDGET_MS > 0 and elapsed_ms > IMPORT_TIME_BUDGET_MS:
+        logger.warning(f"[启动] {name} 导入耗时 {elapsed_ms:.0f} ms，超出预算 {IMPORT_TIME_BUDGET_MS} ms")
+    else:
+        logger.debug(f"[启动] {name} 导入耗时 {elapsed_ms:.0f} ms")
+
+
+def build_sample_workbook(excel_path):
+    """生成内置样例工作簿"""
+    from openpyxl import Workbook
+
+    wb = Workbook()
+    ws = wb.active
+    ws.title = SAMPLE_SHEET_NAME
+    ws.append(SAMPLE_HEADER)
+    for row in SAMPLE_ROWS:
+        ws.append(row)
+    wb.save(excel_path)
+
+
+def warm_up(quiet=True):
+    """用内置样例执行一次转换与校对；预热失败只记录警告，不影响服务启动
+
+    :param quiet: 预热期间只记录转换/校对模块的警告及以上日志（仅在没有其他任务并发运行时使用）
+    :return: 是否预热成功
+    """
+    if not WARMUP_ENABLED:
+        return False
+    start = time.monotonic()
+    quieted = []
+    if quiet:
+        for name in ('excel_to_word_converter', 'verify_word'):
+            module_logger = get_logger(name)
+            quieted.append((module_logger, module_logger.level))
+            module_logger.setLevel(logging.WARNING)
+    try:
+        from excel_to_word_converter import excel_to_word
+        from verify_word import verify_consistency
+
+        with tempfile.TemporaryDirectory(prefix='converter_warmup_') as tmp_dir:
+            excel_path = Path(tmp_dir) / 'warmup.xlsx'
+            word_path = Path(tmp_dir) / 'warmup.docx'
+            build_sample_workbook(excel_path)
+            excel_to_word(excel_path, word_path, perform_verify=False, open_output=False,
+                          render_processes=0, streaming=False)
+            passed, _ = verify_consistency(excel_path, word_path)
+        if not passed:
+            logger.warning("[预热] 内置样例校对未通过，请检查转换/校对逻辑")
+        logger.info(f"[预热] pid={os.getpid()} 完成，耗时 {time.monotonic() - start:.2f}s")
+        return passed
+    except Exception as e:
+        logger.warning(f"[预热] 失败（不影响服务）: {type(e).__name__}: {e}")
+        return False
+    finally:
+        for module_logger, level in quieted:
+            module_logger.setLevel(level)
@@ -0,0 +1,409 @@
+"""
+    转换工作进程池
+    功能: 在预先启动的独立工作进程中运行 excel_to_word / verify_consistency 等任务。
+         - 单个任务受常驻内存(RSS)与 CPU 时间限制，超限时只终止该工作进程，Streamlit 服务不受影响；
+           工作进程自成进程组，RSS 按进程组内全部进程（含并行渲染进程）统计，终止时整组终止；
+         - 工作进程运行 WORKER_MAX_JOBS 个任务后自动回收重建，避免内存碎片累积；
+         - 工作进程内的日志转发回主进程，由主进程写日志文件并归入对应任务的日志；
+         - 任务取消/超时时先通知工作进程在检查点停止，宽限期内未停止则直接终止该进程；
+         - 工作进程启动后先用内置样例预热（见 warmup），首个任务不承担冷启动耗时。
+    配置: 环境变量 WORKER_PROCESSES（0 表示在当前进程内直接运行，便于本地调试）/ WORKER_MAX_JOBS /
+         WORKER_MEMORY_LIMIT_MB / WORKER_CPU_LIMIT_SECONDS。
+    注意: RSS 监控依赖 /proc，CPU 时间限制依赖 resource 模块，均仅在 Linux 上生效。
+"""
+
+import atexit
+import importlib
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+import traceback
+import types
+from contextlib import contextmanager
+from logger import get_logger, forward_logs, handle_forwarded_record
+from job_scheduler import MAX_CONCURRENT_JOBS
+from progress import ProgressThrottle
+from cancellation import CancelToken, JobCancelled, JobTimeout
+from warmup import warm_up
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = get_logger("worker_pool")
+
+WORKER_PROCESSES = int(os.getenv('WORKER_PROCESSES', str(MAX_CONCURRENT_JOBS)))  # 预启动的工作进程数
+WORKER_MAX_JOBS = int(os.getenv('WORKER_MAX_JOBS', '20'))                        # 单个工作进程最多运行的任务数
+WORKER_MEMORY_LIMIT_MB = int(os.getenv('WORKER_MEMORY_LIMIT_MB', '2048'))        # 单任务常驻内存上限
+WORKER_CPU_LIMIT_SECONDS = int(os.getenv('WORKER_CPU_LIMIT_SECONDS', '600'))     # 单任务 CPU 时间上限
+
+POLL_INTERVAL = 0.2  # 等待结果时检查工作进程状态的间隔（秒）
+PROGRESS_INTERVAL = 0.2  # 工作进程回传进度的最小间隔（秒）
+CANCEL_GRACE_SECONDS = 2  # 取消后等待工作进程在检查点停止的时间，超时则终止进程
+
+# 工作进程启动时预先导入的模块（避免首个任务承担导入耗时）
+PRELOAD_MODULES = ('excel_to_word_converter', 'verify_word')
+
+
+class WorkerError(Exception):
+    """任务在工作进程内执行失败"""
+
+
+class WorkerCrashed(WorkerError):
+    """工作进程在任务执行期间被终止（超出资源限制或崩溃）"""
+
+
+_spawn_lock = threading.Lock()
+
+
+@contextmanager
+def _plain_main_module():
+    """spawn 子进程启动时会重新执行父进程的 __main__ 模块；在 Streamlit 中 __main__ 即 app.py（连带导入 streamlit），
+    启动工作进程期间临时替换为空模块，工作进程只导入实际需要的模块"""
+    with _spawn_lock:
+        main_module = sys.modules.get('__main__')
+        sys.modules['__main__'] = types.ModuleType('__main__')
+        try:
+            yield
+        finally:
+            sys.modules['__main__'] = main_module
+
+
+def _resolve(func_path):
+    """'模块:函数' -> 函数对象"""
+    module_name, func_name = func_path.split(':')
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+def _set_cpu_budget(seconds):
+    """将 CPU 时间软限制设置为 已用时间 + seconds（超限时内核发送 SIGXCPU 终止进程）"""
+    if resource is None or seconds <= 0:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    used = int(usage.ru_utime + usage.ru_stime) + 1
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = used + seconds
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _worker_main(conn, cancel_event, cpu_limit_seconds):
+    """工作进程主循环：接收任务、执行并回传日志与结果；主进程断开后退出"""
+    if hasattr(os, 'setpgrp'):
+        os.setpgrp()  # 自成进程组：终止工作进程时连同其创建的渲染进程一起终止
+    forward_logs(lambda record: conn.send(('log', record)))
+    start = time.monotonic()
+    for module_name in PRELOAD_MODULES:
+        importlib.import_module(module_name)
+    logger.debug(f"[工作进程] pid={os.getpid()} 预加载模块耗时 {time.monotonic() - start:.2f}s")
+    # 预热：完整执行一次内置样例，首个真实任务无需承担模板加载等冷启动耗时
+    warm_up()
+
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            break
+        if message[0] == 'stop':
+            break
+        _, func_path, args, kwargs, options = message
+        if options['progress']:
+            kwargs['progress'] = ProgressThrottle(
+                lambda stage, fraction: conn.send(('progress', stage, fraction)), PROGRESS_INTERVAL)
+        if options['cancellable']:
+            kwargs['cancel_token'] = CancelToken(timeout=options['timeout'], event=cancel_event)
+        _set_cpu_budget(cpu_limit_seconds)
+        peak_tracked = _reset_peak_rss()
+        try:
+            result = _resolve(func_path)(*args, **kwargs)
+            outcome = ('result', result)
+        except JobCancelled as e:
+            outcome = ('cancelled', str(e), isinstance(e, JobTimeout))
+        except Exception as e:
+            outcome = ('error', f"{type(e).__name__}: {e}", traceback.format_exc())
+        # 任务统计先于结果发送（任务历史记录峰值内存）
+        conn.send(('stats', {'peak_rss_bytes': _read_peak_rss() if peak_tracked else None}))
+        conn.send(outcome)
+
+
+def _reset_peak_rss():
+    """重置本进程的峰值常驻内存统计（Linux 4.0+ /proc/self/clear_refs），成功返回 True"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _read_peak_rss():
+    """本进程的峰值常驻内存（/proc/self/status 中的 VmHWM），不可用时返回 None"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def _read_rss_bytes(pid):
+    """读取进程常驻内存（Linux /proc），不可用时返回 None"""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def _read_tree_rss_bytes(pid):
+    """进程及其全部子孙进程的常驻内存之和（Linux /proc/<pid>/task/*/children），不可用时返回 None"""
+    total = _read_rss_bytes(pid)
+    if total is None:
+        return None
+    pending = [pid]
+    while pending:
+        parent = pending.pop()
+        try:
+            tasks = os.listdir(f"/proc/{parent}/task")
+        except OSError:
+            continue
+        for task in tasks:
+            try:
+                with open(f"/proc/{parent}/task/{task}/children") as f:
+                    children = [int(child) for child in f.read().split()]
+            except (OSError, ValueError):
+                continue
+            for child in children:
+                total += _read_rss_bytes(child) or 0
+                pending.append(child)
+    return total
+
+
+class _Worker:
+    """单个工作进程及其通信管道"""
+
+    def __init__(self, ctx, cpu_limit_seconds):
+        self.conn, child_conn = ctx.Pipe()
+        self.cancel_event = ctx.Event()
+        # 非守护进程：允许工作进程内部再使用进程池并行渲染
+        self.process = ctx.Process(target=_worker_main, args=(child_conn, self.cancel_event, cpu_limit_seconds),
+                                   name="converter-worker", daemon=False)
+        with _plain_main_module():
+            self.process.start()
+        child_conn.close()
+        self.jobs_done = 0
+        self.busy = False  # 是否有尚未返回的任务
+
+    def stop(self):
+        try:
+            self.conn.send(('stop',))
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout=2)
+        if self.process.is_alive():
+            self.kill()
+        self.conn.close()
+
+    def kill(self):
+        """终止工作进程及其进程组（并行渲染进程）"""
+        if hasattr(os, 'killpg') and self.process.pid is not None:
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                pass
+        self.process.kill()
+        self.process.join(timeout=5)
+
+
+class WorkerPool:
+    """预启动的工作进程池；size 为 0 时在调用方进程内直接执行"""
+
+    def __init__(self, size=WORKER_PROCESSES, max_jobs_per_worker=WORKER_MAX_JOBS,
+                 memory_limit_mb=WORKER_MEMORY_LIMIT_MB, cpu_limit_seconds=WORKER_CPU_LIMIT_SECONDS):
+        self.size = max(0, size)
+        self.max_jobs_per_worker = max(1, max_jobs_per_worker)
+        self.memory_limit = memory_limit_mb * 1024 * 1024
+        self.cpu_limit_seconds = cpu_limit_seconds
+        self._ctx = multiprocessing.get_context('spawn')
+        self._cond = threading.Condition()
+        self._idle = []
+        self._total = 0
+        self._closed = False
+        with self._cond:
+            for _ in range(self.size):
+                self._idle.append(self._spawn())
+        if self.size == 0:
+            # 任务在当前进程内执行：在后台线程中预热，不阻塞页面
+            threading.Thread(target=warm_up, kwargs={'quiet': False}, name="converter-warmup", daemon=True).start()
+        atexit.register(self.shutdown)
+
+    def _spawn(self):
+        self._total += 1
+        return _Worker(self._ctx, self.cpu_limit_seconds)
+
+    def _acquire(self):
+        with self._cond:
+            while not self._idle and self._total >= self.size:
+                self._cond.wait()
+            if self._idle:
+                return self._idle.pop()
+            return self._spawn()
+
+    def _release(self, worker, healthy):
+        worker.jobs_done += 1
+        recycle = not healthy or worker.jobs_done >= self.max_jobs_per_worker
+        if recycle:
+            if healthy:
+                worker.stop()
+            else:
+                worker.conn.close()
+            with self._cond:
+                self._total -= 1
+                # 立即补充新的工作进程，保持池中始终有预热好的进程
+                if not self._closed:
+                    self._idle.append(self._spawn())
+                self._cond.notify()
+        else:
+            with self._cond:
+                self._idle.append(worker)
+                self._cond.notify()
+
+    def run(self, func_path, *args, on_progress=None, cancel_token=None, job_stats=None, **kwargs):
+        """在工作进程中执行 '模块:函数'，阻塞直到返回结果
+        on_progress: 进度回调 on_progress(阶段, 完成比例)，在调用方线程中执行（函数需支持 progress 参数）
+        cancel_token: 取消令牌（函数需支持 cancel_token 参数）；工作进程使用同样的时限，
+                      取消时通过进程间事件通知工作进程在检查点停止
+        job_stats: 可选字典，任务结束后写入 peak_rss_bytes：工作进程自身的峰值内存与任务期间采样到的
+                   进程组（含并行渲染进程）内存之和两者中的较大值，不可用时为 None
+
+        Raises:
+            WorkerError: 任务内部抛出异常
+            WorkerCrashed: 工作进程因超出内存/CPU 限制或崩溃而终止
+            JobCancelled / JobTimeout: 任务被取消或超时
+        """
+        if self.size == 0:
+            if job_stats is not None:
+                job_stats.update(peak_rss_bytes=None)  # 与界面共用进程，无法单独统计内存
+            if on_progress is not None:
+                kwargs['progress'] = ProgressThrottle(on_progress, PROGRESS_INTERVAL)
+            if cancel_token is not None:
+                kwargs['cancel_token'] = cancel_token
+            return _resolve(func_path)(*args, **kwargs)
+
+        worker = self._acquire()
+        healthy = False
+        try:
+            worker.cancel_event.clear()
+            options = {
+                'progress': on_progress is not None,
+                'cancellable': cancel_token is not None,
+                'timeout': cancel_token.timeout if cancel_token is not None else None,
+            }
+            worker.busy = True
+            worker.conn.send(('run', func_path, args, kwargs, options))
+            result = self._wait_result(worker, on_progress, cancel_token, job_stats)
+            healthy = True
+            return result
+        except WorkerCrashed:
+            raise
+        except WorkerError:
+            healthy = True  # 任务异常但进程仍可复用
+            raise
+        except BaseException:
+            # 取消、超时或调用方被中断（如页面重跑）：尽快释放工作进程
+            healthy = self._abort(worker)
+            raise
+        finally:
+            if not healthy and worker.process.is_alive():
+                worker.kill()
+            self._release(worker, healthy)
+
+    def _wait_result(self, worker, on_progress=None, cancel_token=None, job_stats=None):
+        pid = worker.process.pid
+        tree_peak = None  # 采样到的进程组内存峰值（工作进程 + 并行渲染进程）
+        while True:
+            if cancel_token is not None:
+                cancel_token.check()
+            try:
+                if worker.conn.poll(POLL_INTERVAL):
+                    message = worker.conn.recv()
+                    kind = message[0]
+                    if kind == 'log':
+                        handle_forwarded_record(message[1])
+                    elif kind == 'progress':
+                        if on_progress is not None:
+                            on_progress(message[1], message[2])
+                    elif kind == 'stats':
+                        if job_stats is not None:
+                            # 工作进程的 VmHWM 不含子进程，与采样到的进程组内存取较大值
+                            peaks = [peak for peak in (message[1]['peak_rss_bytes'], tree_peak) if peak is not None]
+                            job_stats['peak_rss_bytes'] = max(peaks) if peaks else None
+                    elif kind == 'result':
+                        worker.busy = False
+                        return message[1]
+                    elif kind == 'error':
+                        worker.busy = False
+                        logger.debug(message[2])
+                        raise WorkerError(message[1])
+                    elif kind == 'cancelled':
+                        worker.busy = False
+                        raise (JobTimeout if message[2] else JobCancelled)(message[1])
+            except (EOFError, OSError):
+                pass  # 管道断开：进程已退出，下面统一判断原因
+
+            # 每处理一条消息都检查一次：频繁回传进度/日志的任务同样受存活与内存限制约束
+            if not worker.process.is_alive():
+                worker.process.join(timeout=1)
+                raise WorkerCrashed(self._describe_exit(worker.process.exitcode))
+
+            rss = _read_tree_rss_bytes(pid)
+            if rss is not None:
+                tree_peak = max(tree_peak or 0, rss)
+            if rss is not None and self.memory_limit > 0 and rss > self.memory_limit:
+                worker.kill()
+                logger.error(f"[工作进程] pid={pid} 内存 {rss // (1024 * 1024)} MB 超出限制，已终止")
+                raise WorkerCrashed(f"任务内存占用超出限制（{self.memory_limit // (1024 * 1024)} MB），已终止")
+
+    def _abort(self, worker):
+        """通知工作进程在下一个检查点停止；宽限期内停止则返回 True（进程可复用），否则终止进程"""
+        if not worker.busy:
+            return True
+        if not worker.process.is_alive():
+            return False
+        worker.cancel_event.set()
+        deadline = time.monotonic() + CANCEL_GRACE_SECONDS
+        try:
+            while time.monotonic() < deadline:
+                if worker.conn.poll(0.05):
+                    message = worker.conn.recv()
+                    if message[0] == 'log':
+                        handle_forwarded_record(message[1])
+                    elif message[0] in ('result', 'error', 'cancelled'):
+                        worker.busy = False
+                        return True
+        except (EOFError, OSError):
+            pass
+        worker.kill()
+        return False
+
+    def _describe_exit(self, exitcode):
+        if exitcode == -getattr(signal, 'SIGXCPU', -1):
+            return f"任务 CPU 时间超出限制（{self.cpu_limit_seconds} 秒），已终止"
+        if hasattr(signal, 'SIGKILL') and exitcode == -signal.SIGKILL:
+            return "工作进程被系统终止（可能内存不足）"
+        return f"工作进程异常退出（退出码 {exitcode}）"
+
+    def shutdown(self):
+        """停止所有空闲工作进程（进程退出时自动调用）"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.stop()
@@ -0,0 +1,201 @@
+"""
+    .xlsx 快速扫描
+    功能: 结构预览（outline）与上传预检（preflight）共用的 .xlsx 读取工具：定位数据 Sheet、
+         用正则直接扫描工作表 XML 中的单元格、按需解码共享字符串，不解析整张表、不导入 pandas / openpyxl。
+    兼容: 元素可带命名空间前缀（如 <x:c>），属性顺序不限；正则扫描不出单元格或单元格省略 r 属性时，
+         调用方应改用 parse_head_rows（ElementTree 逐元素解析）或 pandas 确认，不能只凭正则的结果下结论。
+"""
+
+import html
+import posixpath
+import re
+import xml.etree.ElementTree as ET
+from column_mapping import pick_data_sheet
+
+HEADER_SCAN_ROWS = 10  # 在前几行中查找表头（与转换一致）
+
+NS_MAIN = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+NS_REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+NS_PKG_REL = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+_PREFIX = rb'(?:[\w.-]+:)?'  # 可选的命名空间前缀
+ROW_START_RE = re.compile(rb'<' + _PREFIX + rb'row\b')
+ROW_END_RE = re.compile(rb'</' + _PREFIX + rb'row>')
+# 单元格：group(1) 为属性，group(2) 为内容（自闭合时为 None）
+CELL_RE = re.compile(rb'<' + _PREFIX + rb'c\b([^>]*?)(?:/>|>(.*?)</' + _PREFIX + rb'c>)', re.S)
+REF_RE = re.compile(rb'\br="([A-Z]+)(\d+)"')
+TYPE_RE = re.compile(rb'\bt="(\w+)"')
+VALUE_RE = re.compile(rb'<' + _PREFIX + rb'v(?:\s[^>]*)?>(.*?)</' + _PREFIX + rb'v>', re.S)
+TEXT_RE = re.compile(rb'<' + _PREFIX + rb't(?:\s[^>]*)?>(.*?)</' + _PREFIX + rb't>', re.S)
+PHONETIC_RE = re.compile(rb'<' + _PREFIX + rb'rPh\b.*?</' + _PREFIX + rb'rPh>', re.S)
+SHARED_STRING_RE = re.compile(rb'<' + _PREFIX + rb'si\b[^>]*?(?:/>|>(.*?)</' + _PREFIX + rb'si>)', re.S)
+SHARED_STRING_END_RE = re.compile(rb'</' + _PREFIX + rb'si>|<' + _PREFIX + rb'si\b[^>]*/>')
+DIMENSION_RE = re.compile(rb'<' + _PREFIX + rb'dimension\b[^>]*?\bref="[A-Z]*\d+(?::[A-Z]*(\d+))?"')
+
+
+def column_letter(index):
+    """列序号(从0开始) -> 列字母"""
+    letters = ''
+    index += 1
+    while index:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def column_index(letters):
+    """列字母 -> 列序号(从0开始)"""
+    index = 0
+    for ch in letters:
+        index = index * 26 + ord(ch) - 64
+    return index - 1
+
+
+def cell_pattern(letters):
+    """只匹配指定列的单元格：group(1) 列字母，group(2) 行号，group(3) 属性，group(4) 内容"""
+    columns = '|'.join(letters).encode()
+    return re.compile(rb'<' + _PREFIX + rb'c\b(?=[^>]*?\br="(' + columns + rb')(\d+)")([^>]*?)(?:/>|>(.*?)</'
+                      + _PREFIX + rb'c>)', re.S)
+
+
+def decode_text(raw):
+    text = raw.decode('utf-8')
+    return html.unescape(text) if '&' in text else text
+
+
+def rich_text(raw):
+    """<si>/<is> 内容 -> 文本（拼接所有 <t>，忽略注音）"""
+    if b'rPh' in raw:
+        raw = PHONETIC_RE.sub(b'', raw)
+    return decode_text(b''.join(TEXT_RE.findall(raw)))
+
+
+class SharedStrings:
+    """共享字符串表：只切分原始字节，用到时再解码"""
+
+    def __init__(self, data):
+        self._raw = [m.group(1) or b'' for m in SHARED_STRING_RE.finditer(data)] if data else []
+        self._decoded = {}
+
+    def __getitem__(self, index):
+        text = self._decoded.get(index)
+        if text is None:
+            text = self._decoded[index] = rich_text(self._raw[index])
+        return text
+
+
+def typed_value(cell_type, raw, shared_strings):
+    """按单元格类型转换原始文本（与转换一致：空字符串视为空值，整数值的浮点数转为 int）"""
+    if not raw:
+        return None
+    if cell_type == 's':
+        value = shared_strings[int(raw)]
+    elif cell_type in ('inlineStr', 'str', 'e'):
+        value = raw
+    elif cell_type == 'b':
+        return raw == '1'
+    else:
+        number = float(raw)
+        return int(number) if number.is_integer() else number
+    return value if value != '' else None
+
+
+def raw_cell(attrs, body):
+    """正则匹配到的单元格 -> (类型, 原始文本)；没有值时原始文本为 None"""
+    match = TYPE_RE.search(attrs)
+    cell_type = match.group(1).decode() if match else 'n'
+    if not body:
+        return cell_type, None
+    if cell_type == 'inlineStr':
+        return cell_type, rich_text(body)
+    match = VALUE_RE.search(body)
+    return cell_type, decode_text(match.group(1)) if match else None
+
+
+def cell_value(attrs, body, shared_strings):
+    """解析正则匹配到的单元格值"""
+    return typed_value(*raw_cell(attrs, body), shared_strings)
+
+
+def scan_head_cells(data, end):
+    """正则扫描 data[:end] 中的单元格，返回 {行号: {列序号: (类型, 原始文本)}}；
+    有单元格省略 r 属性（无法定位）时返回 None，调用方应改用 parse_head_rows"""
+    rows = {}
+    for m in CELL_RE.finditer(data, 0, end):
+        ref = REF_RE.search(m.group(1))
+        if ref is None:
+            return None
+        rows.setdefault(int(ref.group(2)), {})[column_index(ref.group(1).decode())] = raw_cell(m.group(1), m.group(2))
+    return rows
+
+
+def _local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def _element_text(element):
+    """<is> 等富文本元素的文本（拼接所有 <t>，忽略注音 <rPh>）"""
+    parts = []
+    for child in element:
+        name = _local_name(child.tag)
+        if name == 't':
+            parts.append(child.text or '')
+        elif name != 'rPh':
+            parts.append(_element_text(child))
+    return ''.join(parts)
+
+
+def parse_head_rows(stream, max_rows=HEADER_SCAN_ROWS):
+    """用 ElementTree 逐元素解析工作表开头的 max_rows 行（不依赖命名空间前缀、属性顺序与 r 属性），
+    返回与 scan_head_cells 相同结构的 {行号: {列序号: (类型, 原始文本)}}"""
+    rows = {}
+    row_no = row_count = 0
+    col = -1
+    for event, element in ET.iterparse(stream, events=('start', 'end')):
+        name = _local_name(element.tag)
+        if event == 'start':
+            if name == 'row':
+                ref = element.get('r')
+                row_no = int(ref) if ref else row_no + 1
+                col = -1
+            continue
+        if name == 'c':
+            ref = element.get('r')
+            col = column_index(ref.rstrip('0123456789')) if ref else col + 1
+            cell_type = element.get('t', 'n')
+            raw = None
+            for child in element:
+                child_name = _local_name(child.tag)
+                if child_name == 'v':
+                    raw = child.text or ''
+                elif child_name == 'is':
+                    raw = _element_text(child)
+            rows.setdefault(row_no, {})[col] = (cell_type, raw)
+        elif name == 'row':
+            element.clear()
+            row_count += 1
+            if row_count >= max_rows:
+                break
+    return rows
+
+
+def sheet_target(target):
+    """工作簿关系中的 Target -> 压缩包内路径"""
+    if target.startswith('/'):
+        return target.lstrip('/')
+    return posixpath.normpath(posixpath.join('xl', target))
+
+
+def workbook_sheets(zf):
+    """工作簿中的 Sheet，按工作簿顺序返回 [(名称, 压缩包内路径)]"""
+    workbook = ET.fromstring(zf.read('xl/workbook.xml'))
+    rels = ET.fromstring(zf.read('xl/_rels/workbook.xml.rels'))
+    targets = {rel.get('Id'): rel.get('Target') for rel in rels.iter(f'{{{NS_PKG_REL}}}Relationship')}
+    return [(sheet.get('name'), sheet_target(targets[sheet.get(f'{{{NS_REL}}}id')]))
+            for sheet in workbook.iter(f'{{{NS_MAIN}}}sheet')]
+
+
+def data_sheet_path(zf):
+    """按转换相同的规则选择数据 Sheet，返回其在压缩包内的路径"""
+    sheets = workbook_sheets(zf)
+    return dict(sheets)[pick_data_sheet([name for name, _ in sheets])]